@@ -61,6 +61,7 @@ INSTALLED_APPS = [
     'django.contrib.messages',
     'django.contrib.staticfiles',
     'django.contrib.sites',
+    'django.contrib.postgres',
     # Django OTP apps
     'django_otp',
     'django_otp.plugins.otp_email',
@@ -187,6 +188,64 @@ STATICFILES_FINDERS = [
     'django.contrib.staticfiles.finders.AppDirectoriesFinder',
 ]
 
+# Listing pagination: keyset (cursor) pagination avoids COUNT(*) and deep
+# OFFSET scans on study materials, my uploads and the user directory
+KEYSET_PAGINATION = config('KEYSET_PAGINATION', default=False, cast=bool)
+
+# Write-behind view counters (see shop/counters.py): 'memory' buffers per
+# worker, 'cache' buffers in the shared cache; 0 seconds disables buffering
+VIEW_COUNTER_BACKEND = config('VIEW_COUNTER_BACKEND', default='memory')
+VIEW_COUNTER_FLUSH_INTERVAL = config('VIEW_COUNTER_FLUSH_INTERVAL', default=30, cast=int)
+VIEW_COUNTER_MAX_PENDING = config('VIEW_COUNTER_MAX_PENDING', default=1000, cast=int)
+
+# MaterialView analytics events (see shop/view_events.py)
+MATERIAL_VIEW_DEDUP_WINDOW = config('MATERIAL_VIEW_DEDUP_WINDOW', default=1800, cast=int)
+MATERIAL_VIEW_QUEUE_SIZE = config('MATERIAL_VIEW_QUEUE_SIZE', default=10000, cast=int)
+MATERIAL_VIEW_BATCH_SIZE = config('MATERIAL_VIEW_BATCH_SIZE', default=500, cast=int)
+# Reverse proxies in front of the app; 0 uses REMOTE_ADDR as the client IP
+TRUSTED_PROXY_COUNT = config('TRUSTED_PROXY_COUNT', default=0, cast=int)
+
+# Profile unique-viewer sketches (see shop/profile_views.py), merged by the
+# counter flush thread
+PROFILE_VIEW_MAX_PENDING = config('PROFILE_VIEW_MAX_PENDING', default=1000, cast=int)
+
+# Rendered profile sections (see shop/profile_cache.py)
+PROFILE_FRAGMENT_CACHE_TIMEOUT = 24 * 60 * 60
+
+# User directory headline counters (see shop/directory.py)
+DIRECTORY_STATS_CACHE_TIMEOUT = 300
+
+# Protected study material files (see shop/file_delivery.py): 'django'
+# streams from the worker, 'accel' uses nginx X-Accel-Redirect, 'sendfile'
+# uses X-Sendfile
+PROTECTED_FILE_DELIVERY = config('PROTECTED_FILE_DELIVERY', default='django')
+PROTECTED_FILE_ACCEL_PREFIX = config('PROTECTED_FILE_ACCEL_PREFIX', default='/protected-media/')
+
+# Study material previews (see shop/previews.py)
+STUDY_MATERIAL_PREVIEW_SIZE = (400, 400)
+STUDY_MATERIAL_PREVIEW_ASYNC = config('STUDY_MATERIAL_PREVIEW_ASYNC', default=True, cast=bool)
+
+# Resized WebP/JPEG copies of profile pictures and banners (see shop/image_variants.py)
+PROFILE_IMAGE_WIDTHS = {
+    'profile_picture': (64, 160, 320),
+    'banner_image': (640, 1280, 1920),
+}
+PROFILE_IMAGE_VARIANTS_ASYNC = config('PROFILE_IMAGE_VARIANTS_ASYNC', default=True, cast=bool)
+
+# Entries kept per material in the related-materials index (shop/related.py)
+RELATED_MATERIALS_PER_ITEM = 8
+
+# Tasks kept per user by the nightly recommendation job (shop/recommendations.py)
+TASK_RECOMMENDATIONS_PER_USER = 10
+
+# Uploads are hashed while they stream in, for deduplicated storage
+# (see shop/blobstore.py); the hashing handler must come first
+FILE_UPLOAD_HANDLERS = [
+    'shop.blobstore.HashingUploadHandler',
+    'django.core.files.uploadhandler.MemoryFileUploadHandler',
+    'django.core.files.uploadhandler.TemporaryFileUploadHandler',
+]
+
 # Media files
 MEDIA_URL = '/images/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
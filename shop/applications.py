@@ -0,0 +1,101 @@
+# shop/applications.py
+"""
+Submission of task applications.
+
+An application is written with a single atomic upsert,
+``INSERT ... ON CONFLICT (applicant_id, task_id) DO NOTHING RETURNING id``
+(PostgreSQL, and SQLite 3.35+). Other backends insert in a savepoint and
+catch the IntegrityError. A double-click or a retried request therefore
+never errors on the (applicant, task) unique constraint and never creates
+a second row.
+
+The apply form carries a per-render ``submission_key``. It is stored with
+the application, so a replay of the same submission is answered as the
+success it originally was. A different submission for an already-applied
+task is reported as a duplicate.
+"""
+import re
+
+from django.db import IntegrityError, connections, transaction
+from django.utils import timezone
+
+from .models import Application
+from .task_stats import record_application_changes
+
+CREATED = 'created'
+REPLAYED = 'replayed'
+DUPLICATE = 'duplicate'
+
+SUBMISSION_KEY_RE = re.compile(r'^[A-Za-z0-9-]{8,64}$')
+
+
+def clean_submission_key(value):
+    """The form's submission key, or None if absent or malformed"""
+    value = (value or '').strip()
+    return value if SUBMISSION_KEY_RE.match(value) else None
+
+
+def _insert_ignoring_conflict(application):
+    """INSERT ... ON CONFLICT DO NOTHING; returns the new id or None"""
+    meta = Application._meta
+    connection = connections[Application.objects.db]
+    quote = connection.ops.quote_name
+    fields = [meta.get_field(name) for name in ('task', 'applicant', 'message', 'applied_at', 'status', 'submission_key')]
+    columns = ', '.join(quote(field.column) for field in fields)
+    placeholders = ', '.join(['%s'] * len(fields))
+    values = [field.get_db_prep_save(field.pre_save(application, True), connection) for field in fields]
+    sql = (
+        f"INSERT INTO {quote(meta.db_table)} ({columns}) VALUES ({placeholders}) "
+        f"ON CONFLICT ({quote(meta.get_field('applicant').column)}, {quote(meta.get_field('task').column)}) "
+        f"DO NOTHING RETURNING {quote(meta.pk.column)}"
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, values)
+        row = cursor.fetchone()
+    return row[0] if row else None
+
+
+def _supports_upsert(connection):
+    return connection.vendor in ('postgresql', 'sqlite') and connection.features.can_return_rows_from_bulk_insert
+
+
+def _insert_in_savepoint(application):
+    try:
+        with transaction.atomic():
+            application.save(force_insert=True)
+    except IntegrityError:
+        return None
+    return application.pk
+
+
+def submit_application(task, applicant, message='', submission_key=None):
+    """
+    Apply ``applicant`` to ``task`` at most once.
+
+    Returns ``(outcome, application_id)`` where outcome is CREATED,
+    REPLAYED (same submission_key as the stored application) or DUPLICATE.
+    """
+    application = Application(
+        task=task,
+        applicant=applicant,
+        message=message,
+        applied_at=timezone.now(),
+        submission_key=submission_key,
+    )
+    if _supports_upsert(connections[Application.objects.db]):
+        with transaction.atomic():
+            application_id = _insert_ignoring_conflict(application)
+            if application_id is not None:
+                # The raw INSERT sends no post_save
+                record_application_changes([(applicant.pk, None, application.status)])
+    else:
+        application_id = _insert_in_savepoint(application)
+    if application_id is not None:
+        return CREATED, application_id
+
+    existing_id, existing_key = Application.objects.filter(
+        task=task, applicant=applicant
+    ).values_list('id', 'submission_key').first() or (None, None)
+    if submission_key and existing_key == submission_key:
+        return REPLAYED, existing_id
+    return DUPLICATE, existing_id
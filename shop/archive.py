@@ -0,0 +1,110 @@
+# shop/archive.py
+"""
+Archival of expired tasks.
+
+Tasks whose deadline has passed without anyone being assigned are moved,
+with their applications, from shop_task / shop_application into
+ArchivedTask / ArchivedApplication. Each batch is one short transaction
+that claims up to ``batch_size`` rows with
+``SELECT ... FOR UPDATE SKIP LOCKED``: rows being edited by a request are
+skipped (and picked up by a later run) instead of blocking it, so the job
+can run during traffic: `manage.py archive_expired_tasks` runs nightly as
+a cron job defined in render.yaml.
+
+Notifications about archived applications are kept; only their link to
+the application is cleared. The originals are removed with plain
+``DELETE ... WHERE id IN (...)`` statements, without per-row signals, so
+a batch costs the same handful of queries however many rows it moves.
+What the delete receivers would have done is done per batch instead:
+the institutions' usage counts drop in one UPDATE. UserTaskStats is left
+alone on purpose, since archived tasks and applications stay in their
+owners' counts (shop/task_stats.py). Owners read archived tasks on the
+task history page.
+"""
+import datetime
+from collections import Counter
+
+from django.db import transaction
+from django.utils import timezone
+
+from .institutions import release_usage
+from .models import Application, ArchivedApplication, ArchivedTask, Notification, Task, TaskRecommendation
+
+ARCHIVE_BATCH_SIZE = 500
+
+_TASK_FIELDS = (
+    'id', 'title', 'slug', 'description', 'created_by_id', 'budget', 'status',
+    'category', 'task_assigned_place', 'is_approved', 'deadline', 'created_at',
+)
+_APPLICATION_FIELDS = ('id', 'task_id', 'applicant_id', 'message', 'applied_at', 'status')
+
+
+def expired_tasks(today=None, grace_days=0):
+    """Unassigned tasks whose deadline passed more than ``grace_days`` ago"""
+    today = today or timezone.localdate()
+    cutoff = today - datetime.timedelta(days=grace_days)
+    return Task.objects.filter(deadline__lt=cutoff, assigned_to__isnull=True)
+
+
+def archive_batch(queryset, batch_size=ARCHIVE_BATCH_SIZE):
+    """
+    Move one batch of ``queryset`` into the archive tables.
+    Returns ``(tasks, applications)`` archived; ``(0, 0)`` when done.
+    """
+    with transaction.atomic():
+        task_ids = list(
+            queryset.select_for_update(skip_locked=True)
+            .order_by('deadline', 'id').values_list('id', flat=True)[:batch_size]
+        )
+        if not task_ids:
+            return 0, 0
+
+        tasks = list(Task.objects.filter(pk__in=task_ids).values(*_TASK_FIELDS, 'institution_id'))
+        institutions = Counter(row.pop('institution_id') for row in tasks)
+        applications = list(
+            Application.objects.filter(task_id__in=task_ids)
+            .select_for_update().values(*_APPLICATION_FIELDS)
+        )
+
+        archived = ArchivedTask.objects.bulk_create([
+            ArchivedTask(original_id=row.pop('id'), **row) for row in tasks
+        ])
+        archive_ids = {task.original_id: task.pk for task in archived}
+        if archive_ids and None in archive_ids.values():
+            # Backends that do not return ids from bulk inserts
+            archive_ids = dict(
+                ArchivedTask.objects.filter(original_id__in=task_ids).values_list('original_id', 'id')
+            )
+        ArchivedApplication.objects.bulk_create([
+            ArchivedApplication(
+                original_id=row['id'],
+                task_id=archive_ids[row['task_id']],
+                applicant_id=row['applicant_id'],
+                message=row['message'],
+                applied_at=row['applied_at'],
+                status=row['status'],
+            )
+            for row in applications
+        ])
+
+        application_ids = [row['id'] for row in applications]
+        Notification.objects.filter(application_id__in=application_ids).update(application=None)
+        for model, lookup in ((TaskRecommendation, 'task_id__in'), (Application, 'task_id__in'), (Task, 'pk__in')):
+            model.objects.filter(**{lookup: task_ids})._raw_delete(model.objects.db)
+        release_usage(institutions)
+
+    return len(tasks), len(applications)
+
+
+def archive_expired_tasks(batch_size=ARCHIVE_BATCH_SIZE, max_batches=None, today=None, grace_days=0):
+    """Archive expired tasks batch by batch. Returns ``(tasks, applications)``."""
+    queryset = expired_tasks(today, grace_days)
+    total_tasks = total_applications = batches = 0
+    while max_batches is None or batches < max_batches:
+        tasks, applications = archive_batch(queryset, batch_size)
+        if not tasks:
+            break
+        total_tasks += tasks
+        total_applications += applications
+        batches += 1
+    return total_tasks, total_applications
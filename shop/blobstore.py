@@ -0,0 +1,143 @@
+# shop/blobstore.py
+"""
+Content-addressed, deduplicated storage for uploaded files.
+
+Uploads are hashed (SHA-256) while Django streams them in, by
+HashingUploadHandler, which sits in front of the default upload handlers.
+Each distinct content is stored once as ``blobs/<aa>/<bb>/<digest><ext>``
+and recorded in a StoredBlob row with a reference count; models simply
+point their FileField at that name. Deleting a model releases its
+reference, and the file is removed from storage when the last reference
+goes. Files stored before this scheme (no StoredBlob row) are deleted
+directly, as before.
+
+Finding an existing copy of an upload is a single lookup on the
+(digest, extension) unique index.
+"""
+import hashlib
+import logging
+import os
+
+from django.core.files.storage import default_storage
+from django.core.files.uploadhandler import FileUploadHandler
+from django.db import IntegrityError, transaction
+from django.db.models import F
+
+from .models import StoredBlob
+
+logger = logging.getLogger(__name__)
+
+BLOB_PREFIX = 'blobs'
+HASH_CHUNK_SIZE = 64 * 1024
+
+
+class HashingUploadHandler(FileUploadHandler):
+    """
+    Compute the SHA-256 of every uploaded file as its chunks arrive and
+    record it in ``request.upload_digests[field_name]``. Must come first in
+    FILE_UPLOAD_HANDLERS; it passes the data on untouched.
+    """
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.hasher = hashlib.sha256()
+
+    def receive_data_chunk(self, raw_data, start):
+        self.hasher.update(raw_data)
+        return raw_data
+
+    def file_complete(self, file_size):
+        digests = self.request.__dict__.setdefault('upload_digests', {})
+        digests[self.field_name] = self.hasher.hexdigest()
+        # Let the next handler build the file object
+        return None
+
+
+def file_digest(f):
+    """SHA-256 of a File / UploadedFile, read in chunks"""
+    hasher = hashlib.sha256()
+    for chunk in f.chunks(HASH_CHUNK_SIZE):
+        hasher.update(chunk)
+    f.seek(0)
+    return hasher.hexdigest()
+
+
+def upload_digest(request, field_name):
+    """Digest computed while ``request.FILES[field_name]`` was received, if any"""
+    return getattr(request, 'upload_digests', {}).get(field_name)
+
+
+def blob_name(digest, extension):
+    return f'{BLOB_PREFIX}/{digest[:2]}/{digest[2:4]}/{digest}{extension}'
+
+
+def find_blob(digest, extension):
+    return StoredBlob.objects.filter(digest=digest, extension=extension).first()
+
+
+def store_upload(uploaded_file, digest=None):
+    """
+    Store ``uploaded_file`` unless identical content is already stored, and
+    take a reference on the blob. Returns ``(name, duplicate)`` where
+    ``name`` is the storage name to assign to the FileField.
+
+    Call inside the transaction that saves the referencing row, so a failed
+    save does not leave a dangling reference.
+    """
+    digest = digest or file_digest(uploaded_file)
+    extension = os.path.splitext(uploaded_file.name)[1].lower()
+
+    updated = StoredBlob.objects.filter(digest=digest, extension=extension).update(
+        ref_count=F('ref_count') + 1
+    )
+    if updated:
+        return find_blob(digest, extension).name, True
+
+    name = default_storage.save(blob_name(digest, extension), uploaded_file)
+    try:
+        with transaction.atomic():
+            StoredBlob.objects.create(
+                digest=digest, extension=extension, name=name, size=uploaded_file.size
+            )
+    except IntegrityError:
+        # Someone stored the same content concurrently; use their copy
+        default_storage.delete(name)
+        StoredBlob.objects.filter(digest=digest, extension=extension).update(
+            ref_count=F('ref_count') + 1
+        )
+        return find_blob(digest, extension).name, True
+    return name, False
+
+
+def _delete_from_storage(name):
+    try:
+        default_storage.delete(name)
+    except OSError as e:
+        logger.warning(f"Could not delete {name} from storage: {str(e)}")
+
+
+def release_file(name):
+    """
+    Drop one reference to the stored file ``name``. The file is deleted
+    from storage, after commit, once nothing refers to it any more.
+    """
+    if not name:
+        return
+    with transaction.atomic():
+        blob = StoredBlob.objects.select_for_update().filter(name=name).first()
+        if blob is not None:
+            if blob.ref_count > 1:
+                StoredBlob.objects.filter(pk=blob.pk).update(ref_count=F('ref_count') - 1)
+                return
+            blob.delete()
+    transaction.on_commit(lambda: _delete_from_storage(name))
+
+
+def duplicate_of(model, name, exclude_pk=None, user=None):
+    """Another row of ``model`` (owned by ``user``, if given) already using the stored file ``name``"""
+    queryset = model.objects.filter(file=name)
+    if user is not None:
+        queryset = queryset.filter(user=user)
+    if exclude_pk is not None:
+        queryset = queryset.exclude(pk=exclude_pk)
+    return queryset.order_by('pk').first()
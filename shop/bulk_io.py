@@ -0,0 +1,279 @@
+# shop/bulk_io.py
+"""
+Streaming CSV / JSON Lines import and export of tasks and study materials,
+behind `manage.py import_records` and `manage.py export_records`.
+
+Both directions hold one batch in memory at a time. Imports read
+``batch_size`` rows, validate each with the model's full_clean() (field
+rules plus Model.clean(), e.g. no past deadlines or non-positive budgets),
+and insert the valid ones with one bulk_create. Task slugs are allocated
+for the whole batch up front (shop/slugs.py); if a concurrent insert takes
+one first, the batch is retried with fresh slugs. Invalid rows are skipped
+and reported with their line number.
+
+bulk_create sends no signals, so the importer does what the receivers in
+shop/signals.py would: it resolves canonical institutions, adjusts their
+usage counts, recounts the owners' UserTaskStats and drops the cached
+catalogue facets. Related-material lists and previews of imported
+materials are built by `manage.py rebuild_related_materials` and
+`manage.py generate_previews`. A material's ``file`` column names an
+object already in storage. A deduplicated blob (shop/blobstore.py) gains
+one reference per imported row; any other file must not be used by
+another row yet, since deleting either row would delete it from storage.
+Missing and shared files are reported like invalid rows.
+
+Exports stream rows with ``.iterator(chunk_size=...)`` and write them as
+they arrive, so a large export never loads the table.
+"""
+import csv
+import json
+from collections import Counter
+from dataclasses import dataclass
+from itertools import islice
+
+from django.contrib.auth import get_user_model
+from django.core.exceptions import ValidationError
+from django.core.files.storage import default_storage
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import IntegrityError, transaction
+from django.db.models import F
+
+from .facets import invalidate_catalogue_facets
+from .institutions import INSTITUTION_FIELDS, adjust_usage, institution_for, normalize_name
+from .models import Document, StoredBlob, StudyMaterial, Task
+from .slugs import SLUG_ATTEMPTS, allocate_slugs
+from .task_stats import reconcile
+
+IMPORT_BATCH_SIZE = 500
+EXPORT_CHUNK_SIZE = 2000
+
+FORMATS = ('csv', 'jsonl')
+
+
+@dataclass(frozen=True)
+class RecordType:
+    model: type
+    # Foreign key to the owning user; files carry the username
+    owner_field: str
+    fields: tuple
+    slug_source: str = None
+
+    @property
+    def export_columns(self):
+        columns = ('id', self.owner_field, *self.fields, 'created_at')
+        return columns[:1] + ('slug',) + columns[1:] if self.slug_source else columns
+
+
+RECORD_TYPES = {
+    'tasks': RecordType(
+        Task, 'created_by',
+        ('title', 'description', 'budget', 'category', 'deadline', 'task_assigned_place', 'is_approved'),
+        slug_source='title',
+    ),
+    'materials': RecordType(
+        StudyMaterial, 'user',
+        ('title', 'description', 'category', 'material_type', 'task_assigned_place', 'file', 'is_approved'),
+    ),
+}
+
+
+def format_for(path, requested=None):
+    """The explicit ``requested`` format, or the one implied by the file name"""
+    if requested:
+        return requested
+    return 'jsonl' if str(path).endswith(('.jsonl', '.ndjson')) else 'csv'
+
+
+# -------------------- Import --------------------
+
+def read_rows(stream, fmt):
+    """``(line number, dict)`` for each record of a CSV or JSONL stream"""
+    if fmt == 'csv':
+        reader = csv.DictReader(stream)
+        for row in reader:
+            yield reader.line_num, row
+        return
+    for line_number, line in enumerate(stream, start=1):
+        if line.strip():
+            try:
+                yield line_number, json.loads(line)
+            except ValueError as e:
+                yield line_number, ValidationError(f"Invalid JSON: {e}")
+
+
+class ImportResult:
+    def __init__(self):
+        self.created = 0
+        self.errors = []
+
+    def error(self, line_number, message):
+        self.errors.append((line_number, message))
+
+
+def _message(error):
+    if hasattr(error, 'message_dict'):
+        return '; '.join(f"{field}: {' '.join(messages)}" for field, messages in error.message_dict.items())
+    return ' '.join(error.messages)
+
+
+class Importer:
+    def __init__(self, record_type, batch_size=IMPORT_BATCH_SIZE):
+        self.type = RECORD_TYPES[record_type]
+        self.batch_size = batch_size
+        self.place_field, self.institution_fk = INSTITUTION_FIELDS[self.type.model]
+        self.institutions = {}
+        self.result = ImportResult()
+        # Derived columns, and the owner already resolved in one query per batch
+        self.unchecked = [
+            field.name for field in self.type.model._meta.concrete_fields
+            if not field.editable or field.name in ('slug', self.type.owner_field)
+        ]
+
+    def _build(self, row, owners):
+        model = self.type.model
+        username = str(row.get(self.type.owner_field) or '').strip()
+        owner_id = owners.get(username)
+        if owner_id is None:
+            raise ValidationError({self.type.owner_field: f"Unknown user '{username}'"})
+
+        values, errors = {}, {}
+        for name in self.type.fields:
+            value = row.get(name)
+            field = model._meta.get_field(name)
+            if value in ('', None):
+                if field.has_default():
+                    continue
+                value = None if field.null else ''
+            try:
+                # Typed values, so that Model.clean() can compare them
+                values[name] = field.to_python(value)
+            except ValidationError as e:
+                errors[name] = e.messages
+        if values.get('file') and not default_storage.exists(values['file']):
+            errors['file'] = ["not found in storage"]
+        if errors:
+            raise ValidationError(errors)
+        instance = model(**{f'{self.type.owner_field}_id': owner_id}, **values)
+        instance.full_clean(exclude=self.unchecked, validate_unique=False, validate_constraints=False)
+
+        place = getattr(instance, self.place_field)
+        key = normalize_name(place)
+        if key and key not in self.institutions:
+            self.institutions[key] = institution_for(place)
+        setattr(instance, self.institution_fk, self.institutions.get(key))
+        return instance
+
+    def _insert(self, instances):
+        model = self.type.model
+        for attempt in range(SLUG_ATTEMPTS):
+            if self.type.slug_source:
+                sources = [getattr(instance, self.type.slug_source) for instance in instances]
+                for instance, slug in zip(instances, allocate_slugs(model, sources)):
+                    instance.slug = slug
+            try:
+                with transaction.atomic():
+                    return model.objects.bulk_create(instances)
+            except IntegrityError:
+                # A concurrent insert took one of the slugs
+                if not self.type.slug_source or attempt == SLUG_ATTEMPTS - 1:
+                    raise
+
+    def _check_files(self, built):
+        """The ``(line number, instance)`` pairs whose file may be referenced"""
+        names = {instance.file.name for _, instance in built}
+        blobs = set(StoredBlob.objects.filter(name__in=names).values_list('name', flat=True))
+        used = set(StudyMaterial.objects.filter(file__in=names - blobs).values_list('file', flat=True))
+        used.update(Document.objects.filter(file__in=names - blobs).values_list('file', flat=True))
+        usable = []
+        for line_number, instance in built:
+            name = instance.file.name
+            if name not in blobs:
+                if name in used:
+                    self.result.error(line_number, "file: already used by another record")
+                    continue
+                used.add(name)
+            usable.append((line_number, instance))
+        return usable
+
+    def _derived_data(self, instances):
+        usage = Counter(getattr(instance, f'{self.institution_fk}_id') for instance in instances)
+        for institution_id, count in usage.items():
+            adjust_usage(institution_id, count)
+        if 'file' in self.type.fields:
+            # One blob reference per row, as store_upload() takes for uploads
+            references = Counter(instance.file.name for instance in instances)
+            for name, count in references.items():
+                StoredBlob.objects.filter(name=name).update(ref_count=F('ref_count') + count)
+        if self.type.model is Task:
+            reconcile({instance.created_by_id for instance in instances})
+
+    def import_batch(self, rows):
+        usernames = {
+            str(row.get(self.type.owner_field) or '').strip()
+            for _, row in rows if isinstance(row, dict)
+        }
+        owners = dict(
+            get_user_model().objects.filter(username__in=usernames).values_list('username', 'pk')
+        )
+        built = []
+        for line_number, row in rows:
+            try:
+                if isinstance(row, Exception):
+                    raise row
+                if not isinstance(row, dict):
+                    raise ValidationError("Expected an object")
+                built.append((line_number, self._build(row, owners)))
+            except ValidationError as e:
+                self.result.error(line_number, _message(e))
+            except (OSError, ValueError, TypeError) as e:
+                self.result.error(line_number, str(e))
+        if 'file' in self.type.fields and built:
+            built = self._check_files(built)
+        instances = [instance for _, instance in built]
+        if instances:
+            with transaction.atomic():
+                self._insert(instances)
+                self._derived_data(instances)
+            self.result.created += len(instances)
+
+    def run(self, stream, fmt):
+        rows = read_rows(stream, fmt)
+        while True:
+            batch = list(islice(rows, self.batch_size))
+            if not batch:
+                break
+            self.import_batch(batch)
+        self.result.errors.sort(key=lambda error: error[0])
+        if self.type.model is StudyMaterial and self.result.created:
+            invalidate_catalogue_facets()
+        return self.result
+
+
+def import_records(record_type, stream, fmt, batch_size=IMPORT_BATCH_SIZE):
+    """Import ``record_type`` rows from ``stream``; returns an ImportResult"""
+    return Importer(record_type, batch_size).run(stream, fmt)
+
+
+# -------------------- Export --------------------
+
+def export_records(record_type, stream, fmt, chunk_size=EXPORT_CHUNK_SIZE, queryset=None):
+    """Write every ``record_type`` row to ``stream``; returns the row count"""
+    spec = RECORD_TYPES[record_type]
+    columns = spec.export_columns
+    lookups = [f'{name}__username' if name == spec.owner_field else name for name in columns]
+    queryset = spec.model.objects.all() if queryset is None else queryset
+    rows = queryset.order_by('pk').values_list(*lookups).iterator(chunk_size=chunk_size)
+
+    written = 0
+    if fmt == 'csv':
+        writer = csv.writer(stream)
+        writer.writerow(columns)
+        for row in rows:
+            writer.writerow(row)
+            written += 1
+    else:
+        encoder = DjangoJSONEncoder()
+        for row in rows:
+            stream.write(encoder.encode(dict(zip(columns, row))) + '\n')
+            written += 1
+    return written
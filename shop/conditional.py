@@ -0,0 +1,143 @@
+# shop/conditional.py
+"""
+Cheap validators for conditional GET (ETag / Last-Modified -> 304).
+
+The functions here plug into django.views.decorators.http.condition. They
+only read a few columns and stat the stored file, so a request whose
+If-None-Match / If-Modified-Since still matches is answered with 304
+before the view opens any file or runs its heavier queries.
+
+Validator functions are memoized on the request, so the ETag and
+Last-Modified functions for the same view share a single query.
+"""
+import hashlib
+from functools import wraps
+
+from django.core.files.storage import default_storage
+
+from .models import CustomUser, Profile, StudyMaterial
+from .profile_cache import profile_cache_state
+from .related import related_list_version
+
+
+def make_etag(*parts):
+    """Strong, quoted ETag built from the values the representation depends on"""
+    digest = hashlib.md5(':'.join(str(part) for part in parts).encode()).hexdigest()
+    return f'"{digest}"'
+
+
+def request_cached(func):
+    """Memoize ``func(request, *args)`` for the lifetime of the request"""
+    @wraps(func)
+    def inner(request, *args, **kwargs):
+        cache = request.__dict__.setdefault('_conditional_cache', {})
+        key = (func.__name__, args, tuple(sorted(kwargs.items())))
+        if key not in cache:
+            cache[key] = func(request, *args, **kwargs)
+        return cache[key]
+    return inner
+
+
+def on_not_modified(callback):
+    """
+    Call ``callback(request, *args, **kwargs)`` when the wrapped view answers
+    304, for side effects such as view counting that must not be skipped.
+    Place it above the ``condition`` decorator.
+    """
+    def decorator(view):
+        @wraps(view)
+        def inner(request, *args, **kwargs):
+            response = view(request, *args, **kwargs)
+            if response.status_code == 304:
+                callback(request, *args, **kwargs)
+            return response
+        return inner
+    return decorator
+
+
+def _stored_size(name):
+    try:
+        return default_storage.size(name) if name else None
+    except (FileNotFoundError, OSError):
+        return None
+
+
+# -------------------- Study materials --------------------
+
+@request_cached
+def material_state(request, material_id):
+    """The columns material validators depend on, or None if not visible"""
+    row = StudyMaterial.objects.filter(pk=material_id).values(
+        'updated_at', 'file', 'preview', 'is_approved', 'user_id', 'views'
+    ).first()
+    if row is None:
+        return None
+    if not row['is_approved'] and row['user_id'] != request.user.pk:
+        # Let the view answer with its own permission error
+        return None
+    row['file_size'] = _stored_size(row['file'])
+    return row
+
+
+def material_file_etag(request, material_id):
+    state = material_state(request, material_id)
+    if state is None:
+        return None
+    return make_etag(material_id, state['updated_at'].isoformat(), state['file'], state['file_size'])
+
+
+def material_last_modified(request, material_id):
+    state = material_state(request, material_id)
+    return state['updated_at'] if state else None
+
+
+def material_preview_etag(request, material_id):
+    # Preview names are unique per upload, so the name is a full validator.
+    # None for materials the viewer may not see, so a 304 cannot probe them.
+    state = material_state(request, material_id)
+    if state is None or not state['preview']:
+        return None
+    return make_etag('preview', state['preview'])
+
+
+def material_page_etag(request, material_id):
+    # The page is rendered for the logged-in viewer, so it varies by user.
+    # It also shows the view count and the related list, which change
+    # without touching updated_at. Only the stored count is used: pending
+    # increments differ per worker and grow with the very view being served,
+    # so they would never let a revalidation match.
+    state = material_state(request, material_id)
+    if state is None:
+        return None
+    return make_etag(
+        'page', request.user.pk, material_id,
+        state['updated_at'].isoformat(), state['file'], state['file_size'],
+        state['views'], related_list_version(material_id),
+    )
+
+
+# -------------------- Profiles --------------------
+
+@request_cached
+def profile_state(request, username):
+    """The user (with profile) and their profile cache state, or None"""
+    user = CustomUser.objects.select_related('profile').filter(username=username).first()
+    if user is None:
+        return None
+    try:
+        profile = user.profile
+    except Profile.DoesNotExist:
+        profile = None
+    return {'user': user, 'profile': profile, 'cache': profile_cache_state(user.pk)}
+
+
+def profile_page_etag(request, username):
+    # The cache version changes with any edit of the profile's rows, and
+    # views with each flush of the viewer sketches. Owners always get a
+    # fresh page: it carries their flash messages and CSRF tokens.
+    state = profile_state(request, username)
+    if state is None or state['profile'] is None or request.user.pk == state['user'].pk:
+        return None
+    return make_etag(
+        'profile', request.user.pk, state['user'].pk, state['cache'][0], state['profile'].views,
+    )
@@ -0,0 +1,330 @@
+# shop/counters.py
+"""
+Write-behind counters for hot integer columns such as StudyMaterial.views.
+
+Instead of running ``UPDATE ... SET views = views + 1`` on every page view,
+increments are buffered (in process memory or in the shared cache) and a
+background thread writes them out in a single batched UPDATE every
+VIEW_COUNTER_FLUSH_INTERVAL seconds, when VIEW_COUNTER_MAX_PENDING
+increments have piled up, and when the worker shuts down. Readers see
+``row value + pending increments``, which is eventually consistent with the
+database without re-reading the row.
+
+Settings:
+    VIEW_COUNTER_BACKEND         'memory' (per process, default) or 'cache'
+                                 (shared; needs a cache with atomic incr)
+    VIEW_COUNTER_FLUSH_INTERVAL  seconds between flushes; 0 writes through
+    VIEW_COUNTER_MAX_PENDING     buffered increments that force an early flush
+"""
+import atexit
+import logging
+import os
+import threading
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.core.cache.backends.db import DatabaseCache
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.filebased import FileBasedCache
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connection, transaction
+from django.db.models import Case, F, Value, When
+
+from .models import StudyMaterial
+
+logger = logging.getLogger(__name__)
+
+FLUSH_BATCH_SIZE = 500
+
+
+class MemoryCounterStore:
+    """Pending increments held in this process only"""
+
+    def __init__(self):
+        self._pending = defaultdict(int)
+        self._total = 0
+        self._lock = threading.Lock()
+
+    def add(self, pk, amount):
+        with self._lock:
+            self._pending[pk] += amount
+            self._total += amount
+            return self._total
+
+    def pending(self, pk):
+        return self._pending.get(pk, 0)
+
+    def drain(self):
+        with self._lock:
+            deltas, self._pending = dict(self._pending), defaultdict(int)
+            self._total = 0
+        return deltas
+
+    def restore(self, deltas):
+        with self._lock:
+            for pk, amount in deltas.items():
+                self._pending[pk] += amount
+                self._total += amount
+
+    def clear(self):
+        with self._lock:
+            self._pending.clear()
+            self._total = 0
+
+
+def check_counter_backend():
+    """
+    Refuse VIEW_COUNTER_BACKEND = 'cache' on caches without atomic incr.
+    Called from ShopConfig.ready(), so a bad setting fails at startup.
+    """
+    if getattr(settings, 'VIEW_COUNTER_BACKEND', 'memory') == 'cache':
+        _require_atomic_cache()
+
+
+def _require_atomic_cache():
+    backend = caches['default']
+    if isinstance(backend, (DatabaseCache, FileBasedCache, DummyCache)):
+        raise ImproperlyConfigured(
+            f"VIEW_COUNTER_BACKEND = 'cache' needs a cache with atomic incr; "
+            f"{type(backend).__name__} would lose increments"
+        )
+
+
+class CacheCounterStore:
+    """
+    Pending increments held in the shared cache, so every worker reports
+    the same count and any worker can flush them, including increments
+    recorded by a worker that died before its flush.
+
+    Rows with pending increments are listed in a journal in the cache: the
+    first increment since the last flush claims a marker for the row and
+    appends the row to numbered slots; a flush reads the slots written
+    since the previous one. Markers expire, so a slot lost to eviction only
+    delays that row's write until its next increment. Needs a cache with
+    atomic incr/decr (Redis, Memcached, or LocMemCache in one process).
+    """
+
+    MARKER_TIMEOUT = 10 * 60
+
+    def __init__(self, label):
+        self.label = label
+        _require_atomic_cache()
+
+    def _key(self, suffix):
+        return f'counter:{self.label}:{suffix}'
+
+    def _incr(self, key, amount):
+        try:
+            return cache.incr(key, amount)
+        except ValueError:
+            if cache.add(key, amount, timeout=None):
+                return amount
+            return cache.incr(key, amount)
+
+    def add(self, pk, amount):
+        """Record ``amount`` for ``pk``; returns the increments pending in total"""
+        self._incr(self._key(pk), amount)
+        if cache.add(self._key(f'dirty:{pk}'), 1, timeout=self.MARKER_TIMEOUT):
+            slot = self._incr(self._key('journal'), 1)
+            cache.set(self._key(f'slot:{slot}'), pk, timeout=None)
+        return self._incr(self._key('total'), amount)
+
+    def pending(self, pk):
+        return cache.get(self._key(pk), 0)
+
+    def drain(self):
+        # Only one worker may move a counter into the database at a time
+        lock_key = self._key('flush-lock')
+        if not cache.add(lock_key, os.getpid(), timeout=60):
+            return {}
+        try:
+            first = cache.get(self._key('drained'), 0) + 1
+            last = cache.get(self._key('journal'), 0)
+            slot_keys = [self._key(f'slot:{slot}') for slot in range(first, last + 1)]
+            deltas = {}
+            for pk in set(cache.get_many(slot_keys).values()):
+                # Unmark first, so an increment made meanwhile is journalled again
+                cache.delete(self._key(f'dirty:{pk}'))
+                amount = cache.get(self._key(pk), 0)
+                if amount:
+                    # decr rather than delete keeps increments made meanwhile
+                    cache.decr(self._key(pk), amount)
+                    deltas[pk] = amount
+            cache.delete_many(slot_keys)
+            cache.set(self._key('drained'), last, timeout=None)
+            if deltas:
+                try:
+                    cache.decr(self._key('total'), sum(deltas.values()))
+                except ValueError:
+                    pass
+            return deltas
+        finally:
+            cache.delete(lock_key)
+
+    def restore(self, deltas):
+        for pk, amount in deltas.items():
+            self.add(pk, amount)
+
+    def clear(self):
+        # Shared with the other workers, which still flush these increments
+        pass
+
+
+class BufferedCounter:
+    """
+    Buffered ``field = field + n`` increments for rows of ``model``.
+
+    ``increment(pk)`` records a hit; ``value(obj)`` returns the loaded row
+    value plus the increments not yet written.
+    """
+
+    def __init__(self, model, field):
+        self.model = model
+        self.field = field
+        self._store = None
+
+    @property
+    def label(self):
+        return f'{self.model._meta.label_lower}.{self.field}'
+
+    @property
+    def store(self):
+        if self._store is None:
+            if getattr(settings, 'VIEW_COUNTER_BACKEND', 'memory') == 'cache':
+                self._store = CacheCounterStore(self.label)
+            else:
+                self._store = MemoryCounterStore()
+        return self._store
+
+    def increment(self, pk, amount=1):
+        """Record ``amount`` more on the row ``pk`` without touching the database"""
+        ensure_flusher()
+        pending = self.store.add(pk, amount)
+        if flush_interval() <= 0:
+            self.flush()
+        elif pending >= getattr(settings, 'VIEW_COUNTER_MAX_PENDING', 1000):
+            request_flush()
+
+    def pending(self, pk):
+        return self.store.pending(pk)
+
+    def clear(self):
+        if self._store is not None:
+            self._store.clear()
+
+    def value(self, obj):
+        """Eventually consistent value of the counter for a loaded instance"""
+        return getattr(obj, self.field) + self.pending(obj.pk)
+
+    def flush(self):
+        """Write all pending increments to the database. Returns rows updated."""
+        deltas = self.store.drain()
+        if not deltas:
+            return 0
+
+        updated = 0
+        items = list(deltas.items())
+        try:
+            with transaction.atomic():
+                for start in range(0, len(items), FLUSH_BATCH_SIZE):
+                    batch = items[start:start + FLUSH_BATCH_SIZE]
+                    output_field = self.model._meta.get_field(self.field)
+                    updated += self.model.objects.filter(
+                        pk__in=[pk for pk, _ in batch]
+                    ).update(**{
+                        self.field: F(self.field) + Case(
+                            *[When(pk=pk, then=Value(amount)) for pk, amount in batch],
+                            default=Value(0),
+                            output_field=output_field,
+                        )
+                    })
+        except Exception as e:
+            logger.error(f"Error flushing {self.label} counters: {str(e)}", exc_info=True)
+            self.store.restore(deltas)
+            return 0
+        return updated
+
+
+# -------------------- Background flushing --------------------
+
+# Anything with flush() and clear() methods: counters and event queues
+_buffers = []
+_flush_requested = threading.Event()
+_flusher_lock = threading.Lock()
+_flusher_pid = None
+
+
+def flush_interval():
+    return getattr(settings, 'VIEW_COUNTER_FLUSH_INTERVAL', 30)
+
+
+def register_buffer(buffer):
+    """Have the flush thread write out ``buffer`` along with the counters"""
+    _buffers.append(buffer)
+    return buffer
+
+
+def register_counter(model, field):
+    return register_buffer(BufferedCounter(model, field))
+
+
+def request_flush():
+    """Wake the flush thread before the interval is up"""
+    _flush_requested.set()
+
+
+def flush_all():
+    """Flush every registered buffer. Safe to call from any thread."""
+    written = 0
+    for buffer in _buffers:
+        # One failing buffer must not hold back the others
+        try:
+            written += buffer.flush()
+        except Exception as e:
+            logger.error(f"Error flushing {type(buffer).__name__}: {str(e)}", exc_info=True)
+    return written
+
+
+def _flusher_loop():
+    global _flusher_pid
+    try:
+        while True:
+            _flush_requested.wait(timeout=flush_interval())
+            _flush_requested.clear()
+            try:
+                flush_all()
+            except Exception as e:
+                logger.error(f"Error in counter flush: {str(e)}", exc_info=True)
+            finally:
+                # This thread's connection would otherwise stay open for ever
+                connection.close()
+    finally:
+        # Let the next ensure_flusher() start a new thread
+        with _flusher_lock:
+            if _flusher_pid == os.getpid():
+                _flusher_pid = None
+
+
+def ensure_flusher():
+    """Start the flush thread once per process (again after a fork)"""
+    global _flusher_pid
+    if _flusher_pid == os.getpid() or flush_interval() <= 0:
+        return
+    with _flusher_lock:
+        if _flusher_pid == os.getpid():
+            return
+        if _flusher_pid is not None:
+            # Forked child: the parent flushes its own buffers
+            for buffer in _buffers:
+                buffer.clear()
+        _flusher_pid = os.getpid()
+        threading.Thread(target=_flusher_loop, name='counter-flusher', daemon=True).start()
+
+
+atexit.register(flush_all)
+
+
+# -------------------- Counters --------------------
+
+material_views = register_counter(StudyMaterial, 'views')
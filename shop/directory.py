@@ -0,0 +1,112 @@
+# shop/directory.py
+"""
+Materialized ranking and headline counters for the user directory.
+
+The directory lists members by profile views. Instead of ordering the
+whole user table per request, DirectoryRank holds every user's rank
+(most viewed first), view count and latest institution. The rows are
+rebuilt by one ``INSERT ... SELECT ROW_NUMBER() OVER (...)`` in a
+transaction, so readers see the old ranking until the new one commits.
+On PostgreSQL the transaction first takes an EXCLUSIVE lock on the table,
+which readers pass but a second rebuild waits on, so overlapping runs
+take turns instead of colliding on the unique ``rank``. The directory
+then pages through the ``rank`` index.
+`manage.py refresh_user_directory` runs the rebuild every ten minutes as
+a cron job defined in render.yaml, and migration 0029 builds the first
+ranking. New members (in the listing and in its search) and view counts
+show up after the next refresh; requests never rebuild the table
+themselves.
+
+The headline numbers (total members, active today, new this week) come
+from one aggregate, cached for DIRECTORY_STATS_CACHE_TIMEOUT seconds and
+recomputed on each refresh.
+
+Settings:
+    DIRECTORY_STATS_CACHE_TIMEOUT  seconds the headline counters are cached
+"""
+import datetime
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connections, transaction
+from django.db.models import Count, Q
+from django.utils import timezone
+
+from .models import DirectoryRank, Education, Profile
+from .people_search import matching_entries
+
+STATS_CACHE_KEY = 'directory:stats'
+
+
+def _ranking_sql(connection):
+    quote = connection.ops.quote_name
+    user, profile, education = get_user_model()._meta, Profile._meta, Education._meta
+    rank = DirectoryRank._meta
+    column = lambda meta, name: quote(meta.get_field(name).column)
+    return f"""
+        INSERT INTO {quote(rank.db_table)}
+            ({column(rank, 'user')}, {column(rank, 'rank')}, {column(rank, 'views')},
+             {column(rank, 'institution')}, {column(rank, 'refreshed_at')})
+        SELECT u.{column(user, 'id')},
+               ROW_NUMBER() OVER (ORDER BY COALESCE(p.{column(profile, 'views')}, 0) DESC, u.{column(user, 'id')} DESC),
+               COALESCE(p.{column(profile, 'views')}, 0),
+               COALESCE((
+                   SELECT e.{column(education, 'institution')} FROM {quote(education.db_table)} e
+                   WHERE e.{column(education, 'user')} = u.{column(user, 'id')}
+                   ORDER BY e.{column(education, 'start_date')} DESC, e.{column(education, 'id')} DESC
+                   LIMIT 1
+               ), ''),
+               %s
+        FROM {quote(user.db_table)} u
+        LEFT JOIN {quote(profile.db_table)} p ON p.{column(profile, 'user')} = u.{column(user, 'id')}
+    """
+
+
+def rank_users():
+    """Rebuild the ranking in one transaction. Returns rows ranked."""
+    connection = connections[DirectoryRank.objects.db]
+    with transaction.atomic(using=connection.alias):
+        with connection.cursor() as cursor:
+            if connection.vendor == 'postgresql':
+                # Serialize rebuilds; readers keep the committed ranking meanwhile
+                cursor.execute(
+                    f'LOCK TABLE {connection.ops.quote_name(DirectoryRank._meta.db_table)} IN EXCLUSIVE MODE'
+                )
+            DirectoryRank.objects.all().delete()
+            cursor.execute(_ranking_sql(connection), [timezone.now()])
+            return cursor.rowcount
+
+
+def refresh_directory():
+    """Rebuild the ranking and the headline counters. Returns rows ranked."""
+    ranked = rank_users()
+    directory_stats(refresh=True)
+    return ranked
+
+
+def _stats_timeout():
+    return getattr(settings, 'DIRECTORY_STATS_CACHE_TIMEOUT', 300)
+
+
+def directory_stats(refresh=False):
+    """``{'total', 'active_today', 'new_this_week'}``, cached"""
+    stats = None if refresh else cache.get(STATS_CACHE_KEY)
+    if stats is None:
+        today = timezone.localdate()
+        stats = get_user_model().objects.aggregate(
+            total=Count('pk'),
+            active_today=Count('pk', filter=Q(last_login__date=today)),
+            new_this_week=Count('pk', filter=Q(date_joined__date__gte=today - datetime.timedelta(days=7))),
+        )
+        cache.set(STATS_CACHE_KEY, stats, _stats_timeout())
+    return stats
+
+
+def directory_entries(search=''):
+    """Ranked directory rows, optionally filtered by a people search, best first"""
+    entries = DirectoryRank.objects.select_related('user__profile').order_by('rank')
+    if search:
+        # Fuzzy, index-backed matches (shop/people_search.py), still in rank order
+        entries = entries.filter(user__in=matching_entries(search).order_by().values('user'))
+    return entries
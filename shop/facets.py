@@ -0,0 +1,68 @@
+# shop/facets.py
+"""
+Facet counts for the study material filters.
+
+Per-category and per-type counts come from one GROUP BY over
+(category, material_type). Each dimension is counted with the other
+dimension's filter applied but not its own, so the sidebar shows how many
+items each choice would give. The cross-tab for the whole catalogue (no
+search) is cached and invalidated by shop/signals.py whenever a material is
+saved or deleted, so most page loads cost no facet query at all.
+"""
+from collections import Counter
+
+from django.core.cache import cache
+from django.db.models import Count
+
+from .models import StudyMaterial
+
+CATALOGUE_FACETS_KEY = 'facets:study_material:catalogue'
+CATALOGUE_FACETS_TIMEOUT = 60 * 60
+
+
+def _cross_tab(queryset):
+    rows = queryset.order_by().values_list('category', 'material_type').annotate(n=Count('id'))
+    return {(category, material_type): n for category, material_type, n in rows}
+
+
+def catalogue_cross_tab():
+    cross_tab = cache.get(CATALOGUE_FACETS_KEY)
+    if cross_tab is None:
+        cross_tab = _cross_tab(StudyMaterial.objects.all())
+        cache.set(CATALOGUE_FACETS_KEY, cross_tab, CATALOGUE_FACETS_TIMEOUT)
+    return cross_tab
+
+
+def invalidate_catalogue_facets():
+    cache.delete(CATALOGUE_FACETS_KEY)
+
+
+def material_facets(searched_queryset=None, category='all', material_type='all'):
+    """
+    Return ``{'categories': [(value, label, count)], 'types': [...]}``.
+
+    ``searched_queryset`` is the listing queryset with the search applied
+    but before the category/type filters; None means the whole catalogue.
+    """
+    if searched_queryset is None:
+        cross_tab = catalogue_cross_tab()
+    else:
+        cross_tab = _cross_tab(searched_queryset)
+
+    category_counts, type_counts = Counter(), Counter()
+    for (row_category, row_type), n in cross_tab.items():
+        if material_type in ('all', row_type):
+            category_counts[row_category] += n
+        if category in ('all', row_category):
+            type_counts[row_type] += n
+
+    return {
+        'categories': [
+            (value, label, category_counts[value])
+            for value, label in StudyMaterial.CATEGORY_CHOICES if value != 'all'
+        ],
+        'types': [
+            (value, label, type_counts[value])
+            for value, label in StudyMaterial.MATERIAL_TYPE_CHOICES
+        ],
+    }
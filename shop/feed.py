@@ -0,0 +1,135 @@
+# shop/feed.py
+"""
+The task board feed shown by the `base` view.
+
+Only approved tasks are listed, newest first, and pages are fetched with
+keyset pagination (shop/pagination.py): the first page is rendered with
+the board and further pages are loaded by the `task_feed` endpoint as the
+user scrolls. Filters (category, budget range, deadline window, place or
+canonical institution, and text search) are applied in the database. Each filter is backed by a
+partial index on approved tasks (see Task.Meta.indexes), so the rows
+hidden from the board are not in the indexes at all.
+"""
+import datetime
+from decimal import Decimal, InvalidOperation
+
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import Task
+from .pagination import KeysetPaginator
+
+FEED_PAGE_SIZE = 12
+FEED_ORDERING = ('-created_at', '-id')
+
+DEADLINE_WINDOWS = ('today', 'week', 'month', 'future')
+
+
+def _decimal(value):
+    try:
+        return Decimal(value.strip())
+    except (InvalidOperation, AttributeError):
+        return None
+
+
+def parse_budget_range(text):
+    """
+    Parse the budget filter box: ``500-1000``, ``>500``, ``<1000`` or
+    ``500`` (a minimum). Returns ``(min, max)``; unparsable bounds are None.
+    """
+    text = (text or '').strip()
+    if not text:
+        return None, None
+    if text.startswith('>'):
+        return _decimal(text[1:]), None
+    if text.startswith('<'):
+        return None, _decimal(text[1:])
+    if '-' in text:
+        low, high = text.split('-', 1)
+        return _decimal(low), _decimal(high)
+    return _decimal(text), None
+
+
+def deadline_range(window, today=None):
+    """Inclusive ``(first, last)`` deadline dates for a window; either may be None"""
+    today = today or timezone.localdate()
+    if window == 'today':
+        return today, today
+    if window == 'week':
+        # Through Saturday, as the board has always shown it
+        return today, today + datetime.timedelta(days=(5 - today.weekday()) % 7)
+    if window == 'month':
+        next_month = (today.replace(day=1) + datetime.timedelta(days=32)).replace(day=1)
+        return today, next_month - datetime.timedelta(days=1)
+    if window == 'future':
+        return today + datetime.timedelta(days=1), None
+    return None, None
+
+
+def feed_filters(params):
+    """The feed filters present in a GET QueryDict"""
+    category = params.get('category', '').strip()
+    if category not in dict(Task.CATEGORY_CHOICES):
+        category = ''
+    deadline = params.get('deadline', '').strip()
+    if deadline not in DEADLINE_WINDOWS:
+        deadline = ''
+    institution = params.get('institution', '').strip()
+    return {
+        'q': params.get('q', '').strip(),
+        'place': params.get('place', '').strip(),
+        'institution': int(institution) if institution.isdigit() else None,
+        'category': category,
+        'budget': params.get('budget', '').strip(),
+        'deadline': deadline,
+        'status': params.get('status', '').strip(),
+    }
+
+
+def task_feed_queryset(filters):
+    """Approved tasks matching ``filters``, with the rows the cards render"""
+    queryset = Task.objects.filter(is_approved=True).select_related(
+        'created_by__profile', 'assigned_to__profile'
+    )
+
+    if filters['category']:
+        queryset = queryset.filter(category=filters['category'])
+    if filters['status']:
+        queryset = queryset.filter(status=filters['status'])
+
+    low, high = parse_budget_range(filters['budget'])
+    if low is not None:
+        queryset = queryset.filter(budget__gte=low)
+    if high is not None:
+        queryset = queryset.filter(budget__lte=high)
+
+    first, last = deadline_range(filters['deadline'])
+    if first is not None:
+        queryset = queryset.filter(deadline__gte=first)
+    if last is not None:
+        queryset = queryset.filter(deadline__lte=last)
+
+    if filters['institution']:
+        # Picked from the autocomplete: an indexed equality filter
+        queryset = queryset.filter(institution_id=filters['institution'])
+    elif filters['place']:
+        queryset = queryset.filter(task_assigned_place__icontains=filters['place'])
+    if filters['q']:
+        queryset = queryset.filter(
+            Q(title__icontains=filters['q']) |
+            Q(description__icontains=filters['q']) |
+            Q(task_assigned_place__icontains=filters['q'])
+        )
+    return queryset
+
+
+def task_feed_page(params, per_page=FEED_PAGE_SIZE):
+    """
+    The feed page selected by ``params`` (filters plus ``cursor``).
+    Raises InvalidCursor for a malformed cursor.
+    """
+    paginator = KeysetPaginator(
+        task_feed_queryset(feed_filters(params)), per_page, FEED_ORDERING,
+        approximate_count=False,
+    )
+    return paginator.page(params.get('cursor'))
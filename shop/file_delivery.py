@@ -0,0 +1,144 @@
+# shop/file_delivery.py
+"""
+Delivery of protected uploads (study material PDFs and images).
+
+Files are never read into memory in one piece. Depending on
+PROTECTED_FILE_DELIVERY they are:
+
+    'django'    streamed by the worker in fixed-size chunks, with support
+                for single byte ranges (Range / If-Range -> 206) so PDF
+                viewers can fetch pages lazily
+    'accel'     handed to nginx with X-Accel-Redirect; the internal
+                location is PROTECTED_FILE_ACCEL_PREFIX + the file name
+    'sendfile'  handed to Apache/lighttpd with X-Sendfile (absolute path)
+
+In the proxy modes the front server does the copy and the range handling.
+"""
+import os
+import re
+
+from django.conf import settings
+from django.http import FileResponse, HttpResponse, StreamingHttpResponse
+from django.utils.http import http_date, parse_http_date_safe
+
+CHUNK_SIZE = 64 * 1024
+
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+def parse_range(header, size):
+    """
+    Parse a single-range ``Range`` header against a file of ``size`` bytes.
+
+    Returns ``(start, end)`` inclusive, None when the header should be
+    ignored (absent, malformed or multi-range) and raises ValueError when
+    the range cannot be satisfied.
+    """
+    if not header:
+        return None
+    match = RANGE_RE.match(header.strip())
+    if not match:
+        return None
+    first, last = match.groups()
+    if not first and not last:
+        return None
+    if not first:
+        # Suffix range: the last N bytes
+        length = int(last)
+        if length == 0:
+            raise ValueError(header)
+        return max(size - length, 0), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or start > end:
+        raise ValueError(header)
+    return start, end
+
+
+def if_range_matches(request, etag=None, last_modified=None):
+    """True if there is no If-Range header or it matches the current file"""
+    if_range = request.META.get('HTTP_IF_RANGE')
+    if not if_range:
+        return True
+    if if_range.startswith(('"', 'W/')):
+        # Only strong validators may be used with If-Range
+        return etag is not None and not if_range.startswith('W/') and if_range == etag
+    if last_modified is None:
+        return False
+    return parse_http_date_safe(if_range) == int(last_modified.timestamp())
+
+
+def _iter_range(f, start, length):
+    try:
+        f.seek(start)
+        remaining = length
+        while remaining > 0:
+            chunk = f.read(min(CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+    finally:
+        f.close()
+
+
+def _file_size(fieldfile):
+    try:
+        return fieldfile.size
+    except (FileNotFoundError, OSError):
+        return None
+
+
+def serve_file(request, fieldfile, content_type, etag=None, last_modified=None):
+    """
+    Build the response delivering ``fieldfile``.
+
+    Raises OSError if the file is missing from storage. ``etag`` and
+    ``last_modified`` are sent as validators and used to evaluate If-Range.
+    """
+    mode = getattr(settings, 'PROTECTED_FILE_DELIVERY', 'django')
+    filename = os.path.basename(fieldfile.name)
+
+    if mode == 'accel':
+        prefix = getattr(settings, 'PROTECTED_FILE_ACCEL_PREFIX', '/protected-media/')
+        response = HttpResponse(content_type=content_type)
+        response['X-Accel-Redirect'] = prefix.rstrip('/') + '/' + fieldfile.name.lstrip('/')
+    elif mode == 'sendfile':
+        response = HttpResponse(content_type=content_type)
+        response['X-Sendfile'] = fieldfile.path
+    else:
+        size = _file_size(fieldfile)
+        if size is None:
+            raise FileNotFoundError(fieldfile.name)
+        try:
+            byte_range = parse_range(request.META.get('HTTP_RANGE'), size)
+        except ValueError:
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f'bytes */{size}'
+            return response
+        if byte_range and not if_range_matches(request, etag, last_modified):
+            byte_range = None
+
+        if byte_range:
+            start, end = byte_range
+            length = end - start + 1
+            response = StreamingHttpResponse(
+                _iter_range(fieldfile.open('rb'), start, length),
+                status=206,
+                content_type=content_type,
+            )
+            response['Content-Range'] = f'bytes {start}-{end}/{size}'
+            response['Content-Length'] = str(length)
+        else:
+            # FileResponse streams in block_size chunks and lets the WSGI
+            # server use os.sendfile via wsgi.file_wrapper when available
+            response = FileResponse(fieldfile.open('rb'), content_type=content_type)
+            response.block_size = CHUNK_SIZE
+        response['Accept-Ranges'] = 'bytes'
+
+    response['Content-Disposition'] = f'inline; filename="{filename}"'
+    if etag:
+        response['ETag'] = etag
+    if last_modified:
+        response['Last-Modified'] = http_date(last_modified.timestamp())
+    return response
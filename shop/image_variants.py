@@ -0,0 +1,206 @@
+# shop/image_variants.py
+"""
+Resized variants of profile pictures and banner images.
+
+When a Profile's picture or banner is uploaded or replaced, the receivers
+in shop/signals.py schedule generate_variants() after commit. It renders
+the image with Pillow at each width in PROFILE_IMAGE_WIDTHS, in WebP and
+as a JPEG fallback, and stores them next to the original as
+``<name>.w<width>.webp`` / ``<name>.w<width>.jpg``. The names follow from
+the original's, so the variants of a replaced or removed image can always
+be found and deleted. Images are never upscaled: the first width at or
+above the original's holds the image at its own size, and larger widths
+are skipped.
+
+The widths rendered are recorded in Profile.image_variants, keyed by field
+together with the original name, and the ``{% profile_image %}`` tag
+(shop/templatetags/profile_images.py) turns them into ``srcset``s without
+touching storage. A record for an older upload is ignored, so pages show
+the original until the new variants are ready.
+
+Settings:
+    PROFILE_IMAGE_WIDTHS          {field: (widths in pixels, ...)}
+    PROFILE_IMAGE_VARIANTS_ASYNC  render in a background thread (default)
+"""
+import io
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connection, transaction
+from PIL import Image, ImageOps
+
+from .models import Profile
+from .profile_cache import bump_profile_version
+
+logger = logging.getLogger(__name__)
+
+IMAGE_FIELDS = ('profile_picture', 'banner_image')
+DEFAULT_WIDTHS = {
+    'profile_picture': (64, 160, 320),
+    'banner_image': (640, 1280, 1920),
+}
+# Storage extension -> (Pillow format, save options)
+VARIANT_FORMATS = {
+    'webp': ('WEBP', {'quality': 80, 'method': 4}),
+    'jpg': ('JPEG', {'quality': 82, 'optimize': True, 'progressive': True}),
+}
+
+_executor = None
+_executor_pid = None
+_executor_lock = threading.Lock()
+
+
+def variant_widths(field):
+    widths = getattr(settings, 'PROFILE_IMAGE_WIDTHS', DEFAULT_WIDTHS).get(field, ())
+    return tuple(sorted(widths))
+
+
+def variant_name(name, width, extension):
+    """Deterministic storage name of one variant of the image ``name``"""
+    return f'{os.path.splitext(name)[0]}.w{width}.{extension}'
+
+
+def variant_names(field, name):
+    """Every variant name an image stored as ``name`` can have"""
+    return [
+        variant_name(name, width, extension)
+        for width in variant_widths(field) for extension in VARIANT_FORMATS
+    ]
+
+
+def current_variants(profile, field):
+    """``[(width, webp url, jpeg url), ...]`` of the image now in ``field``, or []"""
+    image = getattr(profile, field)
+    record = (profile.image_variants or {}).get(field)
+    if not image or not record or record.get('name') != image.name:
+        return []
+    return [
+        (actual, default_storage.url(variant_name(image.name, width, 'webp')),
+         default_storage.url(variant_name(image.name, width, 'jpg')))
+        for width, actual in record['widths']
+    ]
+
+
+# -------------------- Rendering --------------------
+
+def _encode(image, extension):
+    image_format, options = VARIANT_FORMATS[extension]
+    if image_format == 'JPEG' and image.mode != 'RGB':
+        # No alpha in JPEG: flatten onto white
+        background = Image.new('RGB', image.size, (255, 255, 255))
+        background.paste(image, mask=image.getchannel('A') if 'A' in image.getbands() else None)
+        image = background
+    output = io.BytesIO()
+    image.save(output, format=image_format, **options)
+    return output.getvalue()
+
+
+def render_variants(f, widths):
+    """``{(width, extension): bytes}`` plus ``{width: actual width}`` for an image file"""
+    original = Image.open(f)
+    original = ImageOps.exif_transpose(original)
+    if original.mode not in ('RGB', 'RGBA'):
+        original = original.convert('RGBA' if 'A' in original.getbands() else 'RGB')
+
+    # The first width not below the original's is rendered at its own size
+    wanted = [width for width in widths if width < original.width]
+    wanted += [width for width in widths if width >= original.width][:1]
+    rendered, actual = {}, {}
+    for width in wanted:
+        image = original.copy()
+        image.thumbnail((width, original.height))
+        actual[width] = image.width
+        for extension in VARIANT_FORMATS:
+            rendered[(width, extension)] = _encode(image, extension)
+    return rendered, actual
+
+
+def _record(profile_id, field, value):
+    """Set (or with None, drop) the variant record of ``field`` under a row lock"""
+    profile = Profile.objects.select_for_update().filter(pk=profile_id).only('id', 'image_variants').first()
+    if profile is None:
+        return
+    records = dict(profile.image_variants or {})
+    if value is None:
+        records.pop(field, None)
+    else:
+        records[field] = value
+    Profile.objects.filter(pk=profile_id).update(image_variants=records)
+
+
+def generate_variants(profile_id, field):
+    """Render and store the variants of one profile image. Returns the widths or None."""
+    profile = Profile.objects.filter(pk=profile_id).only('id', 'user_id', field).first()
+    image = getattr(profile, field, None)
+    if not image:
+        return None
+    name = image.name
+
+    try:
+        with image.open('rb') as f:
+            rendered, actual = render_variants(f, variant_widths(field))
+    except Exception as e:
+        logger.warning(f"Could not render {field} variants for profile {profile_id}: {str(e)}")
+        return None
+
+    stored = []
+    for (width, extension), data in rendered.items():
+        target = variant_name(name, width, extension)
+        if default_storage.exists(target):
+            default_storage.delete(target)
+        stored.append(default_storage.save(target, ContentFile(data)))
+
+    with transaction.atomic():
+        # The image may have been replaced while we were rendering
+        current = Profile.objects.select_for_update().filter(pk=profile_id, **{field: name})
+        if current.values_list('pk', flat=True).first() is None:
+            for target in stored:
+                default_storage.delete(target)
+            return None
+        _record(profile_id, field, {'name': name, 'widths': sorted(actual.items())})
+        user_id = profile.user_id
+        # Cached profile pages must pick up the new markup
+        transaction.on_commit(lambda: bump_profile_version(user_id))
+    return sorted(actual)
+
+
+def delete_variants(field, name, profile_id=None):
+    """Remove the stored variants of the image ``name``, and its record"""
+    for target in variant_names(field, name):
+        default_storage.delete(target)
+    if profile_id is not None:
+        with transaction.atomic():
+            _record(profile_id, field, None)
+
+
+# -------------------- Scheduling --------------------
+
+def _get_executor():
+    global _executor, _executor_pid
+    with _executor_lock:
+        if _executor is None or _executor_pid != os.getpid():
+            _executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='image-variants')
+            _executor_pid = os.getpid()
+        return _executor
+
+
+def _generate_in_background(profile_id, field):
+    try:
+        generate_variants(profile_id, field)
+    except Exception as e:
+        logger.error(f"Error generating {field} variants for profile {profile_id}: {str(e)}", exc_info=True)
+    finally:
+        connection.close()
+
+
+def schedule_variants(profile_id, field):
+    """Generate the variants once the current transaction has committed"""
+    if getattr(settings, 'PROFILE_IMAGE_VARIANTS_ASYNC', True):
+        transaction.on_commit(lambda: _get_executor().submit(_generate_in_background, profile_id, field))
+    else:
+        transaction.on_commit(lambda: generate_variants(profile_id, field))
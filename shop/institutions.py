@@ -0,0 +1,168 @@
+# shop/institutions.py
+"""
+Canonical institutions behind the free-text "place" fields.
+
+Task.task_assigned_place, StudyMaterial.task_assigned_place and
+Education.institution stay free text, but each row also points at an
+Institution keyed by a normalized form of what was typed (case,
+punctuation and spacing folded), so "Harvard University",
+"harvard  university" and "Harvard University." are one institution.
+Institution.usage_count caches how many rows refer to it; both are kept up
+to date by the signal receivers in shop/signals.py. Migration 0028 links
+the rows that existed before, and `manage.py rebuild_institutions`
+recomputes everything set-based should the links ever drift.
+
+Autocomplete reads only the small Institution table: substring matches
+(answered by a pg_trgm GIN index on PostgreSQL, see migration 0020), best
+prefix matches and most used first, topped up with fuzzy trigram matches
+for misspellings. A name picked from the suggestions carries its id, so
+filters compare institution ids instead of running icontains scans over
+the source tables.
+"""
+import re
+
+from django.contrib.postgres.search import TrigramSimilarity
+from django.core.cache import cache
+from django.db import connections, transaction
+from django.db.models import Case, Count, F, IntegerField, OuterRef, Subquery, Value, When
+from django.db.models.functions import Coalesce, Greatest
+
+from .models import Education, Institution, StudyMaterial, Task
+
+# Source model -> (free-text field, Institution foreign key)
+INSTITUTION_FIELDS = {
+    Task: ('task_assigned_place', 'institution'),
+    StudyMaterial: ('task_assigned_place', 'institution'),
+    Education: ('institution', 'canonical_institution'),
+}
+
+AUTOCOMPLETE_LIMIT = 10
+AUTOCOMPLETE_CACHE_TIMEOUT = 5 * 60
+MIN_SIMILARITY = 0.3
+
+_PUNCTUATION_RE = re.compile(r'[^\w]+')
+
+
+def fold_text(value):
+    """Lowercase, punctuation-free, single-spaced form of ``value``"""
+    return ' '.join(_PUNCTUATION_RE.sub(' ', (value or '').lower()).split())
+
+
+def normalize_name(value):
+    """Key for a place name, as stored in Institution.normalized"""
+    return fold_text(value)[:255]
+
+
+def display_name(value):
+    return ' '.join((value or '').split())[:255]
+
+
+def institution_for(value):
+    """The Institution for a typed place name (created if new), or None if blank"""
+    normalized = normalize_name(value)
+    if not normalized:
+        return None
+    institution, _ = Institution.objects.get_or_create(
+        normalized=normalized, defaults={'name': display_name(value)}
+    )
+    return institution
+
+
+def adjust_usage(institution_id, delta):
+    if institution_id:
+        # Never below zero, even if the count has drifted
+        Institution.objects.filter(pk=institution_id).update(usage_count=Greatest(F('usage_count') + delta, 0))
+
+
+def release_usage(counts):
+    """Drop ``{institution_id: n}`` references in one UPDATE"""
+    counts = {pk: n for pk, n in counts.items() if pk and n}
+    if counts:
+        Institution.objects.filter(pk__in=counts).update(usage_count=Greatest(
+            F('usage_count') - Case(*[When(pk=pk, then=Value(n)) for pk, n in counts.items()],
+                                    output_field=IntegerField()),
+            0,
+        ))
+
+
+def _count_of(model, fk):
+    counts = model.objects.filter(**{fk: OuterRef('pk')}).order_by().values(fk).annotate(n=Count('pk')).values('n')
+    return Coalesce(Subquery(counts, output_field=IntegerField()), 0)
+
+
+def recount_usage():
+    """Recompute every usage_count in a single UPDATE"""
+    total = None
+    for model, (_, fk) in INSTITUTION_FIELDS.items():
+        count = _count_of(model, fk)
+        total = count if total is None else total + count
+    return Institution.objects.update(usage_count=total)
+
+
+def rebuild_institutions():
+    """
+    Resolve every source row to its Institution and recount usage. Runs one
+    UPDATE per distinct typed spelling rather than one per row.
+    """
+    with transaction.atomic():
+        for model, (field, fk) in INSTITUTION_FIELDS.items():
+            spellings = set(model.objects.values_list(field, flat=True).distinct())
+            keys = {spelling: normalize_name(spelling) for spelling in spellings}
+            names = {key: display_name(spelling) for spelling, key in keys.items() if key}
+            Institution.objects.bulk_create(
+                [Institution(normalized=key, name=name) for key, name in names.items()],
+                ignore_conflicts=True,
+            )
+            ids = dict(Institution.objects.filter(normalized__in=names).values_list('normalized', 'id'))
+            for spelling, key in keys.items():
+                model.objects.filter(**{field: spelling}).update(**{f'{fk}_id': ids.get(key)})
+        recount_usage()
+    return Institution.objects.count()
+
+
+# -------------------- Autocomplete --------------------
+
+def _fuzzy_available():
+    return connections[Institution.objects.db].vendor == 'postgresql'
+
+
+def autocomplete(query, limit=AUTOCOMPLETE_LIMIT):
+    """Top institutions for what the user has typed so far, as dicts"""
+    normalized = normalize_name(query)
+    if not normalized:
+        return []
+
+    cache_key = f'institutions:autocomplete:{limit}:{normalized}'
+    results = cache.get(cache_key)
+    if results is not None:
+        return results
+
+    used = Institution.objects.filter(usage_count__gt=0)
+    matches = list(
+        used.filter(normalized__contains=normalized)
+        .annotate(is_prefix=Case(
+            When(normalized__startswith=normalized, then=Value(1)),
+            default=Value(0),
+            output_field=IntegerField(),
+        ))
+        .order_by('-is_prefix', '-usage_count', 'name')
+        .values('id', 'name', 'usage_count')[:limit]
+    )
+
+    if len(matches) < limit and len(normalized) >= 3 and _fuzzy_available():
+        # Misspellings: nearest names by trigram similarity
+        seen = [match['id'] for match in matches]
+        matches += list(
+            used.filter(normalized__trigram_similar=normalized).exclude(pk__in=seen)
+            .annotate(similarity=TrigramSimilarity('normalized', normalized))
+            .filter(similarity__gte=MIN_SIMILARITY)
+            .order_by('-similarity', '-usage_count')
+            .values('id', 'name', 'usage_count')[:limit - len(matches)]
+        )
+
+    results = [
+        {'id': match['id'], 'name': match['name'], 'count': match['usage_count']}
+        for match in matches
+    ]
+    cache.set(cache_key, results, AUTOCOMPLETE_CACHE_TIMEOUT)
+    return results
@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from shop.archive import ARCHIVE_BATCH_SIZE, archive_expired_tasks
+
+
+class Command(BaseCommand):
+    help = "Move expired, unassigned tasks and their applications to the archive tables"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=ARCHIVE_BATCH_SIZE,
+                            help="Tasks moved per transaction")
+        parser.add_argument('--max-batches', type=int, default=None,
+                            help="Stop after this many batches (default: until done)")
+        parser.add_argument('--grace-days', type=int, default=0,
+                            help="Only archive tasks whose deadline passed at least this many days ago")
+
+    def handle(self, *args, **options):
+        tasks, applications = archive_expired_tasks(
+            batch_size=options['batch_size'],
+            max_batches=options['max_batches'],
+            grace_days=options['grace_days'],
+        )
+        self.stdout.write(self.style.SUCCESS(f"Archived {tasks} tasks and {applications} applications"))
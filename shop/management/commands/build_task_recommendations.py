@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from shop.recommendations import RECOMMENDATION_BLOCK_SIZE, build_recommendations
+
+
+class Command(BaseCommand):
+    help = "Recompute the 'recommended for you' tasks of every active user (run nightly)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--block-size', type=int, default=RECOMMENDATION_BLOCK_SIZE,
+                            help="Users scored and written per batch")
+        parser.add_argument('--limit', type=int, default=None,
+                            help="Tasks kept per user (default: TASK_RECOMMENDATIONS_PER_USER)")
+
+    def handle(self, *args, **options):
+        users, recommendations = build_recommendations(
+            block_size=options['block_size'],
+            limit=options['limit'],
+        )
+        self.stdout.write(self.style.SUCCESS(f"Stored {recommendations} recommendations for {users} users"))
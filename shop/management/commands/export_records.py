@@ -0,0 +1,26 @@
+import sys
+
+from django.core.management.base import BaseCommand
+
+from shop.bulk_io import EXPORT_CHUNK_SIZE, FORMATS, RECORD_TYPES, export_records, format_for
+
+
+class Command(BaseCommand):
+    help = "Export tasks or study materials to a CSV or JSON Lines file ('-' for stdout)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('record_type', choices=sorted(RECORD_TYPES))
+        parser.add_argument('path')
+        parser.add_argument('--format', choices=FORMATS, default=None,
+                            help="File format (default: from the file extension)")
+        parser.add_argument('--chunk-size', type=int, default=EXPORT_CHUNK_SIZE,
+                            help="Rows fetched from the database per round trip")
+
+    def handle(self, *args, **options):
+        fmt = format_for(options['path'], options['format'])
+        if options['path'] == '-':
+            written = export_records(options['record_type'], sys.stdout, fmt, options['chunk_size'])
+        else:
+            with open(options['path'], 'w', newline='', encoding='utf-8') as stream:
+                written = export_records(options['record_type'], stream, fmt, options['chunk_size'])
+            self.stdout.write(self.style.SUCCESS(f"Exported {written} {options['record_type']}"))
@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+
+from shop.image_variants import IMAGE_FIELDS, current_variants, generate_variants
+from shop.models import Profile
+
+
+class Command(BaseCommand):
+    help = "Render WebP/JPEG variants for profile pictures and banners that do not have them yet"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--all',
+            action='store_true',
+            help="Re-render variants for every image, not only missing ones",
+        )
+
+    def handle(self, *args, **options):
+        with_images = Q()
+        for field in IMAGE_FIELDS:
+            with_images |= Q(**{f'{field}__gt': ''})
+        queryset = Profile.objects.filter(with_images).only('id', 'image_variants', *IMAGE_FIELDS)
+
+        generated = skipped = 0
+        for profile in queryset.iterator(chunk_size=500):
+            for field in IMAGE_FIELDS:
+                if not getattr(profile, field):
+                    continue
+                if not options['all'] and current_variants(profile, field):
+                    continue
+                if generate_variants(profile.pk, field):
+                    generated += 1
+                else:
+                    skipped += 1
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Generated variants for {generated} images ({skipped} skipped)"
+        ))
@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+
+from shop.models import StudyMaterial
+from shop.previews import generate_preview
+
+
+class Command(BaseCommand):
+    help = "Render WebP previews for study materials that do not have one yet"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--all',
+            action='store_true',
+            help="Re-render previews for every material, not only missing ones",
+        )
+
+    def handle(self, *args, **options):
+        queryset = StudyMaterial.objects.exclude(file='')
+        if not options['all']:
+            queryset = queryset.filter(preview__isnull=True)
+
+        generated = skipped = 0
+        for material_id in queryset.values_list('id', flat=True).iterator(chunk_size=500):
+            if generate_preview(material_id):
+                generated += 1
+            else:
+                skipped += 1
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Generated {generated} previews ({skipped} skipped)"
+        ))
@@ -0,0 +1,38 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from shop.bulk_io import FORMATS, IMPORT_BATCH_SIZE, RECORD_TYPES, format_for, import_records
+
+
+class Command(BaseCommand):
+    help = "Import tasks or study materials from a CSV or JSON Lines file ('-' for stdin)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('record_type', choices=sorted(RECORD_TYPES))
+        parser.add_argument('path')
+        parser.add_argument('--format', choices=FORMATS, default=None,
+                            help="File format (default: from the file extension)")
+        parser.add_argument('--batch-size', type=int, default=IMPORT_BATCH_SIZE,
+                            help="Rows validated and inserted per bulk_create")
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError("--batch-size must be positive")
+        fmt = format_for(options['path'], options['format'])
+        if options['path'] == '-':
+            result = import_records(options['record_type'], sys.stdin, fmt, options['batch_size'])
+        else:
+            try:
+                with open(options['path'], newline='', encoding='utf-8-sig') as stream:
+                    result = import_records(options['record_type'], stream, fmt, options['batch_size'])
+            except FileNotFoundError:
+                raise CommandError(f"No such file: {options['path']}")
+
+        for line_number, message in result.errors:
+            self.stderr.write(f"Line {line_number}: {message}")
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {result.created} {options['record_type']}, skipped {len(result.errors)} invalid rows"
+        ))
+        if options['record_type'] == 'materials' and result.created:
+            self.stdout.write("Run rebuild_related_materials and generate_previews to index the new materials")
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from shop.institutions import rebuild_institutions
+
+
+class Command(BaseCommand):
+    help = "Link tasks, study materials and education entries to canonical institutions and recount usage"
+
+    def handle(self, *args, **options):
+        total = rebuild_institutions()
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {total} institutions"))
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from shop.people_search import INDEX_BATCH_SIZE, rebuild_people_search
+
+
+class Command(BaseCommand):
+    help = "Rebuild the people search entry of every user"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=INDEX_BATCH_SIZE,
+                            help="Users indexed per bulk upsert")
+
+    def handle(self, *args, **options):
+        written = rebuild_people_search(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"Indexed {written} users for people search"))
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from shop.models import StudyMaterial
+from shop.related import rebuild_list
+
+
+class Command(BaseCommand):
+    help = "Recompute the precomputed related-materials list of every study material"
+
+    def handle(self, *args, **options):
+        rebuilt = 0
+        materials = StudyMaterial.objects.only(
+            'id', 'title', 'category', 'task_assigned_place', 'created_at'
+        ).order_by('pk')
+        for material in materials.iterator(chunk_size=500):
+            rebuild_list(material)
+            rebuilt += 1
+
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt related lists for {rebuilt} materials"))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from shop.task_stats import reconcile
+
+
+class Command(BaseCommand):
+    help = "Recount every user's task and application stats with set-based UPDATEs"
+
+    def handle(self, *args, **options):
+        rows = reconcile()
+        self.stdout.write(self.style.SUCCESS(f"Reconciled task stats for {rows} users"))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from shop.directory import refresh_directory
+
+
+class Command(BaseCommand):
+    help = "Rebuild the ranked user directory table and its headline counters"
+
+    def handle(self, *args, **options):
+        ranked = refresh_directory()
+        self.stdout.write(self.style.SUCCESS(f"Ranked {ranked} users in the directory"))
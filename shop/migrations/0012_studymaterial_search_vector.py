@@ -0,0 +1,62 @@
+# Generated by Django 5.2.1 on 2026-10-18 13:27
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.db import migrations
+
+
+# Keep the weights in sync with shop.search.SEARCH_WEIGHTS
+CREATE_TRIGGER_SQL = """
+CREATE OR REPLACE FUNCTION shop_studymaterial_search_vector_update() RETURNS trigger AS $$
+BEGIN
+    NEW.search_vector :=
+        setweight(to_tsvector('english', coalesce(NEW.title, '')), 'A') ||
+        setweight(to_tsvector('english', coalesce(NEW.task_assigned_place, '')), 'B') ||
+        setweight(to_tsvector('english', coalesce(NEW.description, '')), 'C');
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER shop_studymaterial_search_vector_trigger
+    BEFORE INSERT OR UPDATE OF title, description, task_assigned_place
+    ON shop_studymaterial
+    FOR EACH ROW EXECUTE FUNCTION shop_studymaterial_search_vector_update();
+
+UPDATE shop_studymaterial SET title = title;
+"""
+
+DROP_TRIGGER_SQL = """
+DROP TRIGGER IF EXISTS shop_studymaterial_search_vector_trigger ON shop_studymaterial;
+DROP FUNCTION IF EXISTS shop_studymaterial_search_vector_update();
+"""
+
+
+def create_search_trigger(apps, schema_editor):
+    # Other backends fall back to icontains filtering in shop.search
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(CREATE_TRIGGER_SQL)
+
+
+def drop_search_trigger(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(DROP_TRIGGER_SQL)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0011_task_is_approved'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='studymaterial',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='studymaterial',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='shop_studym_search_gin'),
+        ),
+        migrations.RunPython(create_search_trigger, drop_search_trigger),
+    ]
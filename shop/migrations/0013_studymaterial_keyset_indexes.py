@@ -0,0 +1,21 @@
+# Generated by Django 5.2.1 on 2026-10-18 13:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0012_studymaterial_search_vector'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='studymaterial',
+            index=models.Index(fields=['created_at', 'id'], name='shop_studym_created_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='studymaterial',
+            index=models.Index(fields=['views', 'id'], name='shop_studym_views_id_idx'),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.1 on 2026-10-18 13:31
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0013_studymaterial_keyset_indexes'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='materialview',
+            name='viewed_at',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+    ]
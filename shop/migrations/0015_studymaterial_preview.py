@@ -0,0 +1,18 @@
+# Generated by Django 5.2.1 on 2026-10-18 13:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0014_alter_materialview_viewed_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='studymaterial',
+            name='preview',
+            field=models.ImageField(blank=True, editable=False, null=True, upload_to='study_materials/%Y/%m/'),
+        ),
+    ]
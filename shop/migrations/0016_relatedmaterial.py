@@ -0,0 +1,28 @@
+# Generated by Django 5.2.1 on 2026-10-18 13:35
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0015_studymaterial_preview'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RelatedMaterial',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('score', models.FloatField()),
+                ('material', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='related_entries', to='shop.studymaterial')),
+                ('related', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='related_from', to='shop.studymaterial')),
+            ],
+            options={
+                'ordering': ['-score'],
+                'indexes': [models.Index(fields=['material', '-score'], name='shop_relmat_material_score')],
+                'unique_together': {('material', 'related')},
+            },
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.1 on 2026-10-18 13:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0017_storedblob'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='task',
+            index=models.Index(condition=models.Q(('is_approved', True)), fields=['-created_at', '-id'], name='shop_task_feed_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='task',
+            index=models.Index(condition=models.Q(('is_approved', True)), fields=['category', '-created_at', '-id'], name='shop_task_feed_category_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='task',
+            index=models.Index(condition=models.Q(('is_approved', True)), fields=['budget', '-created_at'], name='shop_task_feed_budget_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='task',
+            index=models.Index(condition=models.Q(('is_approved', True)), fields=['deadline', '-created_at'], name='shop_task_feed_deadline_idx'),
+        ),
+    ]
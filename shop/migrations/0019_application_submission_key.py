@@ -0,0 +1,18 @@
+# Generated by Django 5.2.1 on 2026-10-18 13:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0018_task_feed_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='application',
+            name='submission_key',
+            field=models.CharField(blank=True, editable=False, max_length=64, null=True),
+        ),
+    ]
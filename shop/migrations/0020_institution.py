@@ -0,0 +1,67 @@
+# Generated by Django 5.2.1 on 2026-10-18 13:45
+
+import django.db.models.deletion
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations, models
+
+
+# Substring and fuzzy autocomplete lookups (see shop.institutions)
+CREATE_TRGM_INDEX_SQL = """
+CREATE INDEX IF NOT EXISTS shop_institution_normalized_trgm
+    ON shop_institution USING gin (normalized gin_trgm_ops);
+"""
+
+DROP_TRGM_INDEX_SQL = """
+DROP INDEX IF EXISTS shop_institution_normalized_trgm;
+"""
+
+
+def create_trigram_index(apps, schema_editor):
+    # Other backends answer autocomplete from the unique index / a table scan
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(CREATE_TRGM_INDEX_SQL)
+
+
+def drop_trigram_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(DROP_TRGM_INDEX_SQL)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0019_application_submission_key'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Institution',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255)),
+                ('normalized', models.CharField(max_length=255, unique=True)),
+                ('usage_count', models.PositiveIntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'ordering': ['-usage_count', 'name'],
+            },
+        ),
+        migrations.AddField(
+            model_name='education',
+            name='canonical_institution',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='educations', to='shop.institution'),
+        ),
+        migrations.AddField(
+            model_name='studymaterial',
+            name='institution',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='study_materials', to='shop.institution'),
+        ),
+        migrations.AddField(
+            model_name='task',
+            name='institution',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='tasks', to='shop.institution'),
+        ),
+        TrigramExtension(),
+        migrations.RunPython(create_trigram_index, drop_trigram_index),
+    ]
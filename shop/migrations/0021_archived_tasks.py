@@ -0,0 +1,72 @@
+# Generated by Django 5.2.1 on 2026-10-18 13:47
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0020_institution'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedApplication',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('original_id', models.BigIntegerField(unique=True)),
+                ('message', models.TextField(blank=True, null=True)),
+                ('applied_at', models.DateTimeField()),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('accepted', 'Accepted'), ('rejected', 'Rejected')], max_length=20)),
+            ],
+            options={
+                'ordering': ['-applied_at'],
+            },
+        ),
+        migrations.CreateModel(
+            name='ArchivedTask',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('original_id', models.BigIntegerField(unique=True)),
+                ('title', models.CharField(max_length=200)),
+                ('slug', models.SlugField(db_index=False)),
+                ('description', models.TextField()),
+                ('budget', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('status', models.CharField(max_length=20)),
+                ('category', models.CharField(choices=[('general', 'General'), ('urgent', 'Urgent'), ('delivery', 'Delivery'), ('cleaning', 'Cleaning')], max_length=20)),
+                ('task_assigned_place', models.TextField(blank=True, null=True)),
+                ('is_approved', models.BooleanField(default=False)),
+                ('deadline', models.DateField(blank=True, null=True)),
+                ('created_at', models.DateTimeField()),
+                ('archived_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'ordering': ['-deadline', '-id'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='task',
+            index=models.Index(condition=models.Q(('assigned_to__isnull', True)), fields=['deadline', 'id'], name='shop_task_expiry_idx'),
+        ),
+        migrations.AddField(
+            model_name='archivedapplication',
+            name='applicant',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_applications', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddField(
+            model_name='archivedtask',
+            name='created_by',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_tasks', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddField(
+            model_name='archivedapplication',
+            name='task',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='applications', to='shop.archivedtask'),
+        ),
+        migrations.AddIndex(
+            model_name='archivedtask',
+            index=models.Index(fields=['created_by', '-deadline', '-id'], name='shop_archtask_owner_idx'),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.1 on 2026-10-18 13:51
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0021_archived_tasks'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TaskRecommendation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('score', models.FloatField()),
+                ('task', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='recommendations', to='shop.task')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='task_recommendations', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-score'],
+                'indexes': [models.Index(fields=['user', '-score'], name='shop_taskrec_user_score')],
+                'unique_together': {('user', 'task')},
+            },
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.1 on 2026-10-18 13:52
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0022_task_recommendations'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserTaskStats',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='task_stats', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('posted_count', models.IntegerField(default=0)),
+                ('open_count', models.IntegerField(default=0)),
+                ('expired_count', models.IntegerField(default=0)),
+                ('pending_applications', models.IntegerField(default=0)),
+                ('accepted_applications', models.IntegerField(default=0)),
+                ('rejected_applications', models.IntegerField(default=0)),
+                ('next_expiry', models.DateField(blank=True, null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'User Task Stats',
+                'verbose_name_plural': 'User Task Stats',
+            },
+        ),
+    ]
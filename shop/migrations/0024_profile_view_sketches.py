@@ -0,0 +1,27 @@
+# Generated by Django 5.2.1 on 2026-10-18 13:57
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0023_user_task_stats'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProfileViewSketch',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField(blank=True, null=True)),
+                ('registers', models.BinaryField()),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('profile', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='view_sketches', to='shop.profile')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('profile', 'day'), name='shop_pvsketch_profile_day'), models.UniqueConstraint(condition=models.Q(('day__isnull', True)), fields=('profile',), name='shop_pvsketch_profile_all_time')],
+            },
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.1 on 2026-10-18 14:01
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0024_profile_view_sketches'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DirectoryRank',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='directory_rank', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('rank', models.PositiveIntegerField(unique=True)),
+                ('views', models.IntegerField(default=0)),
+                ('institution', models.CharField(blank=True, max_length=200)),
+                ('refreshed_at', models.DateTimeField()),
+            ],
+            options={
+                'ordering': ['rank'],
+            },
+        ),
+    ]
@@ -0,0 +1,50 @@
+# Generated by Django 5.2.1 on 2026-10-18 14:04
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+# Substring and fuzzy people search (see shop.people_search)
+CREATE_TRGM_INDEX_SQL = """
+CREATE INDEX IF NOT EXISTS shop_personsearch_document_trgm
+    ON shop_personsearchentry USING gin (document gin_trgm_ops);
+"""
+
+DROP_TRGM_INDEX_SQL = """
+DROP INDEX IF EXISTS shop_personsearch_document_trgm;
+"""
+
+
+def create_trigram_index(apps, schema_editor):
+    # Other backends search with a table scan
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(CREATE_TRGM_INDEX_SQL)
+
+
+def drop_trigram_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(DROP_TRGM_INDEX_SQL)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0025_directory_rank'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PersonSearchEntry',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='search_entry', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('name', models.CharField(blank=True, max_length=255)),
+                ('title', models.CharField(blank=True, max_length=100)),
+                ('location', models.CharField(blank=True, max_length=100)),
+                ('institution', models.CharField(blank=True, max_length=200)),
+                ('document', models.TextField(blank=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.RunPython(create_trigram_index, drop_trigram_index),
+    ]
@@ -0,0 +1,59 @@
+# Generated by Django 5.2.1 on 2026-10-18 16:20
+
+import re
+
+from django.db import migrations
+from django.db.models import Count, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+# Source model -> (free-text field, Institution foreign key)
+SOURCES = {
+    'Task': ('task_assigned_place', 'institution'),
+    'StudyMaterial': ('task_assigned_place', 'institution'),
+    'Education': ('institution', 'canonical_institution'),
+}
+
+_PUNCTUATION_RE = re.compile(r'[^\w]+')
+
+
+# Frozen copies of shop.institutions.normalize_name / display_name
+def normalize_name(value):
+    return ' '.join(_PUNCTUATION_RE.sub(' ', (value or '').lower()).split())[:255]
+
+
+def display_name(value):
+    return ' '.join((value or '').split())[:255]
+
+
+def link_institutions(apps, schema_editor):
+    # Rows saved before 0020 have no institution yet (see shop.institutions)
+    Institution = apps.get_model('shop', 'Institution')
+    usage = None
+    for model_name, (field, fk) in SOURCES.items():
+        model = apps.get_model('shop', model_name)
+        spellings = set(model.objects.values_list(field, flat=True).distinct())
+        keys = {spelling: normalize_name(spelling) for spelling in spellings}
+        names = {key: display_name(spelling) for spelling, key in keys.items() if key}
+        Institution.objects.bulk_create(
+            [Institution(normalized=key, name=name) for key, name in names.items()],
+            ignore_conflicts=True,
+        )
+        ids = dict(Institution.objects.filter(normalized__in=names).values_list('normalized', 'id'))
+        for spelling, key in keys.items():
+            model.objects.filter(**{field: spelling}).update(**{f'{fk}_id': ids.get(key)})
+
+        counts = model.objects.filter(**{fk: OuterRef('pk')}).order_by().values(fk).annotate(n=Count('pk')).values('n')
+        count = Coalesce(Subquery(counts, output_field=IntegerField()), 0)
+        usage = count if usage is None else usage + count
+    Institution.objects.update(usage_count=usage)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0027_profile_image_variants'),
+    ]
+
+    operations = [
+        migrations.RunPython(link_institutions, migrations.RunPython.noop),
+    ]
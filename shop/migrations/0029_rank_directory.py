@@ -0,0 +1,47 @@
+# Generated by Django 5.2.1 on 2026-10-18 16:40
+
+from django.conf import settings
+from django.db import connections, migrations
+from django.utils import timezone
+
+
+def build_first_ranking(apps, schema_editor):
+    # First ranking; refresh_user_directory keeps it current (see shop.directory)
+    DirectoryRank = apps.get_model('shop', 'DirectoryRank')
+    connection = connections[DirectoryRank.objects.db]
+    quote = connection.ops.quote_name
+    user = apps.get_model(settings.AUTH_USER_MODEL)._meta
+    profile, education = apps.get_model('shop', 'Profile')._meta, apps.get_model('shop', 'Education')._meta
+    rank = DirectoryRank._meta
+    column = lambda meta, name: quote(meta.get_field(name).column)
+
+    DirectoryRank.objects.all().delete()
+    with connection.cursor() as cursor:
+        cursor.execute(f"""
+            INSERT INTO {quote(rank.db_table)}
+                ({column(rank, 'user')}, {column(rank, 'rank')}, {column(rank, 'views')},
+                 {column(rank, 'institution')}, {column(rank, 'refreshed_at')})
+            SELECT u.{column(user, 'id')},
+                   ROW_NUMBER() OVER (ORDER BY COALESCE(p.{column(profile, 'views')}, 0) DESC, u.{column(user, 'id')} DESC),
+                   COALESCE(p.{column(profile, 'views')}, 0),
+                   COALESCE((
+                       SELECT e.{column(education, 'institution')} FROM {quote(education.db_table)} e
+                       WHERE e.{column(education, 'user')} = u.{column(user, 'id')}
+                       ORDER BY e.{column(education, 'start_date')} DESC, e.{column(education, 'id')} DESC
+                       LIMIT 1
+                   ), ''),
+                   %s
+            FROM {quote(user.db_table)} u
+            LEFT JOIN {quote(profile.db_table)} p ON p.{column(profile, 'user')} = u.{column(user, 'id')}
+        """, [timezone.now()])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0028_backfill_institutions'),
+    ]
+
+    operations = [
+        migrations.RunPython(build_first_ranking, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,69 @@
+# Generated by Django 5.2.1 on 2026-10-18 16:55
+
+import re
+
+from django.conf import settings
+from django.db import migrations
+from django.db.models import OuterRef, Subquery
+
+BATCH_SIZE = 1000
+
+_PUNCTUATION_RE = re.compile(r'[^\w]+')
+
+
+# Frozen copy of shop.institutions.fold_text
+def fold_text(value):
+    return ' '.join(_PUNCTUATION_RE.sub(' ', (value or '').lower()).split())
+
+
+def index_existing_people(apps, schema_editor):
+    # Users who joined before 0026 have no search entry yet (see shop.people_search)
+    User = apps.get_model(settings.AUTH_USER_MODEL)
+    Education = apps.get_model('shop', 'Education')
+    PersonSearchEntry = apps.get_model('shop', 'PersonSearchEntry')
+    latest_institution = Education.objects.filter(
+        user=OuterRef('pk')
+    ).order_by('-start_date', '-id').values('institution')[:1]
+    rows = User.objects.order_by('pk').annotate(
+        latest_institution=Subquery(latest_institution),
+    ).values_list(
+        'pk', 'username', 'first_name', 'last_name',
+        'profile__title', 'profile__location', 'latest_institution',
+    )
+
+    entries = []
+    for pk, username, first_name, last_name, title, location, institution in rows.iterator(chunk_size=BATCH_SIZE):
+        name = fold_text(' '.join(part for part in (username, first_name, last_name) if part))
+        title, location, institution = title or '', location or '', institution or ''
+        entries.append(PersonSearchEntry(
+            user_id=pk,
+            name=name[:255],
+            title=title,
+            location=location,
+            institution=institution,
+            document=fold_text(' '.join((name, title, institution, location))),
+        ))
+        if len(entries) == BATCH_SIZE:
+            _write(PersonSearchEntry, entries)
+            entries = []
+    _write(PersonSearchEntry, entries)
+
+
+def _write(PersonSearchEntry, entries):
+    PersonSearchEntry.objects.bulk_create(
+        entries,
+        update_conflicts=True,
+        unique_fields=['user'],
+        update_fields=['name', 'title', 'location', 'institution', 'document', 'updated_at'],
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0029_rank_directory'),
+    ]
+
+    operations = [
+        migrations.RunPython(index_existing_people, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.1 on 2026-10-18 17:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0030_index_people'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='task',
+            name='shop_task_feed_budget_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='task',
+            name='shop_task_feed_deadline_idx',
+        ),
+        migrations.AddIndex(
+            model_name='task',
+            index=models.Index(condition=models.Q(('is_approved', True)), fields=['budget', '-created_at', '-id'], name='shop_task_feed_budget_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='task',
+            index=models.Index(condition=models.Q(('is_approved', True)), fields=['deadline', '-created_at', '-id'], name='shop_task_feed_deadline_idx'),
+        ),
+    ]
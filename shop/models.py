@@ -1,6 +1,8 @@
 # shop/models.py
 from django.db import models
 from django.contrib.auth.models import AbstractUser,User
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
 from django.utils.text import slugify
 from django.core.validators import MinValueValidator
 from django.core.exceptions import ValidationError
@@ -13,6 +15,8 @@ from django.conf import settings
 from django.core.validators import FileExtensionValidator
 from django.utils import timezone
 
+from .slugs import save_with_unique_slug
+
 def get_upload_path(instance, filename):
     now = datetime.datetime.now().strftime("%Y/%m/%d")
     folder = 'task_attachments'
@@ -28,6 +32,19 @@ class CustomUser(AbstractUser):
     def __str__(self):
         return self.username
 
+class Institution(models.Model):
+    """Canonical school/college/company behind the free-text place fields (shop/institutions.py)"""
+    name = models.CharField(max_length=255)
+    normalized = models.CharField(max_length=255, unique=True)
+    usage_count = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        ordering = ['-usage_count', 'name']
+    
+    def __str__(self):
+        return self.name
+
 class Task(models.Model):
     STATUS_CHOICES = [
         ('posted', 'Posted'),
@@ -71,6 +88,15 @@ class Task(models.Model):
         verbose_name="Assigned Place (School/College/Company)",
         help_text="E.g., 'Harvard University', 'Google Inc', 'ABC School'",
     )
+    # Resolved from task_assigned_place by shop/signals.py
+    institution = models.ForeignKey(
+        Institution,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        editable=False,
+        related_name='tasks'
+    )
     is_approved = models.BooleanField(
         default=False,
         verbose_name="Approved",
@@ -79,18 +105,45 @@ class Task(models.Model):
     deadline = models.DateField(null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     
+    class Meta:
+        indexes = [
+            # Task board feed (see shop/feed.py): partial indexes over
+            # approved tasks only, each ending in the keyset sort key
+            models.Index(
+                fields=['-created_at', '-id'],
+                name='shop_task_feed_idx',
+                condition=models.Q(is_approved=True),
+            ),
+            models.Index(
+                fields=['category', '-created_at', '-id'],
+                name='shop_task_feed_category_idx',
+                condition=models.Q(is_approved=True),
+            ),
+            models.Index(
+                fields=['budget', '-created_at', '-id'],
+                name='shop_task_feed_budget_idx',
+                condition=models.Q(is_approved=True),
+            ),
+            models.Index(
+                fields=['deadline', '-created_at', '-id'],
+                name='shop_task_feed_deadline_idx',
+                condition=models.Q(is_approved=True),
+            ),
+            # Expiry scan of the archival job (see shop/archive.py)
+            models.Index(
+                fields=['deadline', 'id'],
+                name='shop_task_expiry_idx',
+                condition=models.Q(assigned_to__isnull=True),
+            ),
+        ]
+    
     def __str__(self):
         return self.title
     
     def save(self, *args, **kwargs):
         if not self.slug:
-            base_slug = slugify(self.title)
-            slug = base_slug
-            counter = 1
-            while Task.objects.filter(slug=slug).exists():
-                slug = f"{base_slug}-{counter}"
-                counter += 1
-            self.slug = slug
+            # Allocates the next free "<title>-<n>" in one query (shop/slugs.py)
+            return save_with_unique_slug(self, super().save, self.title, *args, **kwargs)
         super().save(*args, **kwargs)
     
     def clean(self):
@@ -114,7 +167,10 @@ class Profile(models.Model):
     location = models.CharField(max_length=100, blank=True)
     phone = models.CharField(max_length=20, blank=True)
     website = models.URLField(blank=True)
+    # Approximate unique viewers, all time; written by shop/profile_views.py
     views = models.IntegerField(default=0)
+    # Resized copies of the images above; written by shop/image_variants.py
+    image_variants = models.JSONField(default=dict, blank=True, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -128,9 +184,91 @@ class Profile(models.Model):
         ordering = ['-created_at']
 
 
+class ProfileViewSketch(models.Model):
+    """
+    HyperLogLog sketch of a profile's unique viewers for one day, or for all
+    time when ``day`` is null (see shop/profile_views.py)
+    """
+    profile = models.ForeignKey(Profile, on_delete=models.CASCADE, related_name='view_sketches')
+    day = models.DateField(null=True, blank=True)
+    registers = models.BinaryField()
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['profile', 'day'], name='shop_pvsketch_profile_day'),
+            models.UniqueConstraint(
+                fields=['profile'],
+                condition=models.Q(day__isnull=True),
+                name='shop_pvsketch_profile_all_time',
+            ),
+        ]
+    
+    def __str__(self):
+        return f"Viewers of {self.profile_id} on {self.day or 'all days'}"
+
+
+class DirectoryRank(models.Model):
+    """
+    One row of the materialized user directory ranking, rebuilt
+    periodically by shop/directory.py
+    """
+    user = models.OneToOneField(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='directory_rank'
+    )
+    # 1 = most viewed; unique, so it is also the directory's page key
+    rank = models.PositiveIntegerField(unique=True)
+    views = models.IntegerField(default=0)
+    # Most recent Education.institution, shown on the card
+    institution = models.CharField(max_length=200, blank=True)
+    refreshed_at = models.DateTimeField()
+    
+    class Meta:
+        ordering = ['rank']
+    
+    def __str__(self):
+        return f"#{self.rank}: {self.user_id}"
+
+
+class PersonSearchEntry(models.Model):
+    """
+    The searchable text of one user, kept in sync by shop/people_search.py
+    """
+    user = models.OneToOneField(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='search_entry'
+    )
+    # Username and full name, folded like the search queries
+    name = models.CharField(max_length=255, blank=True)
+    title = models.CharField(max_length=100, blank=True)
+    location = models.CharField(max_length=100, blank=True)
+    # Most recent Education.institution
+    institution = models.CharField(max_length=200, blank=True)
+    # All of the above, normalized; trigram-indexed on PostgreSQL (migration 0026)
+    document = models.TextField(blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return self.name
+
+
 class Education(models.Model):
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='educations')
     institution = models.CharField(max_length=200)
+    # Resolved from institution by shop/signals.py
+    canonical_institution = models.ForeignKey(
+        Institution,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        editable=False,
+        related_name='educations'
+    )
     degree = models.CharField(max_length=100)
     field_of_study = models.CharField(max_length=100, blank=True)
     start_date = models.DateField()
@@ -267,10 +405,26 @@ class StudyMaterial(models.Model):
         null=True,
         verbose_name="Institution/Organization"
     )
+    # Resolved from task_assigned_place by shop/signals.py
+    institution = models.ForeignKey(
+        Institution,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        editable=False,
+        related_name='study_materials'
+    )
     file = models.FileField(
         upload_to='study_materials/%Y/%m/',
         help_text="Upload PDF or image files only"
     )
+    # Small WebP rendering of the image / first PDF page (see shop/previews.py)
+    preview = models.ImageField(
+        upload_to='study_materials/%Y/%m/',
+        blank=True,
+        null=True,
+        editable=False
+    )
     material_type = models.CharField(max_length=20, choices=MATERIAL_TYPE_CHOICES)
     category = models.CharField(max_length=20, choices=CATEGORY_CHOICES, default='other')
     is_approved = models.BooleanField(
@@ -279,6 +433,8 @@ class StudyMaterial(models.Model):
         help_text="Check this box to approve the material for public viewing"
     )
     views = models.PositiveIntegerField(default=0)
+    # Maintained by a database trigger on PostgreSQL (see shop/search.py)
+    search_vector = SearchVectorField(null=True, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
@@ -291,6 +447,10 @@ class StudyMaterial(models.Model):
             models.Index(fields=['material_type']),
             models.Index(fields=['category']),
             models.Index(fields=['created_at']),
+            # Sort keys for keyset pagination (see shop/pagination.py)
+            models.Index(fields=['created_at', 'id'], name='shop_studym_created_id_idx'),
+            models.Index(fields=['views', 'id'], name='shop_studym_views_id_idx'),
+            GinIndex(fields=['search_vector'], name='shop_studym_search_gin'),
         ]
     
     def __str__(self):
@@ -339,7 +499,8 @@ class MaterialView(models.Model):
         null=True, 
         blank=True
     )
-    viewed_at = models.DateTimeField(auto_now_add=True)
+    # Set when the view happened, not when the batch was written
+    viewed_at = models.DateTimeField(default=timezone.now)
     ip_address = models.GenericIPAddressField(null=True, blank=True)
     
     class Meta:
@@ -356,6 +517,47 @@ class MaterialView(models.Model):
     def __str__(self):
         return f"View of {self.study_material} by {self.user or 'Anonymous'}"
 
+
+class RelatedMaterial(models.Model):
+    """Precomputed 'related materials' entry, maintained by shop/related.py"""
+    material = models.ForeignKey(
+        StudyMaterial,
+        on_delete=models.CASCADE,
+        related_name='related_entries'
+    )
+    related = models.ForeignKey(
+        StudyMaterial,
+        on_delete=models.CASCADE,
+        related_name='related_from'
+    )
+    score = models.FloatField()
+    
+    class Meta:
+        ordering = ['-score']
+        unique_together = ('material', 'related')
+        indexes = [
+            models.Index(fields=['material', '-score'], name='shop_relmat_material_score'),
+        ]
+    
+    def __str__(self):
+        return f"{self.related_id} related to {self.material_id} ({self.score:.2f})"
+
+
+class StoredBlob(models.Model):
+    """One stored copy of an uploaded file, shared by every upload with the same content (shop/blobstore.py)"""
+    digest = models.CharField(max_length=64)
+    extension = models.CharField(max_length=10, blank=True)
+    name = models.CharField(max_length=255, unique=True)
+    size = models.BigIntegerField()
+    ref_count = models.PositiveIntegerField(default=1)
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        unique_together = ('digest', 'extension')
+    
+    def __str__(self):
+        return f"{self.name} ({self.ref_count} refs)"
+
 #-----------------------------------------------------------------------------
 class Application(models.Model):
     STATUS_CHOICES = [
@@ -369,6 +571,8 @@ class Application(models.Model):
     message = models.TextField(blank=True, null=True)
     applied_at = models.DateTimeField(auto_now_add=True)
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    # Idempotency key of the form submission that created it (shop/applications.py)
+    submission_key = models.CharField(max_length=64, blank=True, null=True, editable=False)
     
     class Meta:
         unique_together = ('applicant', 'task')
@@ -380,6 +584,58 @@ class Application(models.Model):
     def get_status_display(self):
         return dict(self.STATUS_CHOICES)[self.status]
 
+class TaskRecommendation(models.Model):
+    """Precomputed 'recommended for you' entry, written nightly by shop/recommendations.py"""
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='task_recommendations'
+    )
+    task = models.ForeignKey(
+        Task,
+        on_delete=models.CASCADE,
+        related_name='recommendations'
+    )
+    score = models.FloatField()
+    
+    class Meta:
+        ordering = ['-score']
+        unique_together = ('user', 'task')
+        indexes = [
+            models.Index(fields=['user', '-score'], name='shop_taskrec_user_score'),
+        ]
+    
+    def __str__(self):
+        return f"{self.task_id} recommended to {self.user_id} ({self.score:.2f})"
+
+class UserTaskStats(models.Model):
+    """Per-user task and application counts, maintained by shop/task_stats.py"""
+    user = models.OneToOneField(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='task_stats'
+    )
+    # Tasks the user created: all of them, and the unassigned ones split by
+    # deadline (archived tasks count as posted and expired)
+    posted_count = models.IntegerField(default=0)
+    open_count = models.IntegerField(default=0)
+    expired_count = models.IntegerField(default=0)
+    # Applications the user submitted, by status
+    pending_applications = models.IntegerField(default=0)
+    accepted_applications = models.IntegerField(default=0)
+    rejected_applications = models.IntegerField(default=0)
+    # Earliest deadline among open tasks; once it passes the row is recounted
+    next_expiry = models.DateField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        verbose_name = 'User Task Stats'
+        verbose_name_plural = 'User Task Stats'
+    
+    def __str__(self):
+        return f"Task stats of {self.user_id}"
+
 #----------------------------------------------------------------------------------------------
 class Notification(models.Model):
     user = models.ForeignKey(
@@ -400,3 +656,53 @@ class Notification(models.Model):
         return f"{self.user.username} - {self.message[:50]}"
 
 #----------------------------------------------------------------------------------
+
+
+class ArchivedTask(models.Model):
+    """Expired, never-assigned task moved out of shop_task by shop/archive.py"""
+    original_id = models.BigIntegerField(unique=True)
+    title = models.CharField(max_length=200)
+    slug = models.SlugField(max_length=50, db_index=False)
+    description = models.TextField()
+    created_by = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='archived_tasks'
+    )
+    budget = models.DecimalField(max_digits=10, decimal_places=2)
+    status = models.CharField(max_length=20)
+    category = models.CharField(max_length=20, choices=Task.CATEGORY_CHOICES)
+    task_assigned_place = models.TextField(blank=True, null=True)
+    is_approved = models.BooleanField(default=False)
+    deadline = models.DateField(null=True, blank=True)
+    created_at = models.DateTimeField()
+    archived_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        ordering = ['-deadline', '-id']
+        indexes = [
+            models.Index(fields=['created_by', '-deadline', '-id'], name='shop_archtask_owner_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.title} (archived)"
+
+
+class ArchivedApplication(models.Model):
+    """Application of an archived task"""
+    original_id = models.BigIntegerField(unique=True)
+    task = models.ForeignKey(ArchivedTask, on_delete=models.CASCADE, related_name='applications')
+    applicant = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='archived_applications'
+    )
+    message = models.TextField(blank=True, null=True)
+    applied_at = models.DateTimeField()
+    status = models.CharField(max_length=20, choices=Application.STATUS_CHOICES)
+    
+    class Meta:
+        ordering = ['-applied_at']
+    
+    def __str__(self):
+        return f"{self.applicant_id} - {self.task.title} (archived)"
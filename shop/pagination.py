@@ -0,0 +1,220 @@
+# shop/pagination.py
+"""
+Keyset (cursor) pagination for the listing pages.
+
+Django's Paginator runs COUNT(*) on the filtered queryset and then fetches
+the page with OFFSET, so deep pages get linearly slower. KeysetPaginator
+instead remembers the sort key of the last row it returned and asks for
+rows "after" it, which the (created_at, id) / (views, id) indexes answer
+directly regardless of how deep the page is.
+
+Listings switch between the two with the KEYSET_PAGINATION setting.
+"""
+import base64
+import datetime
+import decimal
+import json
+import logging
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.paginator import Paginator, EmptyPage, PageNotAnInteger
+from django.db import connections
+from django.db.models import Q
+
+logger = logging.getLogger(__name__)
+
+
+class InvalidCursor(ValueError):
+    """Raised when a cursor token cannot be decoded for this listing"""
+
+
+def _encode_value(value):
+    # isoformat() keeps full microsecond precision, which the keyset
+    # comparison needs (DjangoJSONEncoder truncates to milliseconds).
+    if isinstance(value, (datetime.datetime, datetime.date, datetime.time)):
+        return value.isoformat()
+    if isinstance(value, decimal.Decimal):
+        return str(value)
+    return value
+
+
+def _reverse(field_name):
+    return field_name[1:] if field_name.startswith('-') else f'-{field_name}'
+
+
+class CursorPage:
+    """A page of results with opaque next/previous cursor tokens"""
+    cursor_pagination = True
+
+    def __init__(self, object_list, paginator, has_next, has_previous,
+                 next_cursor=None, previous_cursor=None):
+        self.object_list = object_list
+        self.paginator = paginator
+        self._has_next = has_next
+        self._has_previous = has_previous
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __repr__(self):
+        return f'<CursorPage of {len(self.object_list)} items>'
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def has_next(self):
+        return self._has_next
+
+    def has_previous(self):
+        return self._has_previous
+
+    def has_other_pages(self):
+        return self._has_next or self._has_previous
+
+
+class KeysetPaginator:
+    """
+    Paginate a queryset by its sort key instead of by OFFSET.
+
+    ``ordering`` must be a unique, non-null sort key, so always end it with
+    the primary key, e.g. ``('-created_at', '-id')``. Fields may be model
+    fields or annotations on the queryset.
+    """
+
+    def __init__(self, queryset, per_page, ordering=('-created_at', '-id'),
+                 approximate_count=True):
+        self.queryset = queryset
+        self.per_page = int(per_page)
+        self.ordering = tuple(ordering)
+        self.approximate_count = approximate_count
+        self._fields = [self._resolve_field(name.lstrip('-')) for name in self.ordering]
+
+    def _resolve_field(self, name):
+        annotation = self.queryset.query.annotations.get(name)
+        if annotation is not None:
+            return annotation.output_field
+        if name == 'pk':
+            return self.queryset.model._meta.pk
+        return self.queryset.model._meta.get_field(name)
+
+    # -------------------- Cursor tokens --------------------
+
+    def encode_cursor(self, direction, obj):
+        values = [
+            _encode_value(getattr(obj, name.lstrip('-')))
+            for name in self.ordering
+        ]
+        payload = json.dumps([direction, values], separators=(',', ':'))
+        return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+    def decode_cursor(self, cursor):
+        """Return (direction, values) for a cursor token, or raise InvalidCursor"""
+        try:
+            padded = cursor + '=' * (-len(cursor) % 4)
+            direction, values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+            if direction not in ('next', 'previous') or len(values) != len(self.ordering):
+                raise InvalidCursor(cursor)
+            values = [field.to_python(value) for field, value in zip(self._fields, values)]
+        except (TypeError, ValueError, ValidationError) as e:
+            raise InvalidCursor(cursor) from e
+        return direction, values
+
+    # -------------------- Paging --------------------
+
+    def _after(self, ordering, values):
+        """Build the row-value comparison `(a, b) > (x, y)` for ``ordering``"""
+        condition = Q()
+        for i, name in enumerate(ordering):
+            lookup = 'lt' if name.startswith('-') else 'gt'
+            term = Q(**{f'{name.lstrip("-")}__{lookup}': values[i]})
+            for prev_name, prev_value in zip(ordering[:i], values[:i]):
+                term &= Q(**{prev_name.lstrip('-'): prev_value})
+            condition |= term
+        return condition
+
+    def page(self, cursor=None):
+        """Return the CursorPage for ``cursor`` (the first page when empty)"""
+        direction, values = ('next', None)
+        if cursor:
+            direction, values = self.decode_cursor(cursor)
+
+        ordering = self.ordering
+        if direction == 'previous':
+            ordering = tuple(_reverse(name) for name in ordering)
+
+        queryset = self.queryset.order_by(*ordering)
+        if values is not None:
+            queryset = queryset.filter(self._after(ordering, values))
+
+        # Fetch one extra row to learn whether there is another page
+        rows = list(queryset[:self.per_page + 1])
+        has_more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+
+        if direction == 'previous':
+            rows.reverse()
+            has_next, has_previous = True, has_more
+        else:
+            has_next, has_previous = has_more, values is not None
+
+        return CursorPage(
+            rows,
+            self,
+            has_next=has_next and bool(rows),
+            has_previous=has_previous and bool(rows),
+            next_cursor=self.encode_cursor('next', rows[-1]) if has_next and rows else None,
+            previous_cursor=self.encode_cursor('previous', rows[0]) if has_previous and rows else None,
+        )
+
+    @property
+    def count(self):
+        """
+        Planner estimate of the number of matching rows, or None.
+
+        Reading the estimate from EXPLAIN costs a plan but no scan. Only
+        PostgreSQL is supported; other backends return None.
+        """
+        if not self.approximate_count:
+            return None
+        if not hasattr(self, '_count'):
+            self._count = None
+            if connections[self.queryset.db].vendor == 'postgresql':
+                try:
+                    plan = json.loads(self.queryset.order_by().explain(format='json'))
+                    self._count = int(plan[0]['Plan']['Plan Rows'])
+                except Exception as e:
+                    logger.warning(f"Could not estimate listing size: {str(e)}")
+        return self._count
+
+
+def paginate_listing(request, queryset, per_page, ordering=None):
+    """
+    Paginate a listing with the paginator chosen by KEYSET_PAGINATION.
+
+    Returns ``(page, total_count)``. With keyset pagination ``total_count``
+    is a planner estimate and may be None. ``ordering=None`` marks a listing
+    with no usable sort key (e.g. relevance-ranked search), which always
+    uses offset pagination.
+    """
+    if getattr(settings, 'KEYSET_PAGINATION', False) and ordering:
+        paginator = KeysetPaginator(queryset, per_page, ordering)
+        try:
+            page = paginator.page(request.GET.get('cursor'))
+        except InvalidCursor:
+            page = paginator.page()
+        return page, paginator.count
+
+    paginator = Paginator(queryset, per_page)
+    try:
+        page = paginator.page(request.GET.get('page'))
+    except PageNotAnInteger:
+        page = paginator.page(1)
+    except EmptyPage:
+        page = paginator.page(paginator.num_pages)
+    return page, paginator.count
@@ -0,0 +1,161 @@
+# shop/people_search.py
+"""
+Fuzzy people search for the user directory and the typeahead endpoint.
+
+Each user has a PersonSearchEntry with their username and full name
+(folded like the queries: lowercase, punctuation-free), the Profile title
+and location, and their most recent Education.institution, plus all of it
+folded into ``document``, an unbounded TextField. The receivers in
+shop/signals.py re-index a user after commit whenever those rows change.
+Migration 0030 indexes the users that existed before, and
+`manage.py rebuild_people_search` re-indexes everyone should the entries
+ever drift.
+
+On PostgreSQL ``document`` has a pg_trgm GIN index (migration 0026). A
+query matches people whose document contains it or has a word similar to
+it, so "jonh" still finds "John", and only the index is consulted to find
+candidates. Candidates are ranked by the best word similarity of each
+field times its weight in SEARCH_WEIGHTS, so a name match ranks above
+the same text in someone's title, institution or location. Other
+databases (SQLite in tests and local development) fall back to substring
+matches, name matches first.
+"""
+from django.contrib.auth import get_user_model
+from django.contrib.postgres.search import TrigramWordSimilarity
+from django.core.cache import cache
+from django.db import connections
+from django.db.models import Case, IntegerField, OuterRef, Q, Subquery, Value, When
+from django.db.models.functions import Greatest
+from django.urls import reverse
+
+from .institutions import fold_text
+from .models import Education, PersonSearchEntry
+
+# Relative weight of a match in each field
+SEARCH_WEIGHTS = {
+    'name': 1.0,
+    'title': 0.6,
+    'institution': 0.5,
+    'location': 0.4,
+}
+
+TYPEAHEAD_LIMIT = 8
+TYPEAHEAD_CACHE_TIMEOUT = 60
+# Shorter queries have no trigram to look up
+MIN_QUERY_LENGTH = 3
+MAX_QUERY_LENGTH = 100
+INDEX_BATCH_SIZE = 1000
+
+_INDEXED_FIELDS = ['name', 'title', 'location', 'institution', 'document']
+
+
+# -------------------- Indexing --------------------
+
+def index_people(user_ids):
+    """(Re)build the search entries of ``user_ids``. Returns entries written."""
+    latest_institution = Education.objects.filter(
+        user=OuterRef('pk')
+    ).order_by('-start_date', '-id').values('institution')[:1]
+    rows = get_user_model().objects.filter(pk__in=user_ids).annotate(
+        latest_institution=Subquery(latest_institution),
+    ).values_list(
+        'pk', 'username', 'first_name', 'last_name',
+        'profile__title', 'profile__location', 'latest_institution',
+    )
+
+    entries = []
+    for pk, username, first_name, last_name, title, location, institution in rows:
+        name = fold_text(' '.join(part for part in (username, first_name, last_name) if part))
+        title, location, institution = title or '', location or '', institution or ''
+        entries.append(PersonSearchEntry(
+            user_id=pk,
+            name=name[:255],
+            title=title,
+            location=location,
+            institution=institution,
+            # Not truncated, so nothing falls off the end of a long name or title
+            document=fold_text(' '.join((name, title, institution, location))),
+        ))
+    PersonSearchEntry.objects.bulk_create(
+        entries,
+        update_conflicts=True,
+        unique_fields=['user'],
+        update_fields=_INDEXED_FIELDS + ['updated_at'],
+    )
+    return len(entries)
+
+
+def rebuild_people_search(batch_size=INDEX_BATCH_SIZE):
+    """Index every user. Returns entries written."""
+    user_ids = get_user_model().objects.order_by('pk').values_list('pk', flat=True)
+    written, batch = 0, []
+    for pk in user_ids.iterator(chunk_size=batch_size):
+        batch.append(pk)
+        if len(batch) == batch_size:
+            written += index_people(batch)
+            batch = []
+    if batch:
+        written += index_people(batch)
+    return written
+
+
+# -------------------- Search --------------------
+
+def _fuzzy_available():
+    return connections[PersonSearchEntry.objects.db].vendor == 'postgresql'
+
+
+def matching_entries(query):
+    """
+    Search entries matching ``query``, best first, annotated with
+    ``search_score``. Empty for a blank query.
+    """
+    normalized = fold_text(query)[:MAX_QUERY_LENGTH]
+    if not normalized:
+        return PersonSearchEntry.objects.none()
+
+    if not _fuzzy_available() or len(normalized) < MIN_QUERY_LENGTH:
+        return PersonSearchEntry.objects.filter(document__contains=normalized).annotate(
+            search_score=Case(
+                When(name__contains=normalized, then=Value(1)),
+                default=Value(0),
+                output_field=IntegerField(),
+            )
+        ).order_by('-search_score', 'user_id')
+
+    return PersonSearchEntry.objects.filter(
+        Q(document__contains=normalized) | Q(document__trigram_word_similar=normalized)
+    ).annotate(
+        search_score=Greatest(*[
+            TrigramWordSimilarity(normalized, field) * weight
+            for field, weight in SEARCH_WEIGHTS.items()
+        ])
+    ).order_by('-search_score', 'user_id')
+
+
+def typeahead(query, limit=TYPEAHEAD_LIMIT):
+    """Top people for what the user has typed so far, as dicts"""
+    normalized = fold_text(query)[:MAX_QUERY_LENGTH]
+    if len(normalized) < MIN_QUERY_LENGTH:
+        return []
+
+    cache_key = f'people:typeahead:{limit}:{normalized}'
+    results = cache.get(cache_key)
+    if results is not None:
+        return results
+
+    entries = matching_entries(normalized).select_related('user__profile')[:limit]
+    results = []
+    for entry in entries:
+        profile = getattr(entry.user, 'profile', None)
+        picture = profile.profile_picture if profile else None
+        results.append({
+            'username': entry.user.username,
+            'name': entry.user.get_full_name() or entry.user.username,
+            'title': entry.title,
+            'institution': entry.institution,
+            'picture': picture.url if picture else None,
+            'url': reverse('public_profile', args=[entry.user.username]),
+        })
+    cache.set(cache_key, results, TYPEAHEAD_CACHE_TIMEOUT)
+    return results
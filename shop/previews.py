@@ -0,0 +1,167 @@
+# shop/previews.py
+"""
+Thumbnail / first-page previews for study materials.
+
+When a material is uploaded or its file replaced, a fixed-size WebP preview
+is rendered off the request path: images are downscaled with Pillow and
+PDFs have their first page rasterised with PyMuPDF (optional; without it
+PDFs simply get no preview). The preview is stored next to the original as
+``<name>.<material id>.preview.webp`` (the original may be shared by several
+materials, see shop/blobstore.py) and recorded on StudyMaterial.preview, so
+listing pages send a few kilobytes per card instead of the whole upload.
+
+Settings:
+    STUDY_MATERIAL_PREVIEW_SIZE   (width, height) bounding box in pixels
+    STUDY_MATERIAL_PREVIEW_ASYNC  render in a background thread (default)
+"""
+import io
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connection, transaction
+from PIL import Image, ImageOps
+
+from .models import StudyMaterial
+
+try:
+    import fitz  # PyMuPDF
+except ImportError:
+    fitz = None
+
+logger = logging.getLogger(__name__)
+
+PREVIEW_SUFFIX = '.preview.webp'
+PREVIEW_QUALITY = 80
+
+_executor = None
+_executor_pid = None
+_executor_lock = threading.Lock()
+
+
+def preview_size():
+    return tuple(getattr(settings, 'STUDY_MATERIAL_PREVIEW_SIZE', (400, 400)))
+
+
+def preview_name(material):
+    """Deterministic storage name of the preview of ``material``"""
+    return f'{os.path.splitext(material.file.name)[0]}.{material.pk}{PREVIEW_SUFFIX}'
+
+
+# -------------------- Rendering --------------------
+
+def _render_image(f, size):
+    image = Image.open(f)
+    # Let the JPEG decoder downscale while decoding
+    image.draft('RGB', size)
+    image = ImageOps.exif_transpose(image)
+    image.thumbnail(size)
+    if image.mode not in ('RGB', 'RGBA'):
+        image = image.convert('RGBA' if 'A' in image.getbands() else 'RGB')
+    return image
+
+
+def _render_pdf(f, size):
+    if fitz is None:
+        logger.info("PyMuPDF is not installed; skipping PDF preview")
+        return None
+    with fitz.open(stream=f.read(), filetype='pdf') as document:
+        if document.page_count == 0:
+            return None
+        page = document.load_page(0)
+        zoom = min(size[0] / page.rect.width, size[1] / page.rect.height)
+        pixmap = page.get_pixmap(matrix=fitz.Matrix(zoom, zoom), alpha=False)
+        return Image.frombytes('RGB', (pixmap.width, pixmap.height), pixmap.samples)
+
+
+def render_preview(material):
+    """Return the WebP preview of ``material`` as bytes, or None"""
+    size = preview_size()
+    with material.file.open('rb') as f:
+        if material.material_type == 'pdf':
+            image = _render_pdf(f, size)
+        else:
+            image = _render_image(f, size)
+    if image is None:
+        return None
+    output = io.BytesIO()
+    image.save(output, format='WEBP', quality=PREVIEW_QUALITY, method=4)
+    return output.getvalue()
+
+
+def generate_preview(material_id):
+    """Render and store the preview for one material. Returns its name or None."""
+    material = StudyMaterial.objects.filter(pk=material_id).only(
+        'id', 'file', 'material_type', 'preview'
+    ).first()
+    if material is None or not material.file:
+        return None
+
+    try:
+        data = render_preview(material)
+    except Exception as e:
+        logger.warning(f"Could not render preview for material {material_id}: {str(e)}")
+        return None
+    if data is None:
+        return None
+
+    name = preview_name(material)
+    if default_storage.exists(name):
+        default_storage.delete(name)
+    name = default_storage.save(name, ContentFile(data))
+
+    # The file may have been replaced while we were rendering
+    updated = StudyMaterial.objects.filter(
+        pk=material_id, file=material.file.name
+    ).update(preview=name)
+    if not updated:
+        default_storage.delete(name)
+        return None
+    return name
+
+
+def delete_preview(material):
+    """Remove the stored preview; the caller saves the material"""
+    if material.preview:
+        delete_preview_file(material.preview.name)
+        material.preview = None
+
+
+def delete_preview_file(name):
+    try:
+        default_storage.delete(name)
+    except OSError as e:
+        logger.warning(f"Could not delete preview {name}: {str(e)}")
+
+
+# -------------------- Scheduling --------------------
+
+def _get_executor():
+    global _executor, _executor_pid
+    with _executor_lock:
+        if _executor is None or _executor_pid != os.getpid():
+            _executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='previews')
+            _executor_pid = os.getpid()
+        return _executor
+
+
+def _generate_in_background(material_id):
+    try:
+        generate_preview(material_id)
+    except Exception as e:
+        logger.error(f"Error generating preview for material {material_id}: {str(e)}", exc_info=True)
+    finally:
+        connection.close()
+
+
+def schedule_preview(material):
+    """Generate the preview once the current transaction has committed"""
+    material_id = material.pk
+    if getattr(settings, 'STUDY_MATERIAL_PREVIEW_ASYNC', True):
+        transaction.on_commit(lambda: _get_executor().submit(_generate_in_background, material_id))
+    else:
+        transaction.on_commit(lambda: generate_preview(material_id))
@@ -0,0 +1,84 @@
+# shop/profile_cache.py
+"""
+Versioned fragment cache for profile pages.
+
+Every user has a profile version token in the cache. The receivers in
+shop/signals.py replace it, after commit, whenever the user or their
+Profile, Education, Document or SocialLink rows are saved or deleted.
+Cached fragments are stored with the version they were rendered for, and
+a fragment whose version is no longer current is re-rendered, so nothing
+has to find and delete old entries.
+
+The About / Social Links / Education / Documents sections
+(shop/partials/profile_sections.html) are cached as seen by other
+viewers. The owner's variant carries CSRF tokens and is always rendered.
+A repeat view fetches the version and the fragment in a single
+``get_many`` instead of querying education, documents and social links
+and rendering the sections. The version also feeds the profile page ETag
+(shop/conditional.py).
+
+Settings:
+    PROFILE_FRAGMENT_CACHE_TIMEOUT  seconds a rendered fragment is kept
+"""
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+
+SECTIONS_TEMPLATE = 'shop/partials/profile_sections.html'
+
+
+def _version_key(user_id):
+    return f'profile:version:{user_id}'
+
+
+def _sections_key(user_id):
+    return f'profile:sections:{user_id}'
+
+
+def _new_version():
+    return uuid.uuid4().hex[:12]
+
+
+def bump_profile_version(user_id):
+    """Invalidate every cached fragment of ``user_id``'s profile"""
+    cache.set(_version_key(user_id), _new_version(), timeout=None)
+
+
+def profile_cache_state(user_id):
+    """``(version, cached sections or None)`` in one cache round trip"""
+    version_key, sections_key = _version_key(user_id), _sections_key(user_id)
+    found = cache.get_many([version_key, sections_key])
+    version = found.get(version_key)
+    if version is None:
+        # First visit since the cache was cleared: whoever adds first wins
+        cache.add(version_key, _new_version(), timeout=None)
+        return cache.get(version_key), None
+    entry = found.get(sections_key)
+    if entry and entry[0] == version:
+        return version, entry[1]
+    return version, None
+
+
+def profile_sections(user, profile, state=None):
+    """
+    The profile sections of ``user`` as other viewers see them, from the
+    cache when current. ``state`` is a profile_cache_state() result.
+    """
+    version, html = state or profile_cache_state(user.pk)
+    if html is None:
+        html = render_to_string(SECTIONS_TEMPLATE, {
+            'user': user,
+            'profile': profile,
+            'educations': user.educations.all(),
+            'documents': user.documents.filter(is_public=True),
+            'social_links': user.social_links.filter(is_public=True),
+            'is_owner': False,
+        })
+        cache.set(
+            _sections_key(user.pk), (version, html),
+            getattr(settings, 'PROFILE_FRAGMENT_CACHE_TIMEOUT', 24 * 60 * 60),
+        )
+    return mark_safe(html)
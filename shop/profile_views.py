@@ -0,0 +1,230 @@
+# shop/profile_views.py
+"""
+Approximate unique-viewer counts for profiles, from HyperLogLog sketches.
+
+A sketch is 2 ** PRECISION one-byte registers (4 KB at the default
+precision of 12, about 1.6% standard error) and counts distinct viewers
+no matter how often each one comes back. Sketches merge by taking the
+register-wise maximum, so the union of any set of days is one
+``np.maximum`` away. Each profile keeps one ProfileViewSketch per day
+with views, plus an all-time sketch (``day`` null). Profile.views caches
+the all-time estimate for listings such as the user directory; view counts
+from before the sketches existed are kept as its floor.
+
+A view only updates an in-memory sketch for (profile, today). The counter
+flush thread (shop/counters.py) merges the pending sketches into the
+database in batches. Each batch locks its rows, takes the register-wise
+maximum and writes them back, so concurrent workers never lose a viewer.
+A viewer seen again is a no-op, so there are no session flags or
+per-view row locks.
+
+Settings:
+    PROFILE_VIEW_MAX_PENDING  pending (profile, day) sketches that force an early flush
+"""
+import datetime
+import hashlib
+import logging
+import math
+import threading
+
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, IntegerField, Q, Value, When
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+from .counters import FLUSH_BATCH_SIZE, ensure_flusher, flush_interval, register_buffer, request_flush
+from .models import Profile, ProfileViewSketch
+
+logger = logging.getLogger(__name__)
+
+PRECISION = 12
+REGISTERS = 1 << PRECISION
+_HASH_BITS = 64
+_ALPHA = 0.7213 / (1 + 1.079 / REGISTERS)
+
+
+# -------------------- HyperLogLog --------------------
+
+def empty_sketch():
+    return np.zeros(REGISTERS, dtype=np.uint8)
+
+
+def load_sketch(data):
+    """Registers from a stored sketch; an empty sketch for missing data"""
+    if not data or len(data) != REGISTERS:
+        return empty_sketch()
+    return np.frombuffer(bytes(data), dtype=np.uint8).copy()
+
+
+def add_to_sketch(registers, key):
+    """Add the item ``key`` (a string) to ``registers`` in place"""
+    value = int.from_bytes(hashlib.blake2b(key.encode(), digest_size=8).digest(), 'big')
+    index = value >> (_HASH_BITS - PRECISION)
+    rest = value & ((1 << (_HASH_BITS - PRECISION)) - 1)
+    rank = _HASH_BITS - PRECISION - rest.bit_length() + 1
+    if rank > registers[index]:
+        registers[index] = rank
+
+
+def merge_sketches(sketches):
+    merged = empty_sketch()
+    for registers in sketches:
+        np.maximum(merged, registers, out=merged)
+    return merged
+
+
+def estimate(registers):
+    """Approximate number of distinct items added to ``registers``"""
+    raw = _ALPHA * REGISTERS * REGISTERS / np.sum(np.ldexp(1.0, -registers.astype(np.int32)))
+    zeros = int(np.count_nonzero(registers == 0))
+    if raw <= 2.5 * REGISTERS and zeros:
+        # Small cardinalities: linear counting is more accurate
+        raw = REGISTERS * math.log(REGISTERS / zeros)
+    return int(round(raw))
+
+
+# -------------------- Batched merging --------------------
+
+class ProfileViewBuffer:
+    """Pending per-(profile, day) sketches, merged into the database on flush"""
+
+    def __init__(self):
+        self._pending = {}
+        self._lock = threading.Lock()
+
+    def add(self, profile_id, viewer_key, day):
+        with self._lock:
+            registers = self._pending.get((profile_id, day))
+            if registers is None:
+                registers = self._pending[(profile_id, day)] = empty_sketch()
+            add_to_sketch(registers, viewer_key)
+            return len(self._pending)
+
+    def pending(self, profile_id):
+        """``{day: registers}`` not yet written for ``profile_id``"""
+        with self._lock:
+            return {day: registers.copy() for (pk, day), registers in self._pending.items() if pk == profile_id}
+
+    def _drain(self):
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        return pending
+
+    def _restore(self, pending):
+        with self._lock:
+            for key, registers in pending.items():
+                current = self._pending.get(key)
+                self._pending[key] = registers if current is None else np.maximum(current, registers)
+
+    def _write(self, batch):
+        """Merge ``{(profile_id, day): registers}`` into the stored sketches"""
+        merged = dict(batch)
+        for (profile_id, _), registers in batch.items():
+            all_time = merged.setdefault((profile_id, None), empty_sketch())
+            np.maximum(all_time, registers, out=all_time)
+
+        profile_ids = {profile_id for profile_id, _ in merged}
+        days = {day for _, day in merged if day is not None}
+        with transaction.atomic():
+            ProfileViewSketch.objects.bulk_create(
+                [ProfileViewSketch(profile_id=profile_id, day=day, registers=empty_sketch().tobytes())
+                 for profile_id, day in merged],
+                ignore_conflicts=True,
+            )
+            rows = ProfileViewSketch.objects.select_for_update().filter(
+                Q(day__in=days) | Q(day__isnull=True), profile_id__in=profile_ids,
+            ).order_by('pk')
+            updated, totals = [], {}
+            for row in rows:
+                registers = merged.get((row.profile_id, row.day))
+                if registers is None:
+                    continue
+                stored = load_sketch(row.registers)
+                np.maximum(stored, registers, out=stored)
+                row.registers = stored.tobytes()
+                row.updated_at = timezone.now()
+                updated.append(row)
+                if row.day is None:
+                    totals[row.profile_id] = estimate(stored)
+            ProfileViewSketch.objects.bulk_update(updated, ['registers', 'updated_at'])
+            if totals:
+                # Counts from before the sketches are kept as a floor
+                Profile.objects.filter(pk__in=totals).update(views=Greatest('views', Case(
+                    *[When(pk=pk, then=Value(total)) for pk, total in totals.items()],
+                    output_field=IntegerField(),
+                )))
+        return len(totals)
+
+    def flush(self):
+        """Write every pending sketch. Returns profiles updated."""
+        pending = self._drain()
+        if not pending:
+            return 0
+        by_profile = {}
+        for (profile_id, day), registers in pending.items():
+            by_profile.setdefault(profile_id, {})[(profile_id, day)] = registers
+
+        written = 0
+        profile_ids = sorted(by_profile)
+        for start in range(0, len(profile_ids), FLUSH_BATCH_SIZE):
+            batch = {}
+            for profile_id in profile_ids[start:start + FLUSH_BATCH_SIZE]:
+                batch.update(by_profile[profile_id])
+            try:
+                written += self._write(batch)
+            except Exception as e:
+                logger.error(f"Error merging profile view sketches: {str(e)}", exc_info=True)
+                self._restore(batch)
+        return written
+
+    def clear(self):
+        with self._lock:
+            self._pending.clear()
+
+
+profile_view_buffer = register_buffer(ProfileViewBuffer())
+
+
+def record_profile_view(request, profile):
+    """
+    Count ``request.user`` as a viewer of ``profile`` today. Only signed-in
+    users other than the owner are counted; returns whether the view was.
+    """
+    if not request.user.is_authenticated or request.user.pk == profile.user_id:
+        return False
+    ensure_flusher()
+    pending = profile_view_buffer.add(profile.pk, f'user:{request.user.pk}', timezone.localdate())
+    if flush_interval() <= 0:
+        profile_view_buffer.flush()
+    elif pending >= getattr(settings, 'PROFILE_VIEW_MAX_PENDING', 1000):
+        request_flush()
+    return True
+
+
+def profile_view_totals(profile, today=None):
+    """
+    Approximate unique viewers ``{'today', 'week', 'all_time'}`` of
+    ``profile``, including this process's views not yet flushed. The week
+    is the last seven days, today included.
+    """
+    today = today or timezone.localdate()
+    week_start = today - datetime.timedelta(days=6)
+    sketches = {
+        day: load_sketch(registers)
+        for day, registers in ProfileViewSketch.objects.filter(
+            Q(day__gte=week_start) | Q(day__isnull=True), profile=profile,
+        ).values_list('day', 'registers')
+    }
+    all_time = sketches.get(None, empty_sketch())
+    for day, registers in profile_view_buffer.pending(profile.pk).items():
+        sketches[day] = merge_sketches([sketches.get(day, empty_sketch()), registers])
+        np.maximum(all_time, registers, out=all_time)
+
+    week = merge_sketches(registers for day, registers in sketches.items() if day is not None and day >= week_start)
+    return {
+        'today': estimate(sketches.get(today, empty_sketch())),
+        'week': estimate(week),
+        'all_time': max(estimate(all_time), profile.views),
+    }
@@ -0,0 +1,266 @@
+# shop/recommendations.py
+"""
+Offline "recommended for you" tasks for the task board.
+
+Users and open tasks are described by sparse feature vectors over a shared
+vocabulary:
+
+* a task has its category, its canonical institution and its title words;
+* a user has the institutions and field-of-study words of their Education
+  entries, and the categories and institutions (task_assigned_place) of the
+  tasks they applied to, weighted by how often each occurs.
+
+The score of a task for a user is the dot product of the two vectors, plus
+a small bonus for newer tasks. Tasks are held as a NumPy CSC-style layout
+(feature -> tasks), so a block of users is scored by expanding each user's
+few non-zero features into the tasks that share them and summing per
+(user, task) pair. Only the tasks a user shares a feature with are ever
+scored, never a dense user x task matrix, and each user's best tasks are
+picked with ``np.argpartition``. Tasks the user posted or already applied
+to are excluded.
+
+`manage.py build_task_recommendations`, run nightly by a cron job defined
+in render.yaml, keeps the TASK_RECOMMENDATIONS_PER_USER best tasks per
+user in TaskRecommendation, so the board reads them with one indexed
+lookup.
+"""
+from collections import Counter, defaultdict
+
+import numpy as np
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import Application, Education, Task, TaskRecommendation
+from .related import title_tokens
+
+EDUCATION_INSTITUTION_WEIGHT = 3.0
+FIELD_OF_STUDY_WEIGHT = 2.0
+APPLIED_CATEGORY_WEIGHT = 1.0
+APPLIED_PLACE_WEIGHT = 2.0
+# Added to matching tasks, scaled by how recently they were posted
+RECENCY_WEIGHT = 0.1
+
+# Users scored per NumPy block and written per transaction
+RECOMMENDATION_BLOCK_SIZE = 256
+STRIP_SIZE = 6
+
+
+def recommendations_per_user():
+    return getattr(settings, 'TASK_RECOMMENDATIONS_PER_USER', 10)
+
+
+def open_tasks(today=None):
+    """Tasks that can still be applied for"""
+    today = today or timezone.localdate()
+    return Task.objects.filter(
+        Q(deadline__isnull=True) | Q(deadline__gte=today),
+        is_approved=True,
+        assigned_to__isnull=True,
+    )
+
+
+def _task_features(category, institution_id, title):
+    features = {('category', category): 1.0}
+    if institution_id:
+        features[('institution', institution_id)] = 1.0
+    words = title_tokens(title)
+    for word in words:
+        features[('word', word)] = 1.0 / np.sqrt(len(words))
+    return features
+
+
+class TaskIndex:
+    """Open tasks as a feature -> tasks sparse layout"""
+
+    def __init__(self, rows):
+        self.vocabulary = {}
+        postings = defaultdict(list)
+        task_ids, owners, created = [], [], []
+        for index, (pk, owner_id, category, institution_id, title, created_at) in enumerate(rows):
+            task_ids.append(pk)
+            owners.append(owner_id)
+            created.append(created_at.timestamp())
+            for feature, weight in _task_features(category, institution_id, title).items():
+                column = self.vocabulary.setdefault(feature, len(self.vocabulary))
+                postings[column].append((index, weight))
+
+        self.task_ids = np.asarray(task_ids, dtype=np.int64)
+        self.owners = np.asarray(owners, dtype=np.int64)
+        self.position = {pk: index for index, pk in enumerate(task_ids)}
+
+        lengths = np.zeros(len(self.vocabulary), dtype=np.int64)
+        for column, entries in postings.items():
+            lengths[column] = len(entries)
+        self.indptr = np.concatenate(([0], np.cumsum(lengths)))
+        self.indices = np.empty(self.indptr[-1], dtype=np.int64)
+        self.data = np.empty(self.indptr[-1], dtype=np.float64)
+        for column, entries in postings.items():
+            start = self.indptr[column]
+            self.indices[start:start + len(entries)] = [index for index, _ in entries]
+            self.data[start:start + len(entries)] = [weight for _, weight in entries]
+
+        # 1.0 for the newest task down to 0.0 for the oldest
+        created = np.asarray(created, dtype=np.float64)
+        span = created.max() - created.min() if len(created) else 0.0
+        self.freshness = (created - created.min()) / span if span else np.ones_like(created)
+
+    def __len__(self):
+        return len(self.task_ids)
+
+    def score(self, rows, columns, weights):
+        """
+        Sparse scores for a block of user vectors given as COO triplets
+        (user row, feature column, weight). Returns ``(rows, tasks, scores)``
+        with one entry per user row and task sharing a feature, by row.
+        """
+        n_tasks = len(self)
+        starts = self.indptr[columns]
+        lengths = self.indptr[columns + 1] - starts
+        total = int(lengths.sum())
+        if not total:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64), np.empty(0)
+        # Positions of every posting of every user feature, in one gather
+        offsets = np.repeat(starts - np.cumsum(lengths) + lengths, lengths) + np.arange(total)
+        keys = np.repeat(rows, lengths) * n_tasks + self.indices[offsets]
+        values = np.repeat(weights, lengths) * self.data[offsets]
+        # Sum per touched (row, task) pair only
+        keys, inverse = np.unique(keys, return_inverse=True)
+        return keys // n_tasks, keys % n_tasks, np.bincount(inverse, weights=values)
+
+
+def _user_features(user_ids, index):
+    """
+    Sparse feature vector ``{column: weight}`` of each user, restricted to the
+    task vocabulary, and the ids of the tasks each user applied to.
+    """
+    features = defaultdict(Counter)
+
+    educations = Education.objects.filter(user_id__in=user_ids).values_list(
+        'user_id', 'canonical_institution_id', 'field_of_study'
+    )
+    for user_id, institution_id, field_of_study in educations:
+        if institution_id:
+            features[user_id][('institution', institution_id)] += EDUCATION_INSTITUTION_WEIGHT
+        words = title_tokens(field_of_study)
+        for word in words:
+            features[user_id][('word', word)] += FIELD_OF_STUDY_WEIGHT / np.sqrt(len(words))
+
+    history = defaultdict(list)
+    applications = Application.objects.filter(applicant_id__in=user_ids).values_list(
+        'applicant_id', 'task_id', 'task__category', 'task__institution_id'
+    )
+    for user_id, task_id, category, institution_id in applications:
+        history[user_id].append((task_id, category, institution_id))
+
+    applied = {}
+    for user_id, rows in history.items():
+        # Weighted by the share of the user's applications
+        share = 1.0 / len(rows)
+        for _, category, institution_id in rows:
+            features[user_id][('category', category)] += APPLIED_CATEGORY_WEIGHT * share
+            if institution_id:
+                features[user_id][('institution', institution_id)] += APPLIED_PLACE_WEIGHT * share
+        applied[user_id] = [task_id for task_id, _, _ in rows]
+
+    vectors = {}
+    for user_id, counter in features.items():
+        vector = {index.vocabulary[f]: w for f, w in counter.items() if f in index.vocabulary}
+        if vector:
+            vectors[user_id] = vector
+    return vectors, applied
+
+
+def _top_tasks(index, user_ids, vectors, applied, limit):
+    """``{user_id: [(task_id, score), ...]}`` best first, for one block of users"""
+    rows, columns, weights = [], [], []
+    for row, user_id in enumerate(user_ids):
+        for column, weight in vectors.get(user_id, {}).items():
+            rows.append(row)
+            columns.append(column)
+            weights.append(weight)
+    if not rows:
+        return {}
+
+    score_rows, tasks, scores = index.score(
+        np.asarray(rows, dtype=np.int64),
+        np.asarray(columns, dtype=np.int64),
+        np.asarray(weights, dtype=np.float64),
+    )
+    scores = scores + RECENCY_WEIGHT * index.freshness[tasks]
+
+    # Never recommend the user's own tasks or ones they applied to
+    keep = index.owners[tasks] != np.asarray(user_ids, dtype=np.int64)[score_rows]
+    applied_keys = [
+        row * len(index) + index.position[pk]
+        for row, user_id in enumerate(user_ids)
+        for pk in applied.get(user_id, ()) if pk in index.position
+    ]
+    if applied_keys:
+        keep &= ~np.isin(score_rows * len(index) + tasks, applied_keys)
+    score_rows, tasks, scores = score_rows[keep], tasks[keep], scores[keep]
+
+    bounds = np.searchsorted(score_rows, np.arange(len(user_ids) + 1))
+    top = {}
+    for row, user_id in enumerate(user_ids):
+        candidates, candidate_scores = tasks[bounds[row]:bounds[row + 1]], scores[bounds[row]:bounds[row + 1]]
+        k = min(limit, len(candidates))
+        if not k:
+            continue
+        best = np.argpartition(-candidate_scores, k - 1)[:k]
+        best = best[np.lexsort((candidates[best], -candidate_scores[best]))]
+        top[user_id] = list(zip(index.task_ids[candidates[best]].tolist(), candidate_scores[best].tolist()))
+    return top
+
+
+def build_recommendations(block_size=RECOMMENDATION_BLOCK_SIZE, limit=None, today=None):
+    """
+    Recompute every active user's recommendations. Each block of users is
+    replaced in one transaction. Returns ``(users, recommendations)`` written.
+    """
+    limit = limit or recommendations_per_user()
+    rows = open_tasks(today).values_list(
+        'id', 'created_by_id', 'category', 'institution_id', 'title', 'created_at'
+    ).order_by('id')
+    index = TaskIndex(rows.iterator(chunk_size=2000))
+
+    user_ids = list(
+        get_user_model().objects.filter(is_active=True).order_by('pk').values_list('pk', flat=True)
+    )
+    total = 0
+    for start in range(0, len(user_ids), block_size):
+        block = user_ids[start:start + block_size]
+        top = {}
+        if len(index):
+            vectors, applied = _user_features(block, index)
+            top = _top_tasks(index, block, vectors, applied, limit)
+        with transaction.atomic():
+            TaskRecommendation.objects.filter(user_id__in=block).delete()
+            created = TaskRecommendation.objects.bulk_create([
+                TaskRecommendation(user_id=user_id, task_id=task_id, score=score)
+                for user_id, tasks in top.items()
+                for task_id, score in tasks
+            ])
+        total += len(created)
+    return len(user_ids), total
+
+
+def recommended_tasks_for(user, limit=STRIP_SIZE):
+    """
+    The user's stored recommendations that are still open, best first; one
+    query over the (user, score) index.
+    """
+    if not user.is_authenticated:
+        return Task.objects.none()
+    return (
+        Task.objects.filter(
+            recommendations__user=user,
+            is_approved=True,
+            assigned_to__isnull=True,
+        )
+        .exclude(applications__applicant=user)
+        .select_related('created_by__profile')
+        .order_by('-recommendations__score')[:limit]
+    )
@@ -0,0 +1,217 @@
+# shop/related.py
+"""
+Precomputed "related materials" for the study material detail page.
+
+Each material keeps its RELATED_MATERIALS_PER_ITEM best matches in the
+RelatedMaterial table, scored on category, institution
+(task_assigned_place) and title-word overlap. The lists are refreshed
+incrementally when a material is saved or deleted (see shop/signals.py),
+so view_material reads the related set with a single indexed query. The
+save itself only touches its own list and the lists it is offered to,
+which CANDIDATE_LIMIT bounds. Lists that lost the material and must be
+refilled, however many there are, are queued and rebuilt by the counter
+flush thread (shop/counters.py), away from the request.
+`manage.py rebuild_related_materials` recomputes every list.
+"""
+import heapq
+import logging
+import re
+import threading
+from collections import defaultdict
+
+from django.conf import settings
+from django.contrib.postgres.search import SearchQuery
+from django.db import transaction
+from django.db.models import Count, Max, Q
+
+from .counters import ensure_flusher, flush_interval, register_buffer
+from .models import RelatedMaterial, StudyMaterial
+from .search import SEARCH_CONFIG, full_text_search_available
+
+logger = logging.getLogger(__name__)
+
+CATEGORY_WEIGHT = 1.0
+INSTITUTION_WEIGHT = 2.0
+TITLE_WEIGHT = 3.0
+
+# Most recent materials considered per candidate query
+CANDIDATE_LIMIT = 200
+
+STOP_WORDS = {
+    'and', 'the', 'for', 'with', 'from', 'this', 'that', 'paper', 'papers',
+    'question', 'questions', 'notes', 'exam', 'book', 'part',
+}
+WORD_RE = re.compile(r'\w{3,}')
+
+_FIELDS = ('id', 'title', 'category', 'task_assigned_place', 'created_at')
+
+
+def related_count():
+    return getattr(settings, 'RELATED_MATERIALS_PER_ITEM', 8)
+
+
+def title_tokens(title):
+    return {word for word in WORD_RE.findall((title or '').lower()) if word not in STOP_WORDS}
+
+
+def normalize_institution(place):
+    return ' '.join((place or '').lower().split())
+
+
+def relatedness(a, b):
+    """Symmetric similarity score of two materials; 0 means unrelated"""
+    score = 0.0
+    if a.category == b.category and a.category not in ('all', 'other'):
+        score += CATEGORY_WEIGHT
+    institution = normalize_institution(a.task_assigned_place)
+    if institution and institution == normalize_institution(b.task_assigned_place):
+        score += INSTITUTION_WEIGHT
+    tokens_a, tokens_b = title_tokens(a.title), title_tokens(b.title)
+    if tokens_a and tokens_b:
+        score += TITLE_WEIGHT * len(tokens_a & tokens_b) / len(tokens_a | tokens_b)
+    return score
+
+
+def _candidates(material):
+    """Materials that can score above zero against ``material``"""
+    base = StudyMaterial.objects.exclude(pk=material.pk).only(*_FIELDS).order_by('-created_at')
+
+    condition = Q(category=material.category)
+    if material.task_assigned_place:
+        condition |= Q(task_assigned_place__iexact=material.task_assigned_place.strip())
+    candidates = {m.pk: m for m in base.filter(condition)[:CANDIDATE_LIMIT]}
+
+    tokens = sorted(title_tokens(material.title))
+    if tokens:
+        if full_text_search_available(base):
+            title_match = base.filter(search_vector=SearchQuery(
+                ' or '.join(tokens), config=SEARCH_CONFIG, search_type='websearch'
+            ))
+        else:
+            title_query = Q()
+            for token in tokens[:5]:
+                title_query |= Q(title__icontains=token)
+            title_match = base.filter(title_query)
+        for m in title_match[:CANDIDATE_LIMIT]:
+            candidates.setdefault(m.pk, m)
+    return candidates.values()
+
+
+def _top(material, candidates, limit):
+    scored = ((relatedness(material, c), c.created_at, c.pk) for c in candidates)
+    return heapq.nlargest(limit, (s for s in scored if s[0] > 0))
+
+
+def rebuild_list(material):
+    """Recompute the related list of one material from scratch"""
+    limit = related_count()
+    top = _top(material, _candidates(material), limit)
+    with transaction.atomic():
+        RelatedMaterial.objects.filter(material_id=material.pk).delete()
+        RelatedMaterial.objects.bulk_create([
+            RelatedMaterial(material_id=material.pk, related_id=pk, score=score)
+            for score, _, pk in top
+        ], ignore_conflicts=True)
+    return top
+
+
+def related_list_version(material_id):
+    """A token that changes whenever the related list of ``material_id`` or one of its entries does"""
+    row = RelatedMaterial.objects.filter(material_id=material_id).aggregate(
+        entries=Count('pk'), newest=Max('pk'), changed=Max('related__updated_at'),
+    )
+    changed = row['changed'].isoformat() if row['changed'] else ''
+    return f"{row['entries']}:{row['newest']}:{changed}"
+
+
+def refresh_related(material_id):
+    """
+    Incrementally update the index after ``material_id`` was created or
+    edited: rebuild its own list, then offer it to the lists of its
+    candidates, and refill lists that lost it and dropped below the limit.
+    """
+    material = StudyMaterial.objects.only(*_FIELDS).filter(pk=material_id).first()
+    if material is None:
+        return
+    limit = related_count()
+    candidates = list(_candidates(material))
+
+    with transaction.atomic():
+        rebuild_list(material)
+
+        # Remove the material from other lists; scores may have changed
+        holders = set(RelatedMaterial.objects.filter(related_id=material.pk).values_list('material_id', flat=True))
+        RelatedMaterial.objects.filter(related_id=material.pk).delete()
+
+        scores = {c.pk: relatedness(material, c) for c in candidates}
+        offered = [pk for pk, score in scores.items() if score > 0]
+        entries = defaultdict(list)
+        for entry in RelatedMaterial.objects.filter(material_id__in=offered).only('id', 'material_id', 'score'):
+            entries[entry.material_id].append(entry)
+
+        to_create, to_delete = [], []
+        for pk in offered:
+            held = entries[pk]
+            if len(held) >= limit:
+                weakest = min(held, key=lambda e: e.score)
+                if weakest.score >= scores[pk]:
+                    continue
+                to_delete.append(weakest.pk)
+            to_create.append(RelatedMaterial(material_id=pk, related_id=material.pk, score=scores[pk]))
+            holders.discard(pk)
+
+        RelatedMaterial.objects.filter(pk__in=to_delete).delete()
+        RelatedMaterial.objects.bulk_create(to_create, ignore_conflicts=True)
+
+    # Lists that dropped the material and did not take it back need refilling
+    refill_lists(holders)
+
+
+class RefillQueue:
+    """Ids of materials whose related list is short, rebuilt on flush"""
+
+    def __init__(self):
+        self._pending = set()
+        self._lock = threading.Lock()
+
+    def add(self, material_ids):
+        with self._lock:
+            self._pending.update(material_ids)
+
+    def flush(self):
+        """Rebuild every queued list. Returns lists rebuilt."""
+        with self._lock:
+            pending, self._pending = self._pending, set()
+        rebuilt = 0
+        for material in StudyMaterial.objects.only(*_FIELDS).filter(pk__in=pending).iterator():
+            try:
+                rebuild_list(material)
+                rebuilt += 1
+            except Exception as e:
+                logger.error(f"Error rebuilding related list of {material.pk}: {str(e)}", exc_info=True)
+        return rebuilt
+
+    def clear(self):
+        with self._lock:
+            self._pending.clear()
+
+
+refill_queue = register_buffer(RefillQueue())
+
+
+def refill_lists(material_ids):
+    """Have the lists of ``material_ids`` rebuilt by the flush thread"""
+    if not material_ids:
+        return
+    refill_queue.add(material_ids)
+    if flush_interval() <= 0:
+        refill_queue.flush()
+    else:
+        ensure_flusher()
+
+
+def related_materials_for(material, limit=4):
+    """The approved related materials shown on the detail page, best first"""
+    return StudyMaterial.objects.filter(
+        related_from__material_id=material.pk, is_approved=True,
+    ).order_by('-related_from__score', '-created_at')[:limit]
@@ -0,0 +1,74 @@
+# shop/reviews.py
+"""
+Bulk review of task applications.
+
+A task owner accepts or rejects many applications at once. The affected
+rows are read in one query and switched with a single
+``UPDATE ... WHERE id IN (...)``. Every applicant's notification goes out
+in one bulk_create, and the applicants' UserTaskStats counters are moved,
+all in the same transaction. Accepting can also auto-reject the other
+pending applicants of the same tasks.
+"""
+from django.db import transaction
+
+from .models import Application, Notification
+from .task_stats import record_application_changes
+
+REVIEW_STATUSES = ('accepted', 'rejected')
+
+# Upper bound on applications reviewed per request
+MAX_BULK_REVIEW = 500
+
+
+def _notification(application_id, applicant_id, title, status):
+    return Notification(
+        user_id=applicant_id,
+        application_id=application_id,
+        message=f"Your application for '{title}' has been {status}",
+    )
+
+
+def _switch(queryset, status):
+    """Set ``status`` on the rows of ``queryset`` not already in it; return their notifications"""
+    rows = list(
+        queryset.exclude(status=status).select_for_update(of=('self',))
+        .values_list('id', 'applicant_id', 'task__title', 'status')
+    )
+    if rows:
+        Application.objects.filter(pk__in=[row[0] for row in rows]).update(status=status)
+        # update() sends no signals; move the applicants' counters here
+        record_application_changes([(applicant_id, old, status) for _, applicant_id, _, old in rows])
+    return [_notification(pk, applicant_id, title, status) for pk, applicant_id, title, _ in rows]
+
+
+def review_applications(owner, application_ids, status, reject_others=False):
+    """
+    Set ``status`` on the given applications to ``owner``'s tasks.
+
+    Applications that are not on the owner's tasks are ignored, as are
+    those already in ``status``. With ``reject_others``, accepting also
+    rejects the remaining pending applications of the same tasks. Returns
+    ``{'updated': n, 'auto_rejected': n, 'notified': n}``.
+    """
+    if status not in REVIEW_STATUSES:
+        raise ValueError(f"Invalid status: {status}")
+    application_ids = list(application_ids)[:MAX_BULK_REVIEW]
+
+    with transaction.atomic():
+        selected = Application.objects.filter(pk__in=application_ids, task__created_by=owner)
+        notifications = _switch(selected, status)
+        updated = len(notifications)
+
+        auto_rejected = 0
+        if status == 'accepted' and reject_others:
+            task_ids = selected.values('task_id')
+            others = Application.objects.filter(task_id__in=task_ids, status='pending').exclude(
+                pk__in=application_ids
+            )
+            rejected = _switch(others, 'rejected')
+            auto_rejected = len(rejected)
+            notifications += rejected
+
+        Notification.objects.bulk_create(notifications)
+
+    return {'updated': updated, 'auto_rejected': auto_rejected, 'notified': len(notifications)}
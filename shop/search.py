@@ -0,0 +1,55 @@
+# shop/search.py
+"""
+Full-text search for the study material catalogue.
+
+On PostgreSQL, ``StudyMaterial.search_vector`` is kept up to date by the
+trigger installed in migration 0012 and queried through a GIN index, so a
+search is an index lookup ranked by relevance. Other databases (SQLite in
+tests and local development) fall back to the old ``icontains`` filters.
+"""
+from django.contrib.postgres.search import SearchQuery, SearchRank
+from django.db import connections
+from django.db.models import F, Q
+
+SEARCH_CONFIG = 'english'
+
+# Weight of each field in search_vector (A ranks highest). The trigger in
+# migration 0012 builds the vector with these weights.
+SEARCH_WEIGHTS = {
+    'title': 'A',
+    'task_assigned_place': 'B',
+    'description': 'C',
+}
+
+
+def full_text_search_available(queryset):
+    """Return True if the queryset's database supports tsvector search"""
+    return connections[queryset.db].vendor == 'postgresql'
+
+
+def search_study_materials(queryset, query, rank=True):
+    """
+    Filter a StudyMaterial queryset by a user search string.
+
+    With ``rank=True`` the results are annotated with ``search_rank`` and
+    ordered by relevance (newest first on ties). The icontains fallback has
+    no notion of relevance and keeps the queryset's ordering.
+    """
+    query = (query or '').strip()
+    if not query:
+        return queryset
+
+    if not full_text_search_available(queryset):
+        return queryset.filter(
+            Q(title__icontains=query) |
+            Q(description__icontains=query) |
+            Q(task_assigned_place__icontains=query)
+        )
+
+    search_query = SearchQuery(query, config=SEARCH_CONFIG, search_type='websearch')
+    queryset = queryset.filter(search_vector=search_query)
+    if rank:
+        queryset = queryset.annotate(
+            search_rank=SearchRank(F('search_vector'), search_query)
+        ).order_by('-search_rank', '-created_at')
+    return queryset
@@ -0,0 +1,276 @@
+# shop/signals.py
+"""
+Model signal receivers that keep derived data in sync. Connected in
+ShopConfig.ready().
+"""
+import logging
+
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from .blobstore import release_file
+from .facets import invalidate_catalogue_facets
+from .image_variants import IMAGE_FIELDS, delete_variants, schedule_variants
+from .institutions import INSTITUTION_FIELDS, adjust_usage, institution_for, normalize_name
+from .models import Application, CustomUser, Document, Education, Profile, RelatedMaterial, SocialLink, StudyMaterial, Task
+from .people_search import index_people
+from .previews import delete_preview_file
+from .profile_cache import bump_profile_version
+from .related import refill_lists, refresh_related
+from .task_stats import reconcile, record_application_changes, record_task_change, task_state
+
+logger = logging.getLogger(__name__)
+
+
+def _run_safely(func, *args):
+    # Derived data must never break the save that triggered it. The
+    # savepoint keeps a failed query from aborting the caller's transaction.
+    try:
+        with transaction.atomic():
+            func(*args)
+    except Exception as e:
+        logger.error(f"Error in {func.__name__}: {str(e)}", exc_info=True)
+
+
+# -------------------- Related materials --------------------
+
+@receiver(post_save, sender=StudyMaterial)
+def refresh_related_on_save(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    material_id = instance.pk
+    transaction.on_commit(lambda: _run_safely(refresh_related, material_id))
+
+
+@receiver(pre_delete, sender=StudyMaterial)
+def remember_related_holders(sender, instance, **kwargs):
+    instance._related_holders = list(
+        RelatedMaterial.objects.filter(related_id=instance.pk).values_list('material_id', flat=True)
+    )
+
+
+@receiver(post_delete, sender=StudyMaterial)
+def refill_related_on_delete(sender, instance, **kwargs):
+    holders = getattr(instance, '_related_holders', [])
+    if holders:
+        transaction.on_commit(lambda: _run_safely(refill_lists, holders))
+
+
+# -------------------- Facet counts --------------------
+
+@receiver(post_save, sender=StudyMaterial)
+@receiver(post_delete, sender=StudyMaterial)
+def invalidate_facets(sender, **kwargs):
+    # Covers uploads, deletes, edits and approval changes
+    transaction.on_commit(invalidate_catalogue_facets)
+
+
+# -------------------- Stored files --------------------
+
+@receiver(post_delete, sender=StudyMaterial)
+@receiver(post_delete, sender=Document)
+def release_stored_file(sender, instance, **kwargs):
+    # Also covers cascades from deleted users and deletes in the admin
+    if instance.file:
+        _run_safely(release_file, instance.file.name)
+
+
+@receiver(post_delete, sender=StudyMaterial)
+def delete_stored_preview(sender, instance, **kwargs):
+    # Previews belong to one material; removed once the delete has committed
+    if instance.preview:
+        name = instance.preview.name
+        transaction.on_commit(lambda: _run_safely(delete_preview_file, name))
+
+
+# -------------------- Institutions --------------------
+
+@receiver(pre_save, sender=Task)
+@receiver(pre_save, sender=StudyMaterial)
+@receiver(pre_save, sender=Education)
+def resolve_institution(sender, instance, raw=False, update_fields=None, **kwargs):
+    field, fk = INSTITUTION_FIELDS[sender]
+    if raw or (update_fields is not None and field not in update_fields):
+        instance._old_institution_id = getattr(instance, f'{fk}_id')
+        return
+    old_text, old_id = None, None
+    if instance.pk:
+        old_text, old_id = sender.objects.filter(pk=instance.pk).values_list(field, f'{fk}_id').first() or (None, None)
+    instance._old_institution_id = old_id
+    new_text = getattr(instance, field)
+    unchanged = instance.pk and normalize_name(new_text) == normalize_name(old_text)
+    if unchanged and (old_id or not normalize_name(new_text)):
+        # Same place as stored: keep its link, no Institution lookup
+        setattr(instance, f'{fk}_id', old_id)
+        return
+    try:
+        setattr(instance, fk, institution_for(new_text))
+    except Exception as e:
+        # Never block the save; rebuild_institutions can repair the link
+        logger.error(f"Error resolving institution: {str(e)}", exc_info=True)
+        instance._old_institution_id = getattr(instance, f'{fk}_id')
+
+
+@receiver(post_save, sender=Task)
+@receiver(post_save, sender=StudyMaterial)
+@receiver(post_save, sender=Education)
+def count_institution_usage(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    _, fk = INSTITUTION_FIELDS[sender]
+    old_id, new_id = getattr(instance, '_old_institution_id', None), getattr(instance, f'{fk}_id')
+    if old_id != new_id:
+        _run_safely(adjust_usage, old_id, -1)
+        _run_safely(adjust_usage, new_id, 1)
+
+
+@receiver(post_delete, sender=Task)
+@receiver(post_delete, sender=StudyMaterial)
+@receiver(post_delete, sender=Education)
+def release_institution_usage(sender, instance, **kwargs):
+    _, fk = INSTITUTION_FIELDS[sender]
+    _run_safely(adjust_usage, getattr(instance, f'{fk}_id'), -1)
+
+
+# -------------------- Task and application stats --------------------
+
+@receiver(pre_save, sender=Task)
+def remember_task_state(sender, instance, raw=False, **kwargs):
+    old = None
+    if instance.pk and not raw:
+        old = Task.objects.filter(pk=instance.pk).values_list('created_by_id', 'assigned_to_id', 'deadline').first()
+    instance._old_stats_state = old
+
+
+@receiver(post_save, sender=Task)
+def count_task_stats(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    old, new = getattr(instance, '_old_stats_state', None), task_state(instance)
+    if old != new:
+        _run_safely(record_task_change, old, new)
+
+
+@receiver(post_delete, sender=Task)
+def release_task_stats(sender, instance, **kwargs):
+    _run_safely(record_task_change, task_state(instance), None)
+
+
+@receiver(pre_save, sender=Application)
+def remember_application_state(sender, instance, raw=False, **kwargs):
+    old = None
+    if instance.pk and not raw:
+        old = Application.objects.filter(pk=instance.pk).values_list('applicant_id', 'status').first()
+    instance._old_stats_state = old
+
+
+@receiver(post_save, sender=Application)
+def count_application_stats(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    old = getattr(instance, '_old_stats_state', None)
+    if old == (instance.applicant_id, instance.status):
+        return
+    changes = [(instance.applicant_id, None, instance.status)]
+    if old is not None:
+        changes.insert(0, (old[0], old[1], None))
+    _run_safely(record_application_changes, changes)
+
+
+@receiver(post_delete, sender=Application)
+def release_application_stats(sender, instance, **kwargs):
+    _run_safely(record_application_changes, [(instance.applicant_id, instance.status, None)])
+
+
+@receiver(pre_delete, sender=CustomUser)
+def remember_assigning_owners(sender, instance, **kwargs):
+    # Tasks assigned to the user are unassigned by SET NULL, without signals
+    instance._assigning_owners = list(
+        Task.objects.filter(assigned_to=instance).exclude(created_by=instance)
+        .values_list('created_by_id', flat=True).distinct()
+    )
+
+
+@receiver(post_delete, sender=CustomUser)
+def recount_assigning_owners(sender, instance, **kwargs):
+    owners = getattr(instance, '_assigning_owners', [])
+    if owners:
+        _run_safely(reconcile, owners)
+
+
+# -------------------- Profile page cache --------------------
+
+@receiver(post_save, sender=CustomUser)
+@receiver(post_delete, sender=CustomUser)
+@receiver(post_save, sender=Profile)
+@receiver(post_delete, sender=Profile)
+@receiver(post_save, sender=Education)
+@receiver(post_delete, sender=Education)
+@receiver(post_save, sender=Document)
+@receiver(post_delete, sender=Document)
+@receiver(post_save, sender=SocialLink)
+@receiver(post_delete, sender=SocialLink)
+def bump_profile_cache(sender, instance, raw=False, update_fields=None, **kwargs):
+    if raw or (update_fields is not None and set(update_fields) <= {'last_login'}):
+        return
+    user_id = instance.pk if sender is CustomUser else instance.user_id
+    # After commit, so a concurrent view cannot cache the old rows again
+    transaction.on_commit(lambda: _run_safely(bump_profile_version, user_id))
+
+
+# -------------------- People search --------------------
+
+@receiver(post_save, sender=CustomUser)
+@receiver(post_save, sender=Profile)
+@receiver(post_delete, sender=Profile)
+@receiver(post_save, sender=Education)
+@receiver(post_delete, sender=Education)
+def reindex_person(sender, instance, raw=False, update_fields=None, **kwargs):
+    # Deleted users lose their entry by cascade
+    if raw or (update_fields is not None and set(update_fields) <= {'last_login'}):
+        return
+    user_id = instance.pk if sender is CustomUser else instance.user_id
+    transaction.on_commit(lambda: _run_safely(index_people, [user_id]))
+
+
+# -------------------- Profile image variants --------------------
+
+@receiver(pre_save, sender=Profile)
+def remember_profile_images(sender, instance, raw=False, update_fields=None, **kwargs):
+    if raw or (update_fields is not None and not set(update_fields) & set(IMAGE_FIELDS)):
+        return
+    stored = Profile.objects.filter(pk=instance.pk).values(*IMAGE_FIELDS).first() if instance.pk else None
+    instance._stored_images = stored or {}
+    # A new upload may reuse the name of the file it replaces
+    instance._uploaded_images = {
+        field for field in IMAGE_FIELDS
+        if getattr(instance, field) and not getattr(instance, field)._committed
+    }
+
+
+@receiver(post_save, sender=Profile)
+def refresh_image_variants(sender, instance, **kwargs):
+    if not hasattr(instance, '_stored_images'):
+        return
+    stored, uploaded = instance._stored_images, instance._uploaded_images
+    del instance._stored_images, instance._uploaded_images
+    profile_id = instance.pk
+    for field in IMAGE_FIELDS:
+        old_name, new_name = stored.get(field) or '', getattr(instance, field).name or ''
+        if old_name == new_name and field not in uploaded:
+            continue
+        if old_name:
+            transaction.on_commit(
+                lambda field=field, old_name=old_name: _run_safely(delete_variants, field, old_name, profile_id)
+            )
+        if new_name:
+            schedule_variants(profile_id, field)
+
+
+@receiver(post_delete, sender=Profile)
+def delete_image_variants(sender, instance, **kwargs):
+    for field in IMAGE_FIELDS:
+        name = getattr(instance, field).name
+        if name:
+            transaction.on_commit(lambda field=field, name=name: _run_safely(delete_variants, field, name))
@@ -0,0 +1,99 @@
+# shop/slugs.py
+"""
+Unique slug allocation for any model with a unique SlugField.
+
+The next free slug is found with one aggregate query: whether the base
+slug is taken, and the highest numeric suffix among ``<base>-<n>`` slugs.
+The row is then inserted in a savepoint. If a concurrent insert took the
+same slug first, the unique constraint raises IntegrityError and the slug
+is allocated again, a bounded number of times.
+
+Usage, in a model's save()::
+
+    if not self.slug:
+        return save_with_unique_slug(self, super().save, self.title, *args, **kwargs)
+
+Bulk inserts pre-allocate a batch of slugs with allocate_slugs().
+"""
+import re
+
+from django.db import IntegrityError, transaction
+from django.db.models import BigIntegerField, Count, Max, Q
+from django.db.models.functions import Cast, Substr
+from django.utils.text import slugify
+
+SLUG_ATTEMPTS = 5
+
+# Room kept at the end of the base for a "-<n>" suffix
+MAX_SUFFIX_DIGITS = 9
+
+
+def slug_base(model, source, field='slug'):
+    """Slugified ``source`` cut so that a suffix still fits the field"""
+    max_length = model._meta.get_field(field).max_length
+    base = slugify(source or '')[:max_length - MAX_SUFFIX_DIGITS - 1].strip('-')
+    return base or model._meta.model_name
+
+
+def _taken(model, base, field):
+    """``(base is taken, highest numeric suffix or 0)``; one query"""
+    suffix = Substr(field, len(base) + 2)
+    counts = model._default_manager.filter(
+        Q(**{field: base}) | Q(**{f'{field}__startswith': f'{base}-'})
+    ).aggregate(
+        exact=Count('pk', filter=Q(**{field: base})),
+        top=Max(
+            Cast(suffix, BigIntegerField()),
+            filter=Q(**{f'{field}__regex': rf'^{re.escape(base)}-[0-9]{{1,{MAX_SUFFIX_DIGITS}}}$'}),
+        ),
+    )
+    return bool(counts['exact']), counts['top'] or 0
+
+
+def next_free_slug(model, base, field='slug'):
+    """``base`` if free, otherwise ``base-<highest suffix + 1>``; one query"""
+    exact, top = _taken(model, base, field)
+    if not exact:
+        return base
+    return f"{base}-{top + 1}"
+
+
+def allocate_slugs(model, sources, field='slug'):
+    """
+    Unique slugs for a batch of new rows, one per item of ``sources``: one
+    query per distinct base, then consecutive suffixes handed out in memory.
+    For bulk_create; a concurrent insert can still take one first, so the
+    caller retries the batch on IntegrityError.
+    """
+    bases = [slug_base(model, source, field) for source in sources]
+    state = {base: list(_taken(model, base, field)) for base in set(bases)}
+    slugs = []
+    for base in bases:
+        exact, top = state[base]
+        if not exact:
+            state[base][0] = True
+            slugs.append(base)
+        else:
+            state[base][1] = top + 1
+            slugs.append(f"{base}-{top + 1}")
+    return slugs
+
+
+def save_with_unique_slug(instance, save, source, *args, field='slug', **kwargs):
+    """
+    Allocate a unique slug from ``source`` and call ``save(*args, **kwargs)``,
+    retrying with a fresh slug if a concurrent insert took it.
+    """
+    model = type(instance)
+    base = slug_base(model, source, field)
+    for attempt in range(SLUG_ATTEMPTS):
+        slug = next_free_slug(model, base, field)
+        setattr(instance, field, slug)
+        try:
+            with transaction.atomic():
+                return save(*args, **kwargs)
+        except IntegrityError:
+            # Re-raise failures of other constraints and give up eventually
+            taken = model._default_manager.filter(**{field: slug}).exists()
+            if not taken or attempt == SLUG_ATTEMPTS - 1:
+                raise
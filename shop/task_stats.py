@@ -0,0 +1,202 @@
+# shop/task_stats.py
+"""
+Per-user task and application counts (UserTaskStats).
+
+Each user's row holds how many tasks they posted, how many of those are
+open (unassigned, deadline today or later, or none) and expired
+(unassigned, deadline passed), and how many of their applications are
+pending, accepted and rejected. Pages read the row instead of counting.
+
+The row is kept current inside the writing transaction: the Task and
+Application receivers in shop/signals.py, and the code paths that write
+without signals (the application upsert and bulk review), pass the
+before/after state of each row here and the counters are moved with one
+``UPDATE ... SET n = n + delta`` per user.
+
+Tasks also go from open to expired without being written, when their
+deadline passes. The row stores the earliest open deadline
+(``next_expiry``); a row past it is recounted on its next write or read.
+`manage.py reconcile_task_stats` recounts every row with set-based
+UPDATEs, and fills in rows for users that have none.
+
+Archived tasks (shop/archive.py) stay in the counts: as posted and
+expired tasks of their owner, and their applications under their last
+status. Archiving therefore leaves the rows untouched, and the recount
+adds the archive tables.
+"""
+from collections import defaultdict
+
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import Case, Count, F, IntegerField, Min, OuterRef, Q, Subquery, Value, When
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from .models import Application, ArchivedApplication, ArchivedTask, Task, UserTaskStats
+
+APPLICATION_COUNTERS = {
+    'pending': 'pending_applications',
+    'accepted': 'accepted_applications',
+    'rejected': 'rejected_applications',
+}
+
+RECONCILE_BATCH_SIZE = 1000
+
+
+def _as_date(value):
+    # Views assign the raw POST string to Task.deadline before saving
+    if isinstance(value, str):
+        return parse_date(value) if value else None
+    return value
+
+
+def task_state(task):
+    """``(owner_id, assigned_to_id, deadline)`` of a task instance"""
+    return task.created_by_id, task.assigned_to_id, _as_date(task.deadline)
+
+
+def _task_counters(state, today):
+    _, assigned_to_id, deadline = state
+    counters = {'posted_count': 1}
+    if assigned_to_id is None:
+        if deadline is not None and deadline < today:
+            counters['expired_count'] = 1
+        else:
+            counters['open_count'] = 1
+    return counters
+
+
+class _Changes:
+    """Counter deltas per user, plus new open deadlines for next_expiry"""
+
+    def __init__(self):
+        self.deltas = defaultdict(lambda: defaultdict(int))
+        self.expiries = {}
+
+    def add(self, user_id, counters, sign):
+        for field, n in counters.items():
+            self.deltas[user_id][field] += sign * n
+
+    def expire_by(self, user_id, deadline):
+        if deadline is not None:
+            current = self.expiries.get(user_id)
+            self.expiries[user_id] = deadline if current is None else min(current, deadline)
+
+    def apply(self, today, create_missing=True):
+        stale = []
+        for user_id in set(self.deltas) | set(self.expiries):
+            values = {field: F(field) + n for field, n in self.deltas[user_id].items() if n}
+            deadline = self.expiries.get(user_id)
+            if deadline is not None:
+                values['next_expiry'] = Case(
+                    When(Q(next_expiry__isnull=True) | Q(next_expiry__gt=deadline), then=Value(deadline)),
+                    default=F('next_expiry'),
+                )
+            if not values:
+                continue
+            # Rows past their next expiry are recounted instead
+            updated = UserTaskStats.objects.filter(pk=user_id).exclude(
+                next_expiry__lt=today
+            ).update(updated_at=timezone.now(), **values)
+            if not updated:
+                stale.append(user_id)
+        if stale:
+            reconcile(stale, today=today, create_missing=create_missing)
+
+
+def record_task_change(old_state, new_state, today=None):
+    """
+    Move the counters for a task that went from ``old_state`` to
+    ``new_state`` (either None for a create or a delete).
+    """
+    today = today or timezone.localdate()
+    changes = _Changes()
+    if old_state is not None:
+        changes.add(old_state[0], _task_counters(old_state, today), -1)
+    if new_state is not None:
+        counters = _task_counters(new_state, today)
+        changes.add(new_state[0], counters, 1)
+        if 'open_count' in counters:
+            changes.expire_by(new_state[0], new_state[2])
+    # A delete must not recreate the row of a user being deleted
+    with transaction.atomic():
+        changes.apply(today, create_missing=new_state is not None)
+
+
+def record_application_changes(changes_list, today=None):
+    """
+    Move the counters for ``(applicant_id, old_status, new_status)``
+    transitions; a None status means created or deleted.
+    """
+    today = today or timezone.localdate()
+    changes = _Changes()
+    deleting = True
+    for applicant_id, old_status, new_status in changes_list:
+        if old_status in APPLICATION_COUNTERS:
+            changes.add(applicant_id, {APPLICATION_COUNTERS[old_status]: 1}, -1)
+        if new_status is not None:
+            deleting = False
+            if new_status in APPLICATION_COUNTERS:
+                changes.add(applicant_id, {APPLICATION_COUNTERS[new_status]: 1}, 1)
+    with transaction.atomic():
+        changes.apply(today, create_missing=not deleting)
+
+
+# -------------------- Reconcile --------------------
+
+def _count(queryset, fk):
+    counts = queryset.filter(**{fk: OuterRef('pk')}).order_by().values(fk).annotate(n=Count('pk')).values('n')
+    return Coalesce(Subquery(counts, output_field=IntegerField()), 0)
+
+
+def reconcile(user_ids=None, today=None, create_missing=True):
+    """
+    Recount the rows of ``user_ids`` (all users when None) in one UPDATE,
+    creating missing rows first. Returns the number of rows recounted.
+    """
+    today = today or timezone.localdate()
+    if create_missing:
+        users = get_user_model().objects.filter(task_stats__isnull=True)
+        if user_ids is not None:
+            users = users.filter(pk__in=user_ids)
+        missing = users.values_list('pk', flat=True).iterator(chunk_size=RECONCILE_BATCH_SIZE)
+        UserTaskStats.objects.bulk_create(
+            (UserTaskStats(user_id=pk) for pk in missing),
+            batch_size=RECONCILE_BATCH_SIZE,
+            ignore_conflicts=True,
+        )
+
+    unassigned = Task.objects.filter(assigned_to__isnull=True)
+    open_tasks = unassigned.filter(Q(deadline__isnull=True) | Q(deadline__gte=today))
+    next_expiry = (
+        unassigned.filter(created_by=OuterRef('pk'), deadline__gte=today)
+        .order_by().values('created_by').annotate(first=Min('deadline')).values('first')
+    )
+    archived = _count(ArchivedTask.objects.all(), 'created_by')
+    rows = UserTaskStats.objects.all()
+    if user_ids is not None:
+        rows = rows.filter(pk__in=user_ids)
+    with transaction.atomic():
+        return rows.update(
+            posted_count=_count(Task.objects.all(), 'created_by') + archived,
+            open_count=_count(open_tasks, 'created_by'),
+            expired_count=_count(unassigned.filter(deadline__lt=today), 'created_by') + archived,
+            **{
+                field: _count(Application.objects.filter(status=status), 'applicant')
+                + _count(ArchivedApplication.objects.filter(status=status), 'applicant')
+                for status, field in APPLICATION_COUNTERS.items()
+            },
+            next_expiry=Subquery(next_expiry),
+            updated_at=timezone.now(),
+        )
+
+
+def stats_for(user, today=None):
+    """The user's current UserTaskStats row, recounted first if stale or missing"""
+    today = today or timezone.localdate()
+    stats = UserTaskStats.objects.filter(pk=user.pk).first()
+    if stats is None or (stats.next_expiry is not None and stats.next_expiry < today):
+        reconcile([user.pk], today=today)
+        stats = UserTaskStats.objects.get(pk=user.pk)
+    return stats
@@ -0,0 +1,40 @@
+# shop/templatetags/profile_images.py
+"""
+``{% profile_image profile 'profile_picture' sizes='60px' alt=... class=... %}``
+
+Renders a profile picture or banner as a ``<picture>`` with a WebP
+``srcset`` and a JPEG fallback, from the variants recorded by
+shop/image_variants.py. Until the variants of the current image exist it
+renders a plain ``<img>`` of the original. The ``<picture>`` does not
+generate a box of its own, so CSS written for the bare ``<img>`` still
+applies.
+"""
+from django import template
+from django.utils.html import format_html
+
+from shop.image_variants import current_variants
+
+register = template.Library()
+
+
+def _srcset(variants, index):
+    return ', '.join(f'{variant[index]} {variant[0]}w' for variant in variants)
+
+
+@register.simple_tag
+def profile_image(profile, field, sizes='100vw', alt='', **attrs):
+    image = getattr(profile, field, None)
+    if not image:
+        return ''
+    css_class = attrs.get('class', '')
+    variants = current_variants(profile, field)
+    if not variants:
+        return format_html('<img src="{}" alt="{}" class="{}">', image.url, alt, css_class)
+    return format_html(
+        '<picture style="display: contents">'
+        '<source type="image/webp" srcset="{}" sizes="{}">'
+        '<img src="{}" srcset="{}" sizes="{}" alt="{}" class="{}">'
+        '</picture>',
+        _srcset(variants, 1), sizes,
+        variants[-1][2], _srcset(variants, 2), sizes, alt, css_class,
+    )
@@ -1,3 +1,987 @@
-from django.test import TestCase
+import datetime
+import io
+import json
+from decimal import Decimal
+from importlib import import_module
+from unittest import mock
 
-# Create your tests here.
+from django.apps import apps as django_apps
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.core.files import File
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection, transaction
+from django.db.models import F
+from django.http import QueryDict
+from django.test import RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from PIL import Image
+
+from .applications import CREATED, DUPLICATE, REPLAYED, clean_submission_key, submit_application
+from .archive import archive_batch, archive_expired_tasks, expired_tasks
+from .bulk_io import FORMATS, export_records, import_records
+from .conditional import make_etag, material_page_etag
+from .counters import CacheCounterStore, check_counter_backend, flush_all, material_views
+from .directory import directory_entries, refresh_directory
+from .facets import material_facets
+from .feed import task_feed_page
+from .file_delivery import parse_range, serve_file
+from .image_variants import current_variants, variant_name, variant_names
+from .models import (
+    Application, ArchivedApplication, ArchivedTask, CustomUser, Document, Education, Institution,
+    Notification, PersonSearchEntry, Profile, RelatedMaterial, StoredBlob, StudyMaterial, Task,
+    TaskRecommendation, UserTaskStats,
+)
+from .pagination import InvalidCursor, KeysetPaginator
+from .people_search import index_people, matching_entries, typeahead
+from .profile_views import (
+    add_to_sketch, empty_sketch, estimate, load_sketch, merge_sketches, profile_view_buffer,
+)
+from .recommendations import build_recommendations, recommended_tasks_for
+from .related import refill_queue, refresh_related, related_materials_for
+from .reviews import review_applications
+from .search import search_study_materials
+from .slugs import allocate_slugs, next_free_slug
+from .task_stats import reconcile
+from .templatetags.profile_images import profile_image
+from .view_events import _dedup, get_client_ip, record_material_view, view_events
+
+
+class MyTaskApplicationsTests(TestCase):
+    """The applications dashboard runs a fixed number of queries"""
+
+    def setUp(self):
+        self.owner = CustomUser.objects.create_user('owner', 'owner@example.com', 'pw')
+        self.task = Task.objects.create(title='Delivery help', description='Pick up a parcel', created_by=self.owner)
+        self.client.force_login(self.owner)
+        self.applicants = 0
+
+    def add_applications(self, count, status='pending'):
+        for _ in range(count):
+            self.applicants += 1
+            applicant = CustomUser.objects.create_user(f'applicant{self.applicants}', password='pw')
+            Profile.objects.create(user=applicant)
+            Application.objects.create(task=self.task, applicant=applicant, status=status)
+
+    def get_dashboard(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('my_task_applications'))
+        self.assertEqual(response.status_code, 200)
+        return response, len(queries)
+
+    def test_query_count_is_constant(self):
+        self.add_applications(1)
+        _, baseline = self.get_dashboard()
+
+        self.add_applications(8, status='accepted')
+        self.add_applications(6, status='rejected')
+        response, queries = self.get_dashboard()
+
+        self.assertEqual(queries, baseline)
+        self.assertEqual(response.context['pending_count'], 1)
+        self.assertEqual(response.context['accepted_count'], 8)
+        self.assertEqual(response.context['rejected_count'], 6)
+        self.assertEqual(response.context['total_count'], 15)
+
+    def test_only_own_tasks_are_counted(self):
+        other = CustomUser.objects.create_user('other', password='pw')
+        other_task = Task.objects.create(title='Cleaning', description='Clean a room', created_by=other)
+        Application.objects.create(task=other_task, applicant=self.owner)
+        self.add_applications(2)
+
+        response, _ = self.get_dashboard()
+        self.assertEqual(response.context['total_count'], 2)
+        self.assertEqual(len(response.context['applications']), 2)
+
+
+class UserTaskStatsTests(TestCase):
+    """Incrementally maintained counters agree with a full recount"""
+
+    FIELDS = (
+        'posted_count', 'open_count', 'expired_count',
+        'pending_applications', 'accepted_applications', 'rejected_applications',
+    )
+
+    def setUp(self):
+        self.owner = CustomUser.objects.create_user('owner', password='pw')
+        self.doer = CustomUser.objects.create_user('doer', password='pw')
+
+    def counters(self):
+        return {
+            row['user_id']: tuple(row[field] for field in self.FIELDS)
+            for row in UserTaskStats.objects.values('user_id', *self.FIELDS)
+        }
+
+    def assertMatchesRecount(self):
+        maintained = self.counters()
+        reconcile()
+        self.assertEqual(maintained, self.counters())
+
+    def test_counters_follow_tasks_and_applications(self):
+        tomorrow = datetime.date.today() + datetime.timedelta(days=1)
+        task = Task.objects.create(title='Delivery', description='x', created_by=self.owner, deadline=tomorrow)
+        other = Task.objects.create(title='Cleaning', description='x', created_by=self.owner)
+        application = Application.objects.create(task=task, applicant=self.doer)
+        Application.objects.create(task=other, applicant=self.doer)
+        self.assertMatchesRecount()
+
+        review_applications(self.owner, [application.pk], 'accepted', reject_others=True)
+        task.assigned_to = self.doer
+        task.save()
+        other.delete()
+        self.assertMatchesRecount()
+
+        self.assertEqual(self.counters()[self.owner.pk][:3], (1, 0, 0))
+        self.assertEqual(self.counters()[self.doer.pk][3:], (0, 1, 0))
+
+    def test_my_tasks_reads_the_stats_row(self):
+        Task.objects.create(title='Delivery', description='x', created_by=self.owner)
+        self.client.force_login(self.owner)
+        response = self.client.get(reverse('my_tasks'))
+        self.assertEqual(response.context['stats'].posted_count, 1)
+        self.assertEqual(response.context['stats'].open_count, 1)
+
+
+class CacheCounterStoreTests(TestCase):
+    """Increments pending in the shared cache survive the worker that made them"""
+
+    def setUp(self):
+        cache.clear()
+
+    def test_any_worker_drains_shared_increments(self):
+        worker, other = CacheCounterStore('test.views'), CacheCounterStore('test.views')
+        worker.add(1, 1)
+        worker.add(1, 2)
+        # add() reports pending increments, not rows
+        self.assertEqual(worker.add(2, 1), 4)
+        del worker
+
+        self.assertEqual(other.drain(), {1: 3, 2: 1})
+        self.assertEqual(other.drain(), {})
+        other.add(1, 5)
+        self.assertEqual(other.pending(1), 5)
+        self.assertEqual(other.drain(), {1: 5})
+
+    @override_settings(CACHES={'default': {
+        'BACKEND': 'django.core.cache.backends.db.DatabaseCache', 'LOCATION': 'cache_table',
+    }})
+    def test_non_atomic_cache_is_refused(self):
+        with self.assertRaises(ImproperlyConfigured):
+            CacheCounterStore('test.views')
+        with self.settings(VIEW_COUNTER_BACKEND='cache'), self.assertRaises(ImproperlyConfigured):
+            check_counter_backend()
+
+    def test_failing_buffer_does_not_stop_the_others(self):
+        class Broken:
+            def flush(self):
+                raise ValueError('cache went away')
+
+        class Working:
+            def flush(self):
+                return 3
+
+        with mock.patch('shop.counters._buffers', [Broken(), Working()]), self.assertLogs('shop.counters', 'ERROR'):
+            self.assertEqual(flush_all(), 3)
+
+
+class ClientIpTests(TestCase):
+    """Only hops added by trusted proxies identify the client"""
+
+    def request(self, forwarded):
+        return RequestFactory().get('/', REMOTE_ADDR='10.0.0.1', HTTP_X_FORWARDED_FOR=forwarded)
+
+    def test_forwarded_for_is_ignored_without_trusted_proxies(self):
+        self.assertEqual(get_client_ip(self.request('203.0.113.9')), '10.0.0.1')
+
+    @override_settings(TRUSTED_PROXY_COUNT=1)
+    def test_client_supplied_hops_are_skipped(self):
+        self.assertEqual(get_client_ip(self.request('198.51.100.7, 203.0.113.9')), '203.0.113.9')
+
+
+class MaterialViewDedupTests(TestCase):
+    """Repeat views are dropped per member, and per IP only for anonymous visitors"""
+
+    def setUp(self):
+        self.owner = CustomUser.objects.create_user('owner', password='pw')
+        self.material = make_material(self.owner, 'Notes')
+        view_events.clear()
+        _dedup.clear()
+        self.addCleanup(view_events.clear)
+        self.addCleanup(material_views.clear)
+        self.addCleanup(_dedup.clear)
+
+    def view(self, user):
+        request = RequestFactory().get('/', REMOTE_ADDR='10.0.0.1')
+        request.user = user
+        return record_material_view(request, self.material)
+
+    def test_members_behind_one_address_are_all_counted(self):
+        first, second = CustomUser.objects.create_user('first'), CustomUser.objects.create_user('second')
+        self.assertEqual([self.view(first), self.view(second), self.view(first)], [True, True, False])
+        self.assertEqual(material_views.pending(self.material.pk), 2)
+
+    def test_anonymous_repeats_are_dropped_by_address(self):
+        self.assertEqual([self.view(AnonymousUser()), self.view(AnonymousUser())], [True, False])
+        self.assertTrue(self.view(self.owner))
+
+
+class ByteRangeTests(TestCase):
+    """Range headers of protected file downloads"""
+
+    def test_parse_range(self):
+        cases = [
+            ('bytes=0-99', (0, 99)),
+            ('bytes=-100', (900, 999)),      # suffix
+            ('bytes=-5000', (0, 999)),       # suffix longer than the file
+            ('bytes=500-', (500, 999)),      # open-ended
+            ('bytes=900-5000', (900, 999)),  # end past the file
+            ('bytes=0-1,5-6', None),         # multi-range: whole file
+            ('items=0-1', None),
+            ('', None),
+        ]
+        for header, expected in cases:
+            with self.subTest(header=header):
+                self.assertEqual(parse_range(header, 1000), expected)
+
+    def test_unsatisfiable_ranges_raise(self):
+        for header in ('bytes=1000-', 'bytes=5-2', 'bytes=-0'):
+            with self.subTest(header=header), self.assertRaises(ValueError):
+                parse_range(header, 1000)
+
+    def test_serve_file_answers_ranges(self):
+        content = File(io.BytesIO(b'0123456789'), name='notes.pdf')
+        factory = RequestFactory()
+
+        response = serve_file(factory.get('/', HTTP_RANGE='bytes=-3'), content, 'application/pdf')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Range'], 'bytes 7-9/10')
+        self.assertEqual(b''.join(response.streaming_content), b'789')
+
+        response = serve_file(factory.get('/', HTTP_RANGE='bytes=10-'), content, 'application/pdf')
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response['Content-Range'], 'bytes */10')
+
+
+class MaterialPageEtagTests(TestCase):
+    """The material page ETag covers everything the page shows"""
+
+    def setUp(self):
+        self.user = CustomUser.objects.create_user('reader', password='pw')
+        self.material = StudyMaterial.objects.create(
+            user=self.user, title='Algebra notes', file='study_materials/algebra.pdf',
+            material_type='pdf', category='notes', is_approved=True,
+        )
+
+    def etag(self):
+        request = RequestFactory().get('/')
+        request.user = self.user
+        return material_page_etag(request, self.material.pk)
+
+    def test_view_count_changes_the_etag(self):
+        before = self.etag()
+        StudyMaterial.objects.filter(pk=self.material.pk).update(views=F('views') + 1)
+        self.assertNotEqual(self.etag(), before)
+
+    def test_related_list_changes_the_etag(self):
+        other = StudyMaterial.objects.create(
+            user=self.user, title='Algebra papers', file='study_materials/papers.pdf',
+            material_type='pdf', category='notes', is_approved=True,
+        )
+        before = self.etag()
+        RelatedMaterial.objects.create(material=self.material, related=other, score=1.0)
+        self.assertNotEqual(self.etag(), before)
+
+    @override_settings(VIEW_COUNTER_FLUSH_INTERVAL=3600)
+    def test_second_visit_revalidates(self):
+        self.addCleanup(material_views.clear)
+        self.addCleanup(view_events.clear)
+        self.addCleanup(_dedup.clear)
+        self.client.force_login(self.user)
+        url = reverse('view_material', args=[self.material.pk])
+        first = self.client.get(url)
+        self.assertEqual(first.status_code, 200)
+        second = self.client.get(url, HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(second.status_code, 304)
+
+
+class MaterialPreviewTests(TestCase):
+    """Previews of unapproved materials are only served to their owner"""
+
+    def setUp(self):
+        self.owner = CustomUser.objects.create_user('uploader', password='pw')
+        self.stranger = CustomUser.objects.create_user('stranger', password='pw')
+        preview = default_storage.save('study_materials/tests/draft.1.preview.webp', ContentFile(b'RIFF'))
+        self.addCleanup(default_storage.delete, preview)
+        self.material = StudyMaterial.objects.create(
+            user=self.owner, title='Draft', file='study_materials/tests/draft.pdf',
+            material_type='pdf', preview=preview,
+        )
+        self.url = reverse('material_preview', args=[self.material.pk])
+
+    def test_owner_gets_the_preview(self):
+        self.client.force_login(self.owner)
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.has_header('ETag'))
+
+    def test_other_users_get_404_even_when_revalidating(self):
+        etag = make_etag('preview', self.material.preview.name)
+        self.client.force_login(self.stranger)
+        self.assertEqual(self.client.get(self.url).status_code, 404)
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 404)
+
+    def test_preview_is_removed_when_the_material_goes_by_cascade(self):
+        name = self.material.preview.name
+        with self.captureOnCommitCallbacks(execute=True):
+            self.owner.delete()
+        self.assertFalse(default_storage.exists(name))
+
+
+def make_material(user, title, **fields):
+    fields.setdefault('file', 'study_materials/tests/material.pdf')
+    fields.setdefault('material_type', 'pdf')
+    fields.setdefault('is_approved', True)
+    return StudyMaterial.objects.create(user=user, title=title, **fields)
+
+
+class MaterialSearchTests(TestCase):
+    """Catalogue search (icontains fallback outside PostgreSQL)"""
+
+    def test_matches_title_description_and_place(self):
+        user = CustomUser.objects.create_user('searcher', password='pw')
+        calculus = make_material(user, 'Calculus revision')
+        physics = make_material(user, 'Mechanics', description='Kinematics and calculus problems')
+        harvard = make_material(user, 'Chemistry', task_assigned_place='Harvard University')
+        make_material(user, 'History essays')
+
+        found = search_study_materials(StudyMaterial.objects.all(), 'calculus')
+        self.assertCountEqual(found, [calculus, physics])
+        self.assertCountEqual(search_study_materials(StudyMaterial.objects.all(), 'harvard'), [harvard])
+        self.assertEqual(search_study_materials(StudyMaterial.objects.all(), '  ').count(), 4)
+
+
+class KeysetPaginationTests(TestCase):
+    """Cursor pages walk a listing without gaps or repeats"""
+
+    def test_next_and_previous_cursors(self):
+        user = CustomUser.objects.create_user('pager', password='pw')
+        for n in range(5):
+            make_material(user, f'Material {n}', views=n % 2)
+        queryset = StudyMaterial.objects.all()
+        expected = list(queryset.order_by('-views', '-id'))
+        paginator = KeysetPaginator(queryset, 2, ('-views', '-id'))
+
+        seen, page = [], paginator.page()
+        self.assertFalse(page.has_previous())
+        while True:
+            seen.extend(page)
+            if not page.has_next():
+                break
+            page = paginator.page(page.next_cursor)
+        self.assertEqual(seen, expected)
+
+        previous = paginator.page(page.previous_cursor)
+        self.assertEqual(list(previous), expected[2:4])
+
+    def test_invalid_cursor(self):
+        with self.assertRaises(InvalidCursor):
+            KeysetPaginator(StudyMaterial.objects.all(), 2).page('not-a-cursor')
+
+
+class RelatedMaterialsTests(TestCase):
+    """The precomputed related lists follow saved materials"""
+
+    def test_refresh_links_similar_materials_both_ways(self):
+        user = CustomUser.objects.create_user('librarian', password='pw')
+        algebra = make_material(user, 'Linear algebra exercises', category='notes', task_assigned_place='MIT')
+        unrelated = make_material(user, 'Poetry anthology', category='books')
+        matrices = make_material(user, 'Linear algebra matrices', category='notes', task_assigned_place='MIT')
+
+        refresh_related(matrices.pk)
+
+        self.assertEqual(list(related_materials_for(matrices)), [algebra])
+        self.assertEqual(list(related_materials_for(algebra)), [matrices])
+        self.assertFalse(RelatedMaterial.objects.filter(related=unrelated).exists())
+
+    @override_settings(VIEW_COUNTER_FLUSH_INTERVAL=3600)
+    def test_refills_wait_for_the_flush_and_drafts_are_hidden(self):
+        self.addCleanup(refill_queue.clear)
+        user = CustomUser.objects.create_user('librarian', password='pw')
+        algebra = make_material(user, 'Linear algebra exercises', category='notes')
+        matrices = make_material(user, 'Linear algebra matrices', category='notes')
+        vectors = make_material(user, 'Linear algebra vectors', category='notes')
+        with override_settings(RELATED_MATERIALS_PER_ITEM=1):
+            for material in (algebra, matrices, vectors):
+                refresh_related(material.pk)
+            held = RelatedMaterial.objects.get(material=algebra).related_id
+            with self.captureOnCommitCallbacks(execute=True):
+                StudyMaterial.objects.get(pk=held).delete()
+            # Not refilled on the request
+            self.assertFalse(RelatedMaterial.objects.filter(material=algebra).exists())
+
+            self.assertGreaterEqual(refill_queue.flush(), 1)
+            remaining = matrices if held == vectors.pk else vectors
+            self.assertEqual(list(related_materials_for(algebra)), [remaining])
+
+        StudyMaterial.objects.filter(pk=remaining.pk).update(is_approved=False)
+        self.assertEqual(list(related_materials_for(algebra)), [])
+
+
+class FacetCountTests(TestCase):
+    """Facet counts respect the other facet and drop their cache on writes"""
+
+    def setUp(self):
+        cache.clear()
+        self.user = CustomUser.objects.create_user('counter', password='pw')
+
+    def test_counts_and_invalidation(self):
+        make_material(self.user, 'Notes', category='notes')
+        make_material(self.user, 'Scan', category='notes', material_type='image')
+        make_material(self.user, 'Book', category='books')
+
+        facets = material_facets(material_type='pdf')
+        categories = {value: n for value, _, n in facets['categories']}
+        self.assertEqual((categories['notes'], categories['books']), (1, 1))
+        types = {value: n for value, _, n in material_facets(category='notes')['types']}
+        self.assertEqual(types, {'pdf': 1, 'image': 1})
+
+        with self.captureOnCommitCallbacks(execute=True):
+            make_material(self.user, 'More notes', category='notes')
+        categories = {value: n for value, _, n in material_facets()['categories']}
+        self.assertEqual(categories['notes'], 3)
+
+
+class DuplicateUploadMessageTests(TestCase):
+    """Reusing a stored copy must not reveal other users' private files"""
+
+    def upload(self, user, title):
+        self.client.force_login(user)
+        pdf = SimpleUploadedFile('cv.pdf', b'%PDF-1.4 identical content', content_type='application/pdf')
+        response = self.client.post(reverse('upload_document'), {
+            'title': title, 'document_type': 'resume', 'file': pdf,
+        }, follow=True)
+        return [str(message) for message in response.context['messages']]
+
+    def test_only_own_duplicates_are_mentioned(self):
+        alice = CustomUser.objects.create_user('alice', password='pw')
+        bob = CustomUser.objects.create_user('bob', password='pw')
+        self.upload(alice, 'Private CV')
+
+        messages = self.upload(bob, 'My CV')
+        self.assertFalse(any('already' in message or 'before' in message for message in messages))
+        self.assertIn('You already uploaded this file as "My CV".', self.upload(bob, 'CV again'))
+        for document in Document.objects.all():
+            self.addCleanup(default_storage.delete, document.file.name)
+
+
+class SlugAllocationTests(TestCase):
+    """Task slugs continue after the highest numeric suffix"""
+
+    def setUp(self):
+        self.owner = CustomUser.objects.create_user('slugger', password='pw')
+
+    def task(self, title, slug=''):
+        return Task.objects.create(title=title, description='-', created_by=self.owner, slug=slug)
+
+    def test_collisions_get_increasing_suffixes(self):
+        self.assertEqual(self.task('Move boxes').slug, 'move-boxes')
+        self.assertEqual(self.task('Move Boxes!').slug, 'move-boxes-1')
+        self.assertEqual(self.task('move boxes').slug, 'move-boxes-2')
+
+    def test_suffix_gaps_and_lookalikes(self):
+        for slug in ('move-boxes', 'move-boxes-3', 'move-boxes-old', 'move-boxes-extra-9'):
+            self.task('Move boxes', slug=slug)
+        self.assertEqual(next_free_slug(Task, 'move-boxes'), 'move-boxes-4')
+        self.assertEqual(next_free_slug(Task, 'paint-fence'), 'paint-fence')
+
+    def test_allocate_slugs_for_a_batch(self):
+        self.task('Move boxes', slug='move-boxes-2')
+        slugs = allocate_slugs(Task, ['Move boxes', 'Paint fence', 'Move boxes', 'Paint fence'])
+        # A free base is used first, then suffixes continue after the highest
+        self.assertEqual(slugs, ['move-boxes', 'paint-fence', 'move-boxes-3', 'paint-fence-1'])
+
+
+class TaskFeedTests(TestCase):
+    """The board feed endpoint pages through approved tasks for members"""
+
+    def setUp(self):
+        self.owner = CustomUser.objects.create_user('poster', password='pw')
+        for n in range(3):
+            Task.objects.create(title=f'Errand {n}', description='-', created_by=self.owner, is_approved=True)
+        Task.objects.create(title='Hidden errand', description='-', created_by=self.owner)
+
+    def test_members_page_through_approved_tasks(self):
+        self.client.force_login(self.owner)
+        first = self.client.get(reverse('task_feed')).json()
+        self.assertEqual(first['count'], 3)
+        self.assertNotIn('Hidden errand', first['html'])
+
+        page = task_feed_page(QueryDict(), per_page=2)
+        self.assertTrue(page.has_next())
+        rest = self.client.get(reverse('task_feed'), {'cursor': page.next_cursor}).json()
+        self.assertEqual((rest['count'], rest['has_next']), (1, False))
+        self.assertEqual(self.client.get(reverse('task_feed'), {'cursor': '!'}).status_code, 400)
+
+    def test_anonymous_clients_are_redirected(self):
+        self.assertEqual(self.client.get(reverse('task_feed')).status_code, 302)
+
+
+class BulkReviewTests(TestCase):
+    """Owners review many applications in one call"""
+
+    def setUp(self):
+        self.owner = CustomUser.objects.create_user('owner', password='pw')
+        self.task = Task.objects.create(title='Delivery', description='x', created_by=self.owner)
+        self.applications = [
+            Application.objects.create(task=self.task, applicant=CustomUser.objects.create_user(f'doer{n}'))
+            for n in range(3)
+        ]
+
+    def test_accepting_rejects_the_other_applicants(self):
+        chosen, *others = self.applications
+        stranger_task = Task.objects.create(title='Cleaning', description='x', created_by=chosen.applicant)
+        foreign = Application.objects.create(task=stranger_task, applicant=others[0].applicant)
+
+        result = review_applications(self.owner, [chosen.pk, foreign.pk], 'accepted', reject_others=True)
+
+        self.assertEqual(result, {'updated': 1, 'auto_rejected': 2, 'notified': 3})
+        statuses = dict(Application.objects.values_list('pk', 'status'))
+        self.assertEqual(statuses[chosen.pk], 'accepted')
+        self.assertEqual({statuses[other.pk] for other in others}, {'rejected'})
+        self.assertEqual(statuses[foreign.pk], 'pending')
+        self.assertEqual(Notification.objects.filter(application__task=self.task).count(), 3)
+
+        # Reviewing again changes nothing
+        again = review_applications(self.owner, [chosen.pk], 'accepted', reject_others=True)
+        self.assertEqual(again, {'updated': 0, 'auto_rejected': 0, 'notified': 0})
+
+    def test_unknown_status_is_refused(self):
+        with self.assertRaises(ValueError):
+            review_applications(self.owner, [self.applications[0].pk], 'pending')
+
+    def test_malformed_json_bodies_are_refused(self):
+        self.client.login(username='owner', password='pw')
+        pk = self.applications[0].pk
+        for body in ([pk], {'application_ids': pk, 'status': 'accepted'},
+                     {'application_ids': str(pk), 'status': 'accepted'}, 'not json'):
+            response = self.client.post(
+                reverse('bulk_review_applications'),
+                body if isinstance(body, str) else json.dumps(body),
+                content_type='application/json',
+            )
+            self.assertEqual(response.status_code, 400)
+            self.assertFalse(response.json()['success'])
+        self.assertEqual(Application.objects.filter(status='pending').count(), 3)
+
+
+class SubmitApplicationTests(TestCase):
+    """Applying twice never creates a second row"""
+
+    def setUp(self):
+        owner = CustomUser.objects.create_user('owner', password='pw')
+        self.doer = CustomUser.objects.create_user('doer', password='pw')
+        self.task = Task.objects.create(title='Delivery', description='x', created_by=owner, is_approved=True)
+
+    def test_replays_and_duplicates(self):
+        outcome, application_id = submit_application(self.task, self.doer, 'Happy to help', 'key-00000001')
+        self.assertEqual(outcome, CREATED)
+
+        self.assertEqual(submit_application(self.task, self.doer, 'Happy to help', 'key-00000001'), (REPLAYED, application_id))
+        self.assertEqual(submit_application(self.task, self.doer, 'Again', 'key-00000002'), (DUPLICATE, application_id))
+        self.assertEqual(Application.objects.filter(task=self.task).count(), 1)
+        self.assertEqual(UserTaskStats.objects.get(user=self.doer).pending_applications, 1)
+
+    def test_submission_keys_are_validated(self):
+        self.assertEqual(clean_submission_key(' key-00000001 '), 'key-00000001')
+        self.assertIsNone(clean_submission_key('short'))
+        self.assertIsNone(clean_submission_key('not a key!'))
+
+
+class ArchiveExpiredTasksTests(TestCase):
+    """Expired, unassigned tasks move to the archive with their applications"""
+
+    def setUp(self):
+        self.owner = CustomUser.objects.create_user('owner', password='pw')
+        self.doer = CustomUser.objects.create_user('doer', password='pw')
+        self.today = datetime.date(2024, 6, 1)
+
+    def make_task(self, title, days, **fields):
+        deadline = self.today + datetime.timedelta(days=days)
+        return Task.objects.create(title=title, description='x', created_by=self.owner, deadline=deadline, **fields)
+
+    def test_archives_in_batches_and_keeps_notifications(self):
+        expired = [self.make_task(f'Expired {n}', -2) for n in range(3)]
+        assigned = self.make_task('Assigned', -2, assigned_to=self.doer)
+        upcoming = self.make_task('Upcoming', 3)
+        application = Application.objects.create(task=expired[0], applicant=self.doer, message='Me!')
+        notification = Notification.objects.create(user=self.doer, message='x', application=application)
+
+        self.assertEqual(archive_expired_tasks(batch_size=2, today=self.today), (3, 1))
+
+        self.assertEqual(set(Task.objects.values_list('pk', flat=True)), {assigned.pk, upcoming.pk})
+        self.assertEqual(
+            set(ArchivedTask.objects.values_list('original_id', flat=True)),
+            {task.pk for task in expired},
+        )
+        archived = ArchivedApplication.objects.get()
+        self.assertEqual((archived.original_id, archived.message), (application.pk, 'Me!'))
+        self.assertEqual(archived.task.original_id, expired[0].pk)
+        notification.refresh_from_db()
+        self.assertIsNone(notification.application_id)
+
+    def test_batches_cost_the_same_and_keep_the_owners_counts(self):
+        for n in range(4):
+            task = self.make_task(f'Expired {n}', -2, task_assigned_place='Harvard University')
+            Application.objects.create(task=task, applicant=self.doer)
+            TaskRecommendation.objects.create(user=self.doer, task=task, score=1.0)
+        counts = lambda: list(UserTaskStats.objects.order_by('pk').values_list(
+            'posted_count', 'expired_count', 'pending_applications'))
+        reconcile(today=self.today)
+        before = counts()
+
+        with CaptureQueriesContext(connection) as one:
+            archive_batch(expired_tasks(self.today), batch_size=1)
+        with CaptureQueriesContext(connection) as three:
+            archive_batch(expired_tasks(self.today), batch_size=3)
+        self.assertEqual(len(one), len(three))
+
+        self.assertEqual(counts(), before)
+        reconcile(today=self.today)
+        self.assertEqual(counts(), before)
+        self.assertFalse(TaskRecommendation.objects.exists())
+        self.assertEqual(Institution.objects.get().usage_count, 0)
+
+    def test_grace_days_and_batch_limit(self):
+        for n in range(3):
+            self.make_task(f'Expired {n}', -2)
+        self.assertEqual(archive_expired_tasks(today=self.today, grace_days=5), (0, 0))
+        self.assertEqual(archive_expired_tasks(batch_size=1, max_batches=2, today=self.today), (2, 0))
+        self.assertEqual(Task.objects.count(), 1)
+
+
+class InstitutionTests(TestCase):
+    """Place fields are linked to canonical institutions"""
+
+    def setUp(self):
+        self.owner = CustomUser.objects.create_user('owner', password='pw')
+
+    def make_task(self, place):
+        return Task.objects.create(title='Delivery', description='x', created_by=self.owner, task_assigned_place=place)
+
+    def test_spellings_share_an_institution(self):
+        first, second = self.make_task('Harvard University'), self.make_task('harvard  university.')
+        self.assertEqual(first.institution_id, second.institution_id)
+        self.assertEqual(Institution.objects.get().usage_count, 2)
+
+        second.task_assigned_place = 'MIT'
+        second.save()
+        self.assertEqual(
+            dict(Institution.objects.values_list('normalized', 'usage_count')),
+            {'harvard university': 1, 'mit': 1},
+        )
+
+    def test_drifted_count_never_breaks_the_save(self):
+        task = self.make_task('Harvard University')
+        Institution.objects.update(usage_count=0)
+        with transaction.atomic():
+            task.task_assigned_place = 'MIT'
+            task.save()
+            self.assertEqual(Task.objects.filter(institution__normalized='mit').count(), 1)
+        self.assertEqual(Institution.objects.get(normalized='harvard university').usage_count, 0)
+
+    def test_unchanged_place_skips_the_lookup(self):
+        task = self.make_task('Harvard University')
+        task.title = 'Delivery, urgent'
+        with CaptureQueriesContext(connection) as queries:
+            task.save()
+        self.assertFalse([query for query in queries if 'shop_institution' in query['sql']])
+        self.assertEqual(Task.objects.get(pk=task.pk).institution.usage_count, 1)
+
+    def test_migration_links_existing_rows(self):
+        task = self.make_task('Harvard University')
+        Task.objects.filter(pk=task.pk).update(institution=None)
+        Institution.objects.all().delete()
+
+        backfill = import_module('shop.migrations.0028_backfill_institutions')
+        backfill.link_institutions(django_apps, None)
+
+        institution = Task.objects.get(pk=task.pk).institution
+        self.assertEqual((institution.name, institution.usage_count), ('Harvard University', 1))
+
+    def test_autocomplete_requires_login(self):
+        self.make_task('Harvard University')
+        url = reverse('institution_autocomplete')
+        self.assertEqual(self.client.get(url, {'q': 'harv'}).status_code, 302)
+        self.client.force_login(self.owner)
+        self.assertEqual(self.client.get(url, {'q': 'harv'}).json()['results'][0]['name'], 'Harvard University')
+
+
+class TaskRecommendationTests(TestCase):
+    """Users are recommended open tasks that share their features"""
+
+    def setUp(self):
+        self.owner = CustomUser.objects.create_user('owner', password='pw')
+        self.student = CustomUser.objects.create_user('student', password='pw')
+        Education.objects.create(
+            user=self.student, institution='Harvard University', degree='BSc',
+            field_of_study='Mathematics', start_date=datetime.date(2020, 9, 1),
+        )
+
+    def make_task(self, title, place='', created_by=None):
+        return Task.objects.create(
+            title=title, description='x', created_by=created_by or self.owner,
+            task_assigned_place=place, is_approved=True,
+        )
+
+    def test_best_matches_first_excluding_own_and_applied(self):
+        both = self.make_task('Mathematics tutoring', 'Harvard University')
+        place = self.make_task('Move a sofa', 'harvard university')
+        subject = self.make_task('Mathematics homework')
+        self.make_task('Walk a dog', 'Yale')
+        self.make_task('Mathematics notes', 'Harvard University', created_by=self.student)
+        Application.objects.create(task=self.make_task('Grade mathematics', 'Harvard University'), applicant=self.student)
+
+        build_recommendations(block_size=1, limit=2)
+
+        recommended = list(
+            TaskRecommendation.objects.filter(user=self.student).order_by('-score').values_list('task_id', flat=True)
+        )
+        self.assertEqual(recommended, [both.pk, place.pk])
+        self.assertNotIn(subject.pk, recommended)
+        self.assertEqual(list(recommended_tasks_for(self.student)), [both, place])
+
+
+class RecordImportTests(TestCase):
+    """CSV / JSON Lines import validates rows and reports them by line"""
+
+    def setUp(self):
+        self.owner = CustomUser.objects.create_user('poster', password='pw')
+
+    def store(self, name):
+        name = default_storage.save(name, ContentFile(b'%PDF-1.4'))
+        self.addCleanup(default_storage.delete, name)
+        return name
+
+    def test_past_deadline_is_reported_with_its_line(self):
+        past = datetime.date.today() - datetime.timedelta(days=1)
+        future = datetime.date.today() + datetime.timedelta(days=7)
+        stream = io.StringIO(
+            'created_by,title,description,budget,category,deadline\n'
+            f'poster,Deliver a parcel,x,10,delivery,{future}\n'
+            f'poster,Too late,x,10,delivery,{past}\n'
+            f'nobody,Orphan,x,10,delivery,{future}\n'
+        )
+        result = import_records('tasks', stream, 'csv', batch_size=2)
+
+        self.assertEqual(result.created, 1)
+        self.assertEqual([line for line, _ in result.errors], [3, 4])
+        self.assertIn('deadline', result.errors[0][1])
+        self.assertEqual(list(Task.objects.values_list('title', flat=True)), ['Deliver a parcel'])
+        self.assertEqual(UserTaskStats.objects.get(user=self.owner).posted_count, 1)
+
+    def test_csv_and_jsonl_round_trip(self):
+        Task.objects.create(
+            title='Clean the lab', description='Saturday, "early"', budget='25.50', category='cleaning',
+            created_by=self.owner, task_assigned_place='Harvard University', is_approved=True,
+        )
+        for fmt in FORMATS:
+            exported = io.StringIO()
+            self.assertEqual(export_records('tasks', exported, fmt), Task.objects.count())
+            exported.seek(0)
+            before = Task.objects.count()
+            self.assertEqual(import_records('tasks', exported, fmt).created, before)
+
+        copies = Task.objects.filter(title='Clean the lab')
+        self.assertEqual(copies.count(), 4)
+        self.assertEqual(len(set(copies.values_list('slug', flat=True))), 4)
+        self.assertEqual(
+            set(copies.values_list('description', 'budget', 'category', 'is_approved')),
+            {('Saturday, "early"', Decimal('25.50'), 'cleaning', True)},
+        )
+        self.assertEqual(Institution.objects.get().usage_count, 4)
+
+    def test_material_files_are_referenced_or_refused(self):
+        blob = self.store('blobs/ab/cd/abcd.pdf')
+        StoredBlob.objects.create(digest='abcd', extension='.pdf', name=blob, size=8)
+        shared = self.store('study_materials/tests/shared.pdf')
+        make_material(self.owner, 'Existing', file=shared)
+        lines = [
+            {'user': 'poster', 'title': 'Blob', 'category': 'notes', 'material_type': 'pdf', 'file': blob},
+            {'user': 'poster', 'title': 'Shared', 'category': 'notes', 'material_type': 'pdf', 'file': shared},
+            {'user': 'poster', 'title': 'Missing', 'category': 'notes', 'material_type': 'pdf', 'file': 'nowhere.pdf'},
+        ]
+        stream = io.StringIO(''.join(json.dumps(line) + '\n' for line in lines))
+        result = import_records('materials', stream, 'jsonl')
+
+        self.assertEqual(result.created, 1)
+        self.assertEqual(
+            result.errors,
+            [(2, 'file: already used by another record'), (3, 'file: not found in storage')],
+        )
+        self.assertEqual(StoredBlob.objects.get().ref_count, 2)
+
+
+class ProfileViewSketchTests(TestCase):
+    """Unique profile viewers are estimated from mergeable HyperLogLog sketches"""
+
+    def sketch_of(self, keys):
+        registers = empty_sketch()
+        for key in keys:
+            add_to_sketch(registers, f'user:{key}')
+        return registers
+
+    def test_estimate_error_bounds(self):
+        self.assertEqual(estimate(empty_sketch()), 0)
+        self.assertAlmostEqual(estimate(self.sketch_of(range(50))), 50, delta=2)
+        for size in (1000, 20000):
+            # Three standard errors of the 4 KB sketch
+            self.assertAlmostEqual(estimate(self.sketch_of(range(size))), size, delta=size * 0.05)
+
+    def test_repeat_viewers_are_not_counted_twice(self):
+        once = self.sketch_of(range(500))
+        twice = self.sketch_of(list(range(500)) * 2)
+        self.assertTrue((once == twice).all())
+
+    def test_days_merge_into_their_union(self):
+        monday, tuesday = self.sketch_of(range(0, 4000)), self.sketch_of(range(2000, 6000))
+        merged = merge_sketches([monday, tuesday])
+        self.assertTrue((merged == self.sketch_of(range(6000))).all())
+        self.assertAlmostEqual(estimate(merged), 6000, delta=300)
+        self.assertTrue((load_sketch(merged.tobytes()) == merged).all())
+
+    @override_settings(VIEW_COUNTER_FLUSH_INTERVAL=0)
+    def test_endpoint_counts_distinct_viewers_across_days(self):
+        owner = CustomUser.objects.create_user('owner', password='pw')
+        profile = Profile.objects.create(user=owner)
+        viewers = [CustomUser.objects.create_user(f'viewer{n}', password='pw') for n in range(3)]
+        today = datetime.date.today()
+        for viewer in viewers[:2]:
+            profile_view_buffer.add(profile.pk, f'user:{viewer.pk}', today - datetime.timedelta(days=3))
+        profile_view_buffer.flush()
+
+        for viewer in viewers[1:]:
+            self.client.force_login(viewer)
+            response = self.client.post(reverse('increment_profile_views'), {'username': 'owner'})
+            self.assertTrue(response.json()['success'])
+        self.assertEqual(response.json()['totals'], {'today': 2, 'week': 3, 'all_time': 3})
+
+        profile.refresh_from_db()
+        self.assertEqual(profile.views, 3)
+        missing = self.client.post(reverse('increment_profile_views'), {'username': 'nobody'})
+        self.assertEqual(missing.status_code, 404)
+
+
+class DirectoryRankTests(TestCase):
+    """The directory reads a ranking rebuilt outside of requests"""
+
+    def setUp(self):
+        for username, views in (('quiet', 1), ('popular', 50), ('known', 10)):
+            Profile.objects.create(user=CustomUser.objects.create_user(username, password='pw'), views=views)
+
+    def ranking(self):
+        return list(directory_entries().values_list('user__username', flat=True))
+
+    def test_refresh_ranks_by_views(self):
+        self.assertEqual(self.ranking(), [])
+        self.assertEqual(refresh_directory(), 3)
+        self.assertEqual(self.ranking(), ['popular', 'known', 'quiet'])
+
+        Profile.objects.filter(user__username='quiet').update(views=100)
+        self.assertEqual(self.ranking(), ['popular', 'known', 'quiet'])
+        refresh_directory()
+        self.assertEqual(self.ranking(), ['quiet', 'popular', 'known'])
+
+    def test_migration_builds_the_first_ranking(self):
+        ranking = import_module('shop.migrations.0029_rank_directory')
+        ranking.build_first_ranking(django_apps, None)
+        self.assertEqual(self.ranking(), ['popular', 'known', 'quiet'])
+
+
+class PeopleSearchTests(TestCase):
+    """The directory search reads the people search index"""
+
+    def setUp(self):
+        self.ada = CustomUser.objects.create_user('ada', password='pw', first_name='Ada', last_name='Lovelace')
+        Profile.objects.create(user=self.ada, title='Analyst', views=5)
+        Profile.objects.create(user=CustomUser.objects.create_user('bob', password='pw'), title='Lovelace scholar')
+        refresh_directory()
+
+    def search(self, query):
+        return list(directory_entries(query).values_list('user__username', flat=True))
+
+    def test_existing_users_are_indexed_by_the_migration(self):
+        PersonSearchEntry.objects.all().delete()
+        self.assertEqual(self.search('lovelace'), [])
+
+        backfill = import_module('shop.migrations.0030_index_people')
+        backfill.index_existing_people(django_apps, None)
+
+        self.assertEqual(self.search('lovelace'), ['ada', 'bob'])
+        self.assertEqual(self.search('analyst'), ['ada'])
+        self.assertEqual([person['username'] for person in typeahead('lovelace')], ['ada', 'bob'])
+
+    def test_long_profiles_stay_searchable_by_institution(self):
+        scholar = CustomUser.objects.create_user('scholar', password='pw', first_name='N' * 150, last_name='M' * 150)
+        Profile.objects.create(user=scholar, title='T' * 100, location='Reykjavik')
+        Education.objects.create(
+            user=scholar, institution='University of Iceland', degree='PhD', start_date=datetime.date(2020, 9, 1),
+        )
+        index_people([scholar.pk])
+        refresh_directory()
+        self.assertEqual(self.search('university of iceland'), ['scholar'])
+        self.assertEqual(self.search('reykjavik'), ['scholar'])
+
+    def test_name_matches_rank_first_despite_punctuation(self):
+        obrien = CustomUser.objects.create_user('sean', password='pw', first_name='Seán', last_name="O'Brien")
+        Profile.objects.create(user=obrien, title='Clerk')
+        CustomUser.objects.filter(username='bob').update(first_name='Bob')
+        Profile.objects.filter(user__username='bob').update(title="O'Brien fan")
+        index_people(CustomUser.objects.values_list('pk', flat=True))
+        self.assertEqual(list(matching_entries("O'Brien").values_list('user__username', flat=True)), ['sean', 'bob'])
+
+
+@override_settings(PROFILE_IMAGE_VARIANTS_ASYNC=False, PROFILE_IMAGE_WIDTHS={'profile_picture': (64, 160, 320)})
+class ProfileImageVariantTests(TestCase):
+    """Resized profile pictures are rendered on upload and removed on replace"""
+
+    def setUp(self):
+        self.profile = Profile.objects.create(user=CustomUser.objects.create_user('owner', password='pw'))
+
+    def upload(self, name, width):
+        output = io.BytesIO()
+        Image.new('RGB', (width, width // 2), (200, 30, 30)).save(output, format='PNG')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.profile.profile_picture = SimpleUploadedFile(name, output.getvalue(), content_type='image/png')
+            self.profile.save()
+        self.profile.refresh_from_db()
+        name = self.profile.profile_picture.name
+        self.addCleanup(default_storage.delete, name)
+        for variant in variant_names('profile_picture', name):
+            self.addCleanup(default_storage.delete, variant)
+        return name
+
+    def test_widths_are_never_upscaled(self):
+        name = self.upload('small.png', 200)
+        self.assertEqual(
+            self.profile.image_variants['profile_picture'],
+            {'name': name, 'widths': [[64, 64], [160, 160], [320, 200]]},
+        )
+        self.assertEqual([width for width, _, _ in current_variants(self.profile, 'profile_picture')], [64, 160, 200])
+        with default_storage.open(variant_name(name, 320, 'jpg')) as f:
+            self.assertEqual(Image.open(f).size, (200, 100))
+        self.assertIn('srcset', profile_image(self.profile, 'profile_picture', sizes='60px'))
+
+    def test_replaced_image_variants_are_deleted(self):
+        old = self.upload('first.png', 400)
+        old_variants = variant_names('profile_picture', old)
+        self.assertTrue(all(default_storage.exists(variant) for variant in old_variants))
+
+        new = self.upload('second.png', 100)
+        self.assertFalse(any(default_storage.exists(variant) for variant in old_variants))
+        self.assertEqual(self.profile.image_variants['profile_picture']['name'], new)
+        self.assertTrue(default_storage.exists(variant_name(new, 160, 'webp')))
+        self.assertFalse(default_storage.exists(variant_name(new, 320, 'webp')))
@@ -14,20 +14,25 @@ urlpatterns = [
     path('', views.home, name='home'),
     path('about/', views.about, name='about'),
     path('base/', views.base, name='base'),
+    path('base/feed/', views.task_feed, name='task_feed'),
+    path('api/institutions/', views.institution_autocomplete, name='institution_autocomplete'),
     path('post/', views.post, name='post'),
     path('settings/', views.settings, name='settings'),   
     path('logout/', views.logout_page, name='logout'),
     
     # User directory
     path('users/', views.user_directory, name='user_directory'),
+    path('api/people/', views.people_typeahead, name='people_typeahead'),
 
     # Task related URLs
     path('create-task/', create_task, name='create_task'),
     path('task/<int:task_id>/apply/', views.apply_for_task, name='apply_for_task'),
     path('my-task-applications/', views.my_task_applications, name='my_task_applications'),
     path('my-task-applications/delete/<int:application_id>/', views.delete_application, name='delete_application'),
+    path('applications/review/', views.bulk_review_applications, name='bulk_review_applications'),
     path('application/<int:application_id>/<str:status>/', views.update_application_status, name='update_application_status'),
     path('profile/my-tasks/', views.my_tasks, name='my_tasks'),
+    path('profile/my-tasks/history/', views.task_history, name='task_history'),
     path('task/<int:task_id>/edit/', views.edit_task, name='edit_task'),
     path('task/<int:task_id>/delete/', views.delete_task, name='delete_task'),
 
@@ -36,6 +41,7 @@ urlpatterns = [
     path('profile/post_study', views.upload_study_material, name='upload_study_material'),
     path('material/<int:material_id>/', views.view_material, name='view_material'),
     path('protected-file/<int:material_id>/', views.protected_file, name='protected_file'),
+    path('material/<int:material_id>/preview/', views.material_preview, name='material_preview'),
     path('material/<int:material_id>/stats/', views.ajax_get_material_stats, name='material_stats'),
     path('my-uploads/', views.my_uploads, name='my_uploads'),
     path('study-material/<int:material_id>/delete/', views.delete_study_material, name='delete_study_material'),
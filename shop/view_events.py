@@ -0,0 +1,180 @@
+# shop/view_events.py
+"""
+Batched ingestion of MaterialView analytics events.
+
+Views are put on a bounded in-process queue instead of being INSERTed on
+the request path, and the counter flush thread (shop/counters.py) writes
+them out with bulk_create. Repeat views of the same material inside
+MATERIAL_VIEW_DEDUP_WINDOW seconds are dropped before they reach the
+queue, and only accepted views bump StudyMaterial.views. Signed-in users
+are told apart by their account only, so members behind one address (a
+campus NAT, or a proxy when TRUSTED_PROXY_COUNT is wrong) are all counted;
+anonymous visitors by their IP.
+The dedup window is per process: with several workers a repeat view can
+be counted once by each of them.
+
+Settings:
+    MATERIAL_VIEW_DEDUP_WINDOW  seconds a user/IP is remembered per material
+    MATERIAL_VIEW_QUEUE_SIZE    events held before new ones are dropped
+    MATERIAL_VIEW_BATCH_SIZE    rows per bulk_create (also triggers a flush)
+    TRUSTED_PROXY_COUNT         reverse proxies that append to X-Forwarded-For
+"""
+import ipaddress
+import logging
+import queue
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.utils import timezone
+
+from .counters import ensure_flusher, flush_interval, material_views, register_buffer, request_flush
+from .models import MaterialView
+
+logger = logging.getLogger(__name__)
+
+# Upper bound on remembered (material, user/IP) keys per process
+DEDUP_MAX_KEYS = 50000
+
+
+def get_client_ip(request):
+    """
+    Client address: REMOTE_ADDR, or with TRUSTED_PROXY_COUNT proxies in
+    front of the app, the X-Forwarded-For hop the outermost proxy appended.
+    Hops further left are whatever the client sent and are never trusted.
+    """
+    candidate = request.META.get('REMOTE_ADDR', '')
+    proxies = getattr(settings, 'TRUSTED_PROXY_COUNT', 0)
+    if proxies > 0:
+        hops = [hop.strip() for hop in request.META.get('HTTP_X_FORWARDED_FOR', '').split(',') if hop.strip()]
+        if len(hops) >= proxies:
+            candidate = hops[-proxies]
+    try:
+        return str(ipaddress.ip_address(candidate))
+    except ValueError:
+        return None
+
+
+class DedupWindow:
+    """Remembers recently seen keys for ``window`` seconds, LRU-bounded"""
+
+    def __init__(self, max_keys=DEDUP_MAX_KEYS):
+        self.max_keys = max_keys
+        self._seen = OrderedDict()
+        self._lock = threading.Lock()
+
+    def seen_recently(self, keys, window):
+        """
+        Return True if any of ``keys`` was seen in the last ``window``
+        seconds; otherwise remember all of them and return False.
+        """
+        now = time.monotonic()
+        with self._lock:
+            for key in keys:
+                last_seen = self._seen.get(key)
+                if last_seen is not None and now - last_seen < window:
+                    return True
+            for key in keys:
+                self._seen[key] = now
+                self._seen.move_to_end(key)
+            while len(self._seen) > self.max_keys:
+                self._seen.popitem(last=False)
+        return False
+
+    def clear(self):
+        with self._lock:
+            self._seen.clear()
+
+
+class ViewEventQueue:
+    """Bounded queue of unsaved MaterialView rows"""
+
+    def __init__(self):
+        self._queue = None
+        self.dropped = 0
+
+    @property
+    def queue(self):
+        if self._queue is None:
+            self._queue = queue.Queue(maxsize=getattr(settings, 'MATERIAL_VIEW_QUEUE_SIZE', 10000))
+        return self._queue
+
+    def put(self, event):
+        try:
+            self.queue.put_nowait(event)
+        except queue.Full:
+            # Analytics are best effort; never block a request on them
+            self.dropped += 1
+            request_flush()
+            return False
+        if self.queue.qsize() >= getattr(settings, 'MATERIAL_VIEW_BATCH_SIZE', 500):
+            request_flush()
+        return True
+
+    def flush(self):
+        """bulk_create everything queued so far. Returns rows written."""
+        batch_size = getattr(settings, 'MATERIAL_VIEW_BATCH_SIZE', 500)
+        written = 0
+        while True:
+            events = []
+            try:
+                while len(events) < batch_size:
+                    events.append(self.queue.get_nowait())
+            except queue.Empty:
+                pass
+            if not events:
+                break
+            try:
+                MaterialView.objects.bulk_create(events, batch_size=batch_size)
+                written += len(events)
+            except Exception as e:
+                logger.error(f"Error writing {len(events)} material views: {str(e)}", exc_info=True)
+                break
+            if len(events) < batch_size:
+                break
+        if self.dropped:
+            logger.warning(f"Dropped {self.dropped} material views: event queue full")
+            self.dropped = 0
+        return written
+
+    def clear(self):
+        self._queue = None
+        self.dropped = 0
+
+
+view_events = register_buffer(ViewEventQueue())
+_dedup = DedupWindow()
+
+
+def record_material_view(request, material):
+    """
+    Record a view of ``material`` for the analytics pipeline.
+
+    Returns False when the view repeats one from the same user (or, for
+    anonymous visitors, the same IP) inside the dedup window; such views are
+    neither stored nor counted.
+    """
+    user = request.user if request.user.is_authenticated else None
+    ip_address = get_client_ip(request)
+
+    keys = []
+    if user is not None:
+        keys.append(('user', material.pk, user.pk))
+    elif ip_address:
+        keys.append(('ip', material.pk, ip_address))
+    window = getattr(settings, 'MATERIAL_VIEW_DEDUP_WINDOW', 1800)
+    if keys and _dedup.seen_recently(keys, window):
+        return False
+
+    ensure_flusher()
+    view_events.put(MaterialView(
+        study_material_id=material.pk,
+        user=user,
+        ip_address=ip_address,
+        viewed_at=timezone.now(),
+    ))
+    material_views.increment(material.pk)
+    if flush_interval() <= 0:
+        view_events.flush()
+    return True
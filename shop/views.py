@@ -1,10 +1,13 @@
 import os
+import json
 import math
+import uuid
 import mimetypes
 from django.shortcuts import render, redirect, get_object_or_404
+from django.template.loader import render_to_string
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from django.http import JsonResponse, Http404
+from django.http import JsonResponse, Http404, FileResponse
 from django.views.decorators.csrf import csrf_exempt
 from django.contrib.auth import authenticate, login, logout
 from django.urls import reverse
@@ -14,18 +17,41 @@ from django.contrib.auth.models import User
 from django.contrib.auth import get_user_model
 from django.contrib.auth.views import PasswordChangeView
 from django.core.files.storage import default_storage
-from django.views.decorators.http import require_POST, require_GET
+from django.views.decorators.http import require_POST, require_GET, condition
 from django.http import HttpResponse, HttpResponseForbidden
 from django.core.exceptions import PermissionDenied
 from allauth.account.signals import user_logged_in
 from django.dispatch import receiver
 from .models import Task, CustomUser, Profile, Education, Document, SocialLink, StudyMaterial, Application, Notification,MaterialView
+from .models import ArchivedTask
 from django.db import transaction
 from django.core.exceptions import ValidationError
-from django.db.models import F, Q, Sum, Count, Case, When, Value, IntegerField
+from django.db.models import F, Q, Sum, Count
 from django.utils import timezone
-from datetime import timedelta
 from django.core.paginator import Paginator, EmptyPage, PageNotAnInteger
+from .applications import DUPLICATE, clean_submission_key, submit_application
+from .blobstore import duplicate_of, release_file, store_upload, upload_digest
+from .conditional import (
+    material_file_etag, material_last_modified, material_page_etag, material_preview_etag, on_not_modified,
+    profile_page_etag, profile_state,
+)
+from .counters import material_views
+from .directory import directory_entries, directory_stats
+from .facets import material_facets
+from .feed import feed_filters, task_feed_page
+from .institutions import autocomplete
+from .file_delivery import serve_file
+from .pagination import InvalidCursor, paginate_listing
+from .people_search import typeahead
+from .previews import delete_preview, schedule_preview
+from .profile_cache import profile_sections
+from .profile_views import profile_view_totals, record_profile_view
+from .recommendations import recommended_tasks_for
+from .related import related_materials_for
+from .reviews import review_applications
+from .search import search_study_materials
+from .task_stats import stats_for
+from .view_events import record_material_view
 import logging
 #----------------------------------------------------------------
 logger = logging.getLogger(__name__)
@@ -42,26 +68,67 @@ def about(request):
     return render(request, 'shop/about.html')
 @login_required
 def base(request):
-    """Base page view with tasks data."""
+    """Base page view with the first page of the task board feed."""
     try:
-        # Fetch all tasks with related user data
-        tasks = Task.objects.select_related('created_by').all()
-        recent_tasks = Task.objects.select_related('created_by').order_by('-id')[:5]
+        # Further pages are loaded from task_feed as the user scrolls
+        try:
+            tasks = task_feed_page(request.GET)
+        except InvalidCursor:
+            params = request.GET.copy()
+            params.pop('cursor')
+            tasks = task_feed_page(params)
+        recent_tasks = Task.objects.filter(is_approved=True).select_related('created_by').order_by('-id')[:5]
         context = {
             'tasks': tasks,
             'recent_tasks': recent_tasks,
-
+            # Precomputed nightly; one indexed lookup
+            'recommended_tasks': recommended_tasks_for(request.user),
+            'filters': feed_filters(request.GET),
+            'task_categories': Task.CATEGORY_CHOICES,
         }
     except Exception as e:
         # Log the error in production
+        logger.error(f"Error loading task feed: {str(e)}", exc_info=True)
         messages.error(request, "Error loading tasks data.")
         context = {
             'tasks': [],
             'recent_tasks': [],
+            'recommended_tasks': [],
+            'filters': {},
+            'task_categories': Task.CATEGORY_CHOICES,
         }
     
     return render(request, 'shop/base.html', context)
 
+
+@login_required
+@require_GET
+def institution_autocomplete(request):
+    """Top canonical institutions matching ``q``, for place/institution inputs"""
+    try:
+        limit = min(max(int(request.GET.get('limit', 10)), 1), 20)
+    except ValueError:
+        limit = 10
+    return JsonResponse({'results': autocomplete(request.GET.get('q', ''), limit)})
+
+
+@login_required
+@require_GET
+def task_feed(request):
+    """Next page of the task board as rendered cards, for infinite scroll"""
+    try:
+        page = task_feed_page(request.GET)
+    except InvalidCursor:
+        return JsonResponse({'success': False, 'error': 'Invalid cursor'}, status=400)
+    
+    return JsonResponse({
+        'success': True,
+        'html': render_to_string('shop/partials/task_cards.html', {'tasks': page}, request=request),
+        'count': len(page),
+        'has_next': page.has_next(),
+        'next_cursor': page.next_cursor,
+    })
+
 #-----------------------------------------
 @login_required
 def study_material(request):
@@ -136,6 +203,7 @@ def profile(request):
         'social_links': request.user.social_links.all(),
         'social_accounts': social_accounts,
         'is_owner': True,
+        'view_totals': profile_view_totals(profile),
     }
     return render(request, 'shop/profile.html', context)
 
@@ -151,10 +219,9 @@ def profile_view(request, pk=None):
     # Get or create profile
     profile, created = Profile.objects.get_or_create(user=user)
     
-    # Increment view count if it's not the owner viewing their own profile
-    if request.user.is_authenticated and request.user != user:
-        profile.views += 1
-        profile.save()
+    # Unique viewers are counted in batched sketches (shop/profile_views.py)
+    record_profile_view(request, profile)
+    is_owner = request.user == user if request.user.is_authenticated else False
     
     context = {
         'user': user,
@@ -162,25 +229,37 @@ def profile_view(request, pk=None):
         'educations': user.educations.all(),
         'documents': user.documents.filter(is_public=True),
         'social_links': user.social_links.filter(is_public=True),
-        'is_owner': request.user == user if request.user.is_authenticated else False,
+        'is_owner': is_owner,
+        'view_totals': profile_view_totals(profile),
+        # Other viewers get the cached sections (shop/profile_cache.py)
+        'profile_sections': None if is_owner else profile_sections(user, profile),
     }
     
     return render(request, 'profile.html', context)
 
 
+def _record_revalidated_profile_view(request, username):
+    """Count profile views answered with 304 like any other view"""
+    state = profile_state(request, username)
+    if state and state['profile'] is not None:
+        record_profile_view(request, state['profile'])
+
+
+@require_GET
+@on_not_modified(_record_revalidated_profile_view)
+@condition(etag_func=profile_page_etag)
 def public_profile_view(request, username):
-    """Public profile view with session-based one view per user"""
-    user = get_object_or_404(CustomUser, username=username)
-    profile, created = Profile.objects.get_or_create(user=user)
-    
-    # Check if the viewer is not the profile owner
-    if request.user.is_authenticated and request.user != user:
-        session_key = f'viewed_profile_{user.id}'
-        
-        if not request.session.get(session_key, False):
-            profile.views += 1
-            profile.save()
-            request.session[session_key] = True  # Mark as viewed
+    """Public profile view; each signed-in viewer counts once (shop/profile_views.py)"""
+    state = profile_state(request, username)
+    if state is None:
+        raise Http404("No such user")
+    user, profile = state['user'], state['profile']
+    if profile is None:
+        profile, created = Profile.objects.get_or_create(user=user)
+    
+    # Repeat views by the same viewer do not change the sketch
+    record_profile_view(request, profile)
+    is_owner = request.user == user if request.user.is_authenticated else False
     
     context = {
         'user': user,
@@ -188,10 +267,18 @@ def public_profile_view(request, username):
         'educations': user.educations.all(),
         'documents': user.documents.filter(is_public=True),
         'social_links': user.social_links.filter(is_public=True),
-        'is_owner': request.user == user if request.user.is_authenticated else False,
+        'is_owner': is_owner,
+        'view_totals': profile_view_totals(profile),
+        # Other viewers get the cached sections (shop/profile_cache.py);
+        # the querysets above are then never evaluated
+        'profile_sections': None if is_owner else profile_sections(user, profile, state['cache']),
     }
     
-    return render(request, 'shop/profile.html', context)
+    response = render(request, 'shop/profile.html', context)
+    if not is_owner:
+        # Always revalidate; unchanged pages cost a 304
+        response['Cache-Control'] = 'private, no-cache'
+    return response
 #----------------------------------------------------------------
 @login_required
 def edit_profile(request):
@@ -303,12 +390,17 @@ def account_settings(request):
 @login_required
 @require_POST
 def increment_profile_views(request):
-    """AJAX endpoint to increment profile views"""
+    """
+    AJAX endpoint recording a view of the ``username`` profile (the
+    requester's own by default, which is not counted); returns its totals
+    """
+    username = request.POST.get('username')
+    owner = get_object_or_404(CustomUser, username=username) if username else request.user
     try:
-        profile, created = Profile.objects.get_or_create(user=request.user)
-        profile.views += 1
-        profile.save()
-        return JsonResponse({'success': True, 'views': profile.views})
+        profile, created = Profile.objects.get_or_create(user=owner)
+        record_profile_view(request, profile)
+        totals = profile_view_totals(profile)
+        return JsonResponse({'success': True, 'views': totals['all_time'], 'totals': totals})
     except Exception as e:
         return JsonResponse({'success': False, 'error': str(e)})
 
@@ -342,16 +434,22 @@ def upload_document(request):
             messages.error(request, 'File type not allowed. Please upload PDF, DOC, DOCX, JPG, or PNG files.')
             return redirect('profile')
         
-        # Create document
-        document = Document.objects.create(
-            user=request.user,
-            title=title,
-            document_type=document_type,
-            description=description,
-            file=file,
-            is_public=is_public
-        )
+        # Create document; identical files share one stored copy
+        with transaction.atomic():
+            stored_name, duplicate = store_upload(file, upload_digest(request, 'file'))
+            document = Document.objects.create(
+                user=request.user,
+                title=title,
+                document_type=document_type,
+                description=description,
+                file=stored_name,
+                is_public=is_public
+            )
         
+        # Only mention the user's own copies; others' may be private
+        existing = duplicate_of(Document, stored_name, document.pk, request.user) if duplicate else None
+        if existing is not None:
+            messages.info(request, f'You already uploaded this file as "{existing.title}".')
         messages.success(request, 'Document uploaded successfully!')
         
     except Exception as e:
@@ -367,11 +465,7 @@ def delete_document(request, document_id):
     document = get_object_or_404(Document, id=document_id, user=request.user)
     
     try:
-        # Delete the file from storage
-        if document.file:
-            default_storage.delete(document.file.name)
-        
-        # Delete the document record
+        # Delete the document record; its stored file is released by a signal
         document.delete()
         messages.success(request, 'Document deleted successfully!')
         
@@ -585,7 +679,8 @@ def study_material(request):
         category = request.GET.get('category', 'all')
         material_type = request.GET.get('type', 'all')
         search_query = request.GET.get('search', '').strip()
-        sort_by = request.GET.get('sort', 'latest')
+        # Searches are ordered by relevance unless another sort is requested
+        sort_by = request.GET.get('sort', 'relevance' if search_query else 'latest')
         
         # Start with all materials
         queryset = StudyMaterial.objects.select_related('user').all()
@@ -598,32 +693,32 @@ def study_material(request):
             queryset = queryset.filter(material_type=material_type)
         
         if search_query:
-            queryset = queryset.filter(
-                Q(title__icontains=search_query) |
-                Q(description__icontains=search_query) |
-                Q(task_assigned_place__icontains=search_query)
+            queryset = search_study_materials(
+                queryset, search_query, rank=(sort_by == 'relevance')
             )
         
-        # Apply sorting
-        if sort_by == 'latest':
-            queryset = queryset.order_by('-created_at')
+        # Apply sorting (the id tie-breaker keeps keyset pagination stable)
+        if sort_by == 'relevance' and search_query:
+            ordering = None  # already ordered by search rank
+        elif sort_by == 'latest':
+            ordering = ('-created_at', '-id')
         elif sort_by == 'oldest':
-            queryset = queryset.order_by('created_at')
+            ordering = ('created_at', 'id')
         elif sort_by == 'most_viewed':
-            queryset = queryset.order_by('-views', '-created_at')
+            ordering = ('-views', '-id')
         else:  # default sorting
-            queryset = queryset.order_by('-created_at')
+            ordering = ('-created_at', '-id')
+        if ordering:
+            queryset = queryset.order_by(*ordering)
         
         # Pagination
-        paginator = Paginator(queryset, 12)  # 12 items per page
-        page_number = request.GET.get('page')
+        study_materials, total_count = paginate_listing(request, queryset, 12, ordering)  # 12 items per page
         
-        try:
-            study_materials = paginator.page(page_number)
-        except PageNotAnInteger:
-            study_materials = paginator.page(1)
-        except EmptyPage:
-            study_materials = paginator.page(paginator.num_pages)
+        # Sidebar facet counts (cached for the unsearched catalogue)
+        searched = None
+        if search_query:
+            searched = search_study_materials(StudyMaterial.objects.all(), search_query, rank=False)
+        facets = material_facets(searched, category, material_type)
         
         # Prepare context
         context = {
@@ -634,7 +729,9 @@ def study_material(request):
             'current_type': material_type,
             'current_search': search_query,
             'current_sort': sort_by,
-            'total_count': paginator.count,
+            'total_count': total_count,
+            'category_facets': facets['categories'],
+            'type_facets': facets['types'],
         }
         
         return render(request, 'shop/study_material.html', context)
@@ -653,9 +750,18 @@ def study_material(request):
             'current_search': '',
             'current_sort': 'latest',
             'total_count': 0,
+            'category_facets': [],
+            'type_facets': [],
         })
+def _record_revalidated_view(request, material_id):
+    """Count views answered with 304 like any other view"""
+    record_material_view(request, StudyMaterial(pk=material_id))
+
+
 @login_required
 @require_GET
+@on_not_modified(_record_revalidated_view)
+@condition(etag_func=material_page_etag)
 def view_material(request, material_id):
     """View for displaying study material with view counting"""
     try:
@@ -664,15 +770,11 @@ def view_material(request, material_id):
             id=material_id
         )
         
-        # Record the view - you need to add this method to your StudyMaterial model
-        # For now, let's increment views directly
-        StudyMaterial.objects.filter(id=material_id).update(views=F('views') + 1)
-        material.refresh_from_db()
+        # Record the view; events and counts are written out in batches
+        record_material_view(request, material)
         
-        # Get related materials (same category, excluding current)
-        related_materials = StudyMaterial.objects.filter(
-            category=material.category
-        ).exclude(id=material.id).order_by('-created_at')[:4]
+        # Get related materials from the precomputed index
+        related_materials = related_materials_for(material)
         
         # Safe file size calculation
         try:
@@ -685,10 +787,13 @@ def view_material(request, material_id):
             'file_type': material.get_file_extension(),
             'file_size': file_size,
             'file_url': material.file.url if material.file else '',
-            'total_views': material.views,
+            'total_views': material_views.value(material),
             'related_materials': related_materials,
         }
-        return render(request, 'shop/view_material.html', context)
+        response = render(request, 'shop/view_material.html', context)
+        # Always revalidate; unchanged pages cost a 304
+        response['Cache-Control'] = 'private, no-cache'
+        return response
         
     except Exception as e:
         logger.error(f"Error in view_material: {str(e)}", exc_info=True)
@@ -698,21 +803,23 @@ def view_material(request, material_id):
         })
 
 @require_GET
+@on_not_modified(_record_revalidated_view)
+@condition(etag_func=material_file_etag, last_modified_func=material_last_modified)
 def protected_file(request, material_id):
     """Serve protected files with security measures"""
     try:
         material = get_object_or_404(StudyMaterial, id=material_id)
         
         # Check permissions
-        if not material.is_public and material.user != request.user:
+        if not material.is_approved and material.user != request.user:
             raise PermissionDenied("You don't have permission to access this file")
         
         # Check if file exists
         if not material.file:
             raise Http404("File not found")
         
-        # Record view
-        material.increment_views(request)
+        # Record view (deduplicated against the view_material page load)
+        record_material_view(request, material)
         
         # Determine content type
         ext = material.get_file_extension()
@@ -726,21 +833,22 @@ def protected_file(request, material_id):
         }
         content_type = content_types.get(ext, 'application/octet-stream')
         
-        # Create secure response
-        response = HttpResponse(content_type=content_type)
+        # Stream file content (chunked, range-aware or via the front proxy)
+        try:
+            response = serve_file(
+                request, material.file, content_type,
+                etag=material_file_etag(request, material_id),
+                last_modified=material.updated_at,
+            )
+        except IOError:
+            raise Http404("File not available")
+        
+        # Security headers
         response['X-Content-Type-Options'] = 'nosniff'
         response['X-Frame-Options'] = 'SAMEORIGIN'
         response['Content-Security-Policy'] = "default-src 'self'"
         response['Cache-Control'] = 'private, max-age=3600'
-        response['Content-Disposition'] = f'inline; filename="{os.path.basename(material.file.name)}"'
-        
-        # Stream file content
-        try:
-            with material.file.open('rb') as f:
-                response.write(f.read())
-            return response
-        except IOError:
-            raise Http404("File not available")
+        return response
             
     except PermissionDenied:
         raise
@@ -750,6 +858,27 @@ def protected_file(request, material_id):
         logger.error(f"Error in protected_file: {str(e)}", exc_info=True)
         raise Http404("File not available")
 
+@login_required
+@require_GET
+@condition(etag_func=material_preview_etag)
+def material_preview(request, material_id):
+    """Serve the small WebP preview of a study material"""
+    material = get_object_or_404(
+        StudyMaterial.objects.only('id', 'preview', 'is_approved', 'user_id'), id=material_id
+    )
+    # Same rule as protected_file, but without revealing that it exists
+    if not material.is_approved and material.user_id != request.user.pk:
+        raise Http404("Preview not available")
+    if not material.preview:
+        raise Http404("Preview not available")
+    try:
+        response = FileResponse(material.preview.open('rb'), content_type='image/webp')
+    except IOError:
+        raise Http404("Preview not available")
+    response['X-Content-Type-Options'] = 'nosniff'
+    response['Cache-Control'] = 'private, max-age=86400'
+    return response
+
 @require_GET
 def ajax_get_material_stats(request, material_id):
     """Get material stats via AJAX"""
@@ -757,7 +886,7 @@ def ajax_get_material_stats(request, material_id):
         material = get_object_or_404(StudyMaterial, id=material_id)
         
         # Check permissions
-        if not material.is_public and material.user != request.user:
+        if not material.is_approved and material.user != request.user:
             return JsonResponse({
                 'success': False,
                 'error': 'Permission denied'
@@ -765,7 +894,7 @@ def ajax_get_material_stats(request, material_id):
         
         return JsonResponse({
             'success': True,
-            'total_views': material.views,
+            'total_views': material_views.value(material),
         })
     
     except StudyMaterial.DoesNotExist:
@@ -787,37 +916,55 @@ def apply_for_task(request, task_id):
     
     if request.method == 'POST':
         message = request.POST.get('message', '')
-        if not Application.objects.filter(task=task, applicant=request.user).exists():
-            Application.objects.create(
-                task=task,
-                applicant=request.user,
-                message=message
-            )
-            messages.success(request, 'Application submitted successfully!')
+        submission_key = clean_submission_key(request.POST.get('submission_key'))
+        
+        # Single upsert; double submits and retries are harmless
+        outcome, application_id = submit_application(task, request.user, message, submission_key)
+        if outcome == DUPLICATE:
+            level, text = 'warning', 'You have already applied for this task.'
         else:
-            messages.warning(request, 'You have already applied for this task.')
+            level, text = 'success', 'Application submitted successfully!'
+        
+        if request.headers.get('x-requested-with') == 'XMLHttpRequest' or 'application/json' in request.headers.get('accept', ''):
+            return JsonResponse({
+                'success': outcome != DUPLICATE,
+                'status': outcome,
+                'application_id': application_id,
+                'message': text,
+            })
+        getattr(messages, level)(request, text)
         return redirect('base')
     
-    return render(request, 'shop/apply_for_task.html', {'task': task})
+    return render(request, 'shop/apply_for_task.html', {
+        'task': task,
+        'submission_key': uuid.uuid4().hex,
+    })
 
 @login_required
 def my_task_applications(request):
-    # Get all tasks created by the current user
-    user_tasks = Task.objects.filter(created_by=request.user)
+    # Applications to the current user's tasks
+    applications = Application.objects.filter(task__created_by=request.user)
+    
+    # All status counts in one conditional-aggregate query
+    counts = applications.aggregate(
+        total_count=Count('id'),
+        pending_count=Count('id', filter=Q(status='pending')),
+        accepted_count=Count('id', filter=Q(status='accepted')),
+        rejected_count=Count('id', filter=Q(status='rejected')),
+    )
     
-    # Get all applications for these tasks
-    applications = Application.objects.filter(task__in=user_tasks).order_by('-applied_at')
+    # Rows with the task and applicant profile joined in, one page at a time
+    ordering = ('-applied_at', '-id')
+    rows = applications.select_related('task', 'applicant__profile').order_by(*ordering)
+    page, _ = paginate_listing(request, rows, 20, ordering)
     
     # Get notification counts for the bell icon
     unread_count = Notification.objects.filter(user=request.user, is_read=False).count()
     has_unread_notifications = unread_count > 0
     
     return render(request, 'shop/my_task_applications.html', {
-        'applications': applications,
-        'pending_count': applications.filter(status='pending').count(),
-        'accepted_count': applications.filter(status='accepted').count(),
-        'rejected_count': applications.filter(status='rejected').count(),
-        'user_tasks': user_tasks,
+        'applications': page,
+        **counts,
         'unread_count': unread_count,
         'has_unread_notifications': has_unread_notifications,
     })
@@ -855,6 +1002,57 @@ def update_application_status(request, application_id, status):
     
     return redirect('my_task_applications')
 
+@login_required
+@require_POST
+def bulk_review_applications(request):
+    """
+    Accept or reject many applications in one transaction.
+
+    Expects ``application_ids`` (repeated), ``status`` and optionally
+    ``reject_others`` as form fields or a JSON body. AJAX/JSON requests get
+    a JSON summary; form posts are redirected back to the dashboard.
+    """
+    wants_json = (
+        request.content_type == 'application/json'
+        or request.headers.get('x-requested-with') == 'XMLHttpRequest'
+    )
+    try:
+        if request.content_type == 'application/json':
+            data = json.loads(request.body or b'{}')
+            if not isinstance(data, dict):
+                raise ValueError("Expected a JSON object")
+            raw_ids = data.get('application_ids', [])
+            if not isinstance(raw_ids, list):
+                raise ValueError("application_ids must be a list")
+            status = data.get('status', '')
+            reject_others = bool(data.get('reject_others'))
+        else:
+            raw_ids = request.POST.getlist('application_ids')
+            status = request.POST.get('status', '')
+            reject_others = request.POST.get('reject_others') in ('on', 'true', '1')
+        application_ids = [int(pk) for pk in raw_ids]
+        result = review_applications(request.user, application_ids, status, reject_others)
+    except (TypeError, ValueError) as e:
+        if wants_json:
+            return JsonResponse({'success': False, 'error': str(e)}, status=400)
+        messages.error(request, "Invalid review request")
+        return redirect('my_task_applications')
+    except Exception as e:
+        logger.error(f"Error in bulk application review: {str(e)}", exc_info=True)
+        if wants_json:
+            return JsonResponse({'success': False, 'error': 'Server error'}, status=500)
+        messages.error(request, "Error updating applications")
+        return redirect('my_task_applications')
+    
+    if wants_json:
+        return JsonResponse({'success': True, **result})
+    
+    message = f"{result['updated']} application(s) {status}"
+    if result['auto_rejected']:
+        message += f", {result['auto_rejected']} other pending application(s) rejected"
+    messages.success(request, f"{message}. Applicants notified.")
+    return redirect('my_task_applications')
+
 @login_required
 @require_POST
 def delete_application(request, application_id):
@@ -982,8 +1180,15 @@ def upload_study_material(request):
             
             # This will trigger the clean() method in the model
             study_material.full_clean()
-            study_material.save()
             
+            # Identical files share one stored copy (see shop/blobstore.py)
+            with transaction.atomic():
+                study_material.file, duplicate = store_upload(file, upload_digest(request, 'file'))
+                study_material.save()
+            schedule_preview(study_material)
+            
+            if duplicate:
+                _notify_duplicate_material(request, study_material)
             messages.success(request, 'Study material uploaded successfully!')
             return redirect('study_material')
             
@@ -1001,6 +1206,13 @@ def upload_study_material(request):
     }
     return render(request, 'shop/upload_study_material.html', context)
 
+def _notify_duplicate_material(request, material):
+    """Tell the uploader that they already uploaded the same file"""
+    # Other users' copies are never mentioned: that would reveal private uploads
+    existing = duplicate_of(StudyMaterial, material.file.name, material.pk, request.user)
+    if existing is not None:
+        messages.info(request, f'You already uploaded this file as "{existing.title}".')
+
 #-------------------- My Uploads --------------------
 @login_required
 def my_uploads(request):
@@ -1028,19 +1240,12 @@ def my_uploads(request):
             )
         
         # Order by most recent first
-        queryset = queryset.order_by('-created_at')
+        ordering = ('-created_at', '-id')
+        queryset = queryset.order_by(*ordering)
         
         # Calculate stats for the user
         # Pagination
-        paginator = Paginator(queryset, 10)  # 10 items per page
-        page_number = request.GET.get('page')
-        
-        try:
-            user_materials = paginator.page(page_number)
-        except PageNotAnInteger:
-            user_materials = paginator.page(1)
-        except EmptyPage:
-            user_materials = paginator.page(paginator.num_pages)
+        user_materials, _ = paginate_listing(request, queryset, 10, ordering)  # 10 items per page
         
         context = {
             'user_materials': user_materials,
@@ -1069,11 +1274,7 @@ def delete_study_material(request, material_id):
     material = get_object_or_404(StudyMaterial, id=material_id, user=request.user)
     
     try:
-        # Delete the file from storage
-        if material.file:
-            default_storage.delete(material.file.name)
-        
-        # Delete the material record
+        # The stored file and preview are released by signals
         material.delete()
         messages.success(request, 'Study material deleted successfully!')
         
@@ -1097,15 +1298,25 @@ def edit_study_material(request, material_id):
             material.task_assigned_place = request.POST.get('task_assigned_place', material.task_assigned_place)
             
             # Handle file update if provided
-            if request.FILES.get('file'):
-                # Delete old file if exists
-                if material.file:
-                    default_storage.delete(material.file.name)
+            file_replaced = bool(request.FILES.get('file'))
+            if file_replaced:
+                old_name = material.file.name
                 material.file = request.FILES['file']
             
             material.full_clean()
-            material.save()
+            duplicate = False
+            with transaction.atomic():
+                if file_replaced:
+                    # Swap the stored copy and drop the old preview
+                    material.file, duplicate = store_upload(request.FILES['file'], upload_digest(request, 'file'))
+                    release_file(old_name)
+                    delete_preview(material)
+                material.save()
+            if file_replaced:
+                schedule_preview(material)
             
+            if duplicate:
+                _notify_duplicate_material(request, material)
             messages.success(request, 'Study material updated successfully!')
             return redirect('my_uploads')
             
@@ -1129,18 +1340,29 @@ def edit_study_material(request, material_id):
 def my_tasks(request):
     tasks = Task.objects.filter(created_by=request.user).order_by('-created_at')
     
-    # Count tasks by status
-    assigned_count = tasks.filter(status='assigned').count()
-    completed_count = tasks.filter(status='completed').count()
-    
+    # Counts come from the user's UserTaskStats row (shop/task_stats.py)
     context = {
         'tasks': tasks,
-        'assigned_count': assigned_count,
-        'completed_count': completed_count,
+        'stats': stats_for(request.user),
     }
     return render(request, 'shop/my_tasks.html', context)
 
 
+@login_required
+def task_history(request):
+    """The owner's expired tasks that were moved to the archive (shop/archive.py)"""
+    ordering = ('-deadline', '-id')
+    archived = ArchivedTask.objects.filter(created_by=request.user).annotate(
+        application_count=Count('applications')
+    ).order_by(*ordering)
+    archived_tasks, total_count = paginate_listing(request, archived, 20)
+    
+    return render(request, 'shop/task_history.html', {
+        'archived_tasks': archived_tasks,
+        'total_count': total_count,
+    })
+
+
 
 @login_required
 def edit_task(request, task_id):
@@ -1182,54 +1404,33 @@ def delete_task(request, task_id):
 @login_required
 def user_directory(request):
     """Display all users with total count, search, and view tracking"""
-    # Get base queryset with profile views
-    users = User.objects.annotate(
-        profile_views=Case(
-            When(profile__views__isnull=False, then=F('profile__views')),
-            default=Value(0),
-            output_field=IntegerField()
-        )
-    ).order_by('-profile_views')
-    
-    # Get total user count
-    total_users = users.count()
-    
-    # Calculate active and new users
-    today = timezone.now().date()
-    one_week_ago = today - timedelta(days=7)
-    
-    active_count = User.objects.filter(last_login__date=today).count()
-    new_count = User.objects.filter(date_joined__gte=one_week_ago).count()
-    
-    # Search functionality
+    # Pre-ranked rows (shop/directory.py), most viewed first
     search_query = request.GET.get('search', '').strip()
-    if search_query:
-        users = users.filter(
-            Q(username__icontains=search_query) |
-            Q(first_name__icontains=search_query) |
-            Q(last_name__icontains=search_query)
-        )
-    
-    # Pagination
-    paginator = Paginator(users, 20)  # 20 users per page
-    page_number = request.GET.get('page')
-    
-    try:
-        users_page = paginator.page(page_number)
-    except PageNotAnInteger:
-        users_page = paginator.page(1)
-    except EmptyPage:
-        users_page = paginator.page(paginator.num_pages)
-    
+    entries = directory_entries(search_query)
+    stats = directory_stats()
+
+    # Pagination walks the unique rank index
+    users_page, _ = paginate_listing(request, entries, 20, ('rank',))  # 20 users per page
+
     context = {
         'users': users_page,
-        'total_users': total_users,
-        'active_count': active_count,
-        'new_count': new_count,
+        'total_users': stats['total'],
+        'active_count': stats['active_today'],
+        'new_count': stats['new_this_week'],
         'search_query': search_query,
     }
     return render(request, 'shop/user_directory.html', context)
 
+@login_required
+@require_GET
+def people_typeahead(request):
+    """Best people matches for ``q``, for the directory search box"""
+    try:
+        limit = min(max(int(request.GET.get('limit', 8)), 1), 20)
+    except ValueError:
+        limit = 8
+    return JsonResponse({'results': typeahead(request.GET.get('q', ''), limit)})
+
 #-----------------------------------------------------
 @login_required
 def terms(request):
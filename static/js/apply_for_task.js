@@ -16,8 +16,30 @@
             }
             
             // Add loading state
+            e.preventDefault();
+            const originalLabel = submitBtn.innerHTML;
             submitBtn.innerHTML = '<i class="fas fa-spinner fa-spin"></i> Submitting...';
             submitBtn.disabled = true;
+
+            // Submit in the background; the submission key makes retries safe
+            fetch(this.action || window.location.href, {
+                method: 'POST',
+                body: new FormData(this),
+                headers: { 'X-Requested-With': 'XMLHttpRequest' },
+            })
+                .then(response => response.json())
+                .then(data => {
+                    const notice = document.createElement('div');
+                    notice.className = 'alert ' + (data.success ? 'alert-success' : 'alert-warning');
+                    notice.textContent = data.message;
+                    this.parentNode.insertBefore(notice, this);
+                    submitBtn.innerHTML = '<i class="fas fa-check"></i> Submitted';
+                })
+                .catch(error => {
+                    console.error('Error submitting application:', error);
+                    submitBtn.innerHTML = originalLabel;
+                    submitBtn.disabled = false;
+                });
         });
 
         // Initialize
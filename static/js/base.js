@@ -4,152 +4,117 @@ document.addEventListener('DOMContentLoaded', function() {
     if (displayYear) {
         displayYear.textContent = new Date().getFullYear();
     }
-    // Get all task cards
-    const taskCards = document.querySelectorAll('.task-card');
-    
+    // Task board container; pages are loaded from the feed endpoint
+    const taskContent = document.getElementById('task-content');
+    const sentinel = document.getElementById('task-feed-sentinel');
+    const feedUrl = sentinel ? sentinel.dataset.feedUrl : '';
+    let nextCursor = sentinel ? sentinel.dataset.nextCursor : '';
+    let loading = false;
+    let requestId = 0;
+    let filterTimer = null;
+
     // Get filter elements
     const searchInput = document.getElementById('searchInput');
     const moneyFilter = document.getElementById('moneyFilter');
     const taskStatusFilter = document.getElementById('taskStatusFilter');
     const assignedPlaceFilter = document.getElementById('assignedPlaceFilter');
     const deadlineFilter = document.getElementById('deadlineFilter');
-    
-    // Main filter function
-    function filterTasks() {
-        const searchTerm = searchInput ? searchInput.value.toLowerCase() : '';
-        const moneyRange = moneyFilter ? moneyFilter.value.trim() : '';
-        const statusFilter = taskStatusFilter ? taskStatusFilter.value : '';
-        const assignedPlaceTerm = assignedPlaceFilter ? assignedPlaceFilter.value.toLowerCase() : '';
-        const deadlineFilterValue = deadlineFilter ? deadlineFilter.value : '';
-        
-        const currentDate = new Date();
-        currentDate.setHours(0, 0, 0, 0);
-        
-        let visibleCount = 0;
-        
-        taskCards.forEach(card => {
-            const titleElement = card.querySelector('.task-title');
-            const descriptionElement = card.querySelector('.task-description');
-            const locationElement = card.querySelector('.location-badge');
-            
-            const title = titleElement ? titleElement.textContent.toLowerCase() : '';
-            const description = descriptionElement ? descriptionElement.textContent.toLowerCase() : '';
-            const assignedPlace = locationElement ? locationElement.textContent.toLowerCase() : '';
-            
-            const status = card.dataset.status || '';
-            const deadlineStr = card.dataset.deadline || '';
-            const budget = parseFloat(card.dataset.budget) || 0;
-            
-            // Check if card matches all filters
-            const matchesSearch = !searchTerm || 
-                                title.includes(searchTerm) || 
-                                description.includes(searchTerm) || 
-                                assignedPlace.includes(searchTerm);
-            
-            // Budget range filtering logic
-            let matchesBudget = true;
-            if (moneyRange) {
-                const rangeParts = moneyRange.split('-');
-                let min = 0;
-                let max = Infinity;
-                
-                if (rangeParts.length === 2) {
-                    min = parseFloat(rangeParts[0]) || 0;
-                    max = parseFloat(rangeParts[1]) || Infinity;
-                } else if (moneyRange.startsWith('>')) {
-                    min = parseFloat(moneyRange.substring(1)) || 0;
-                } else if (moneyRange.startsWith('<')) {
-                    max = parseFloat(moneyRange.substring(1)) || Infinity;
-                } else {
-                    // Single value - treat as minimum
-                    min = parseFloat(moneyRange) || 0;
+    const categoryFilter = document.getElementById('categoryFilter');
+
+    // Current filters as feed query parameters
+    function feedParams() {
+        const params = new URLSearchParams();
+        const values = {
+            q: searchInput ? searchInput.value.trim() : '',
+            budget: moneyFilter ? moneyFilter.value.trim() : '',
+            status: taskStatusFilter ? taskStatusFilter.value : '',
+            place: assignedPlaceFilter ? assignedPlaceFilter.value.trim() : '',
+            deadline: deadlineFilter ? deadlineFilter.value : '',
+            category: categoryFilter ? categoryFilter.value : '',
+        };
+        // A place picked from the suggestions filters by institution id
+        if (assignedPlaceFilter && assignedPlaceFilter.dataset.institutionId) {
+            values.institution = assignedPlaceFilter.dataset.institutionId;
+        }
+        Object.keys(values).forEach(key => {
+            if (values[key]) params.set(key, values[key]);
+        });
+        return params;
+    }
+
+    // Fetch a page of cards; `reset` replaces the board for new filters
+    function loadTasks(reset) {
+        if (!taskContent || !feedUrl) return;
+        if (!reset && (loading || !nextCursor)) return;
+
+        const params = feedParams();
+        if (!reset) params.set('cursor', nextCursor);
+        const currentRequest = ++requestId;
+        loading = true;
+
+        fetch(feedUrl + '?' + params.toString(), {
+            headers: { 'X-Requested-With': 'XMLHttpRequest' },
+        })
+            .then(response => response.json())
+            .then(data => {
+                // A newer filter change superseded this request
+                if (currentRequest !== requestId || !data.success) return;
+
+                const emptyState = taskContent.querySelector('.empty-state');
+                if (reset) {
+                    taskContent.querySelectorAll('.task-card').forEach(card => card.remove());
                 }
-                
-                matchesBudget = budget >= min && (max === Infinity || budget <= max);
-            }
-            
-            const matchesStatus = !statusFilter || status === statusFilter;
-            const matchesAssignedPlace = !assignedPlaceTerm || assignedPlace.includes(assignedPlaceTerm);
-            
-            // Deadline filtering logic
-            let matchesDeadline = true;
-            if (deadlineFilterValue && deadlineStr) {
-                const deadlineDate = new Date(deadlineStr);
-                deadlineDate.setHours(0, 0, 0, 0);
-                
-                switch(deadlineFilterValue) {
-                    case 'today':
-                        matchesDeadline = deadlineDate.getTime() === currentDate.getTime();
-                        break;
-                    case 'week':
-                        const endOfWeek = new Date(currentDate);
-                        endOfWeek.setDate(endOfWeek.getDate() + (6 - endOfWeek.getDay()));
-                        matchesDeadline = deadlineDate >= currentDate && deadlineDate <= endOfWeek;
-                        break;
-                    case 'month':
-                        const endOfMonth = new Date(currentDate.getFullYear(), currentDate.getMonth() + 1, 0);
-                        matchesDeadline = deadlineDate >= currentDate && deadlineDate <= endOfMonth;
-                        break;
-                    case 'future':
-                        matchesDeadline = deadlineDate > currentDate;
-                        break;
+                if (emptyState) {
+                    emptyState.insertAdjacentHTML('beforebegin', data.html);
+                    const hasCards = taskContent.querySelector('.task-card') !== null;
+                    emptyState.style.display = hasCards ? 'none' : 'flex';
+                } else {
+                    taskContent.insertAdjacentHTML('beforeend', data.html);
                 }
-            }
-            
-            // Show/hide card based on filters
-            if (matchesSearch && matchesBudget && matchesStatus && 
-                matchesAssignedPlace && matchesDeadline) {
-                card.style.display = 'flex';
-                visibleCount++;
-            } else {
-                card.style.display = 'none';
-            }
-        });
-        
-        // Show empty state if no tasks are visible
-        const emptyState = document.querySelector('#task-content .empty-state');
-        if (emptyState) {
-            emptyState.style.display = visibleCount === 0 ? 'flex' : 'none';
-        }
+                nextCursor = data.next_cursor || '';
+            })
+            .catch(error => console.error('Error loading tasks:', error))
+            .finally(() => {
+                if (currentRequest === requestId) loading = false;
+            });
+    }
+
+    // Filters are applied by the server; debounce typing
+    function filterTasks() {
+        clearTimeout(filterTimer);
+        filterTimer = setTimeout(() => loadTasks(true), 300);
     }
-    
+
     // Reset all filters function
     function resetFilters() {
         if (searchInput) searchInput.value = '';
         if (moneyFilter) moneyFilter.value = '';
         if (taskStatusFilter) taskStatusFilter.value = '';
-        if (assignedPlaceFilter) assignedPlaceFilter.value = '';
+        if (assignedPlaceFilter) {
+            assignedPlaceFilter.value = '';
+            assignedPlaceFilter.dataset.institutionId = '';
+        }
         if (deadlineFilter) deadlineFilter.value = '';
-        
+        if (categoryFilter) categoryFilter.value = '';
+
         filterTasks();
     }
-    
+
     // Make functions global for HTML onclick handlers
     window.filterTasks = filterTasks;
     window.resetFilters = resetFilters;
-    
-    // Event listeners for filters
-    if (searchInput) {
-        searchInput.addEventListener('input', filterTasks);
-    }
-    
-    if (moneyFilter) {
-        moneyFilter.addEventListener('input', filterTasks);
-    }
-    
-    if (taskStatusFilter) {
-        taskStatusFilter.addEventListener('change', filterTasks);
-    }
-    
+
+    // Choosing a suggestion fires `input` but not `keyup`
     if (assignedPlaceFilter) {
         assignedPlaceFilter.addEventListener('input', filterTasks);
     }
-    
-    if (deadlineFilter) {
-        deadlineFilter.addEventListener('change', filterTasks);
+
+    // Load the next page when the end of the board scrolls into view
+    if (sentinel && 'IntersectionObserver' in window) {
+        const observer = new IntersectionObserver(entries => {
+            if (entries.some(entry => entry.isIntersecting)) loadTasks(false);
+        }, { rootMargin: '400px' });
+        observer.observe(sentinel);
     }
-    
-    // Initialize filters on page load
-    filterTasks();
 });
 //------------------------------------------------------------------------//
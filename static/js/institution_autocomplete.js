@@ -0,0 +1,40 @@
+// Institution suggestions for inputs marked with data-institution-autocomplete="<endpoint>"
+document.addEventListener('DOMContentLoaded', function() {
+    document.querySelectorAll('input[data-institution-autocomplete]').forEach(input => {
+        const url = input.dataset.institutionAutocomplete;
+        const list = document.createElement('datalist');
+        list.id = input.id + 'Suggestions';
+        input.setAttribute('list', list.id);
+        input.setAttribute('autocomplete', 'off');
+        input.after(list);
+
+        // Suggested name -> institution id, so filters can match by id
+        const ids = {};
+        let timer = null;
+        let lastQuery = '';
+
+        input.addEventListener('input', function() {
+            input.dataset.institutionId = ids[input.value] || '';
+            clearTimeout(timer);
+
+            const query = input.value.trim();
+            if (query.length < 2 || query === lastQuery) return;
+            timer = setTimeout(() => {
+                lastQuery = query;
+                fetch(url + '?q=' + encodeURIComponent(query))
+                    .then(response => response.json())
+                    .then(data => {
+                        list.innerHTML = '';
+                        data.results.forEach(result => {
+                            ids[result.name] = result.id;
+                            const option = document.createElement('option');
+                            option.value = result.name;
+                            list.appendChild(option);
+                        });
+                        input.dataset.institutionId = ids[input.value] || '';
+                    })
+                    .catch(error => console.log('Error loading institutions:', error));
+            }, 200);
+        });
+    });
+});
@@ -70,4 +70,14 @@
                 })
                 .catch(error => console.log('Error marking notifications as read:', error));
             });
+
+            // Bulk review: select every pending application on the page
+            const selectAll = document.getElementById('selectAllApplications');
+            if (selectAll) {
+                selectAll.addEventListener('change', function() {
+                    document.querySelectorAll('.bulk-select').forEach(box => {
+                        box.checked = this.checked;
+                    });
+                });
+            }
         });
\ No newline at end of file
@@ -0,0 +1,45 @@
+// People suggestions for inputs marked with data-people-search="<endpoint>";
+// picking one opens that profile
+document.addEventListener('DOMContentLoaded', function() {
+    document.querySelectorAll('input[data-people-search]').forEach(input => {
+        const url = input.dataset.peopleSearch;
+        const list = document.createElement('datalist');
+        list.id = (input.id || 'peopleSearch') + 'Suggestions';
+        input.setAttribute('list', list.id);
+        input.setAttribute('autocomplete', 'off');
+        input.after(list);
+
+        // Suggested label -> profile URL
+        const profiles = {};
+        let timer = null;
+        let lastQuery = '';
+
+        input.addEventListener('input', function() {
+            if (profiles[input.value]) {
+                window.location.href = profiles[input.value];
+                return;
+            }
+            clearTimeout(timer);
+
+            const query = input.value.trim();
+            if (query.length < 3 || query === lastQuery) return;
+            timer = setTimeout(() => {
+                lastQuery = query;
+                fetch(url + '?q=' + encodeURIComponent(query))
+                    .then(response => response.json())
+                    .then(data => {
+                        list.innerHTML = '';
+                        data.results.forEach(result => {
+                            const label = result.name + ' (@' + result.username + ')';
+                            profiles[label] = result.url;
+                            const option = document.createElement('option');
+                            option.value = label;
+                            option.label = [result.title, result.institution].filter(Boolean).join(' · ');
+                            list.appendChild(option);
+                        });
+                    })
+                    .catch(error => console.log('Error loading people:', error));
+            }, 200);
+        });
+    });
+});